@@ -5,12 +5,23 @@ import numpy as np
 import xarray as xr
 from pyhdf.SD import SD, SDC
 
-def extract_data(file_path):
-    """Extract AOD_055 from HDF4 MAIAC CMG file, apply fill/scale, and reconstruct 0.05° grid."""
+from hdf_window import cmg_window, read_sds_window, sds_shape
+from maiac_qa import policy_string, qa_keep_mask
+from packing import packed_encoding, source_packing_attrs
+
+LAT_MAX, LAT_MIN = 43.150, 36.350
+LON_MIN, LON_MAX = -83.150, -70.100
+
+def extract_data(file_path, qa_policy=None):
+    """
+    Extract AOD_055 from HDF4 MAIAC CMG file, apply fill/scale, and reconstruct 0.05° grid.
+    qa_policy: dict of allowed AOD_055_QA states (see maiac_qa.py); None -> no QA masking.
+    """
     # --- Read AOD_055 from HDF4 ---
     sd = SD(file_path, SDC.READ)
     sds = sd.select('AOD_055')  # if error, run list_hdf4_datasets(file_path) to see true names
-    data = sds[:].astype(float)
+    raw = sds[:]
+    data = raw.astype(np.float32)
 
     # --- Attributes ---
     attrs = sds.attributes()
@@ -19,6 +30,9 @@ def extract_data(file_path):
 
     # --- Clean & scale ---
     data = np.where(data == fill_value, np.nan, data)
+    if qa_policy is not None:
+        qa = sd.select('AOD_055_QA')[:]
+        data[~qa_keep_mask(qa, qa_policy)] = np.nan
     data = data * scale_factor
 
     # --- Build 0.05° global lat/lon grid ---
@@ -34,13 +48,50 @@ def extract_data(file_path):
         {"AOD": (["lat", "lon"], data)},
         coords={"lat": latitudes, "lon": longitudes}
     )
+    ds["AOD"].attrs.update(source_packing_attrs(raw.dtype, scale_factor, 0.0, fill_value))
+    if qa_policy is not None:
+        ds["AOD"].attrs["qa_policy"] = policy_string(qa_policy)
+    return ds
+
+def extract_region(file_path, qa_policy=None):
+    """
+    Same as filter_region(extract_data(file_path, qa_policy)), but reads only
+    the regional rows/cols of AOD_055 (and AOD_055_QA) via get(start, count).
+    """
+    sd = SD(file_path, SDC.READ)
+    n_lat, n_lon = sds_shape(sd, 'AOD_055')
+    rows, cols, lat, lon = cmg_window(n_lat, n_lon, LAT_MAX, LAT_MIN, LON_MIN, LON_MAX,
+                                      lat_descending=False)  # same (ascending) axes as extract_data
+
+    sds = sd.select('AOD_055')
+    attrs = sds.attributes()
+    sds.endaccess()
+    raw = read_sds_window(sd, 'AOD_055', rows, cols)
+    data = raw.astype(np.float32)
+
+    fill_value = attrs.get('_FillValue', -28672.0)
+    scale_factor = attrs.get('scale_factor', 1.0)
+
+    data = np.where(data == fill_value, np.nan, data)
+    if qa_policy is not None:
+        qa = read_sds_window(sd, 'AOD_055_QA', rows, cols)
+        data[~qa_keep_mask(qa, qa_policy)] = np.nan
+    data = data * scale_factor
+
+    sd.end()
+
+    ds = xr.Dataset(
+        {"AOD": (["lat", "lon"], data)},
+        coords={"lat": lat.copy(), "lon": lon.copy()}
+    )
+    ds["AOD"].attrs.update(source_packing_attrs(raw.dtype, scale_factor, 0.0, fill_value))
+    if qa_policy is not None:
+        ds["AOD"].attrs["qa_policy"] = policy_string(qa_policy)
     return ds
 
 def filter_region(ds):
     """Subset to region of interest."""
-    lat_max, lat_min = 43.150, 36.350
-    lon_min, lon_max = -83.150, -70.100
-    return ds.sel(lat=slice(lat_min, lat_max), lon=slice(lon_min, lon_max))
+    return ds.sel(lat=slice(LAT_MIN, LAT_MAX), lon=slice(LON_MIN, LON_MAX))
 
 def main():
     # --- paths ---
@@ -65,13 +116,12 @@ def main():
                 continue
             file_path = os.path.join(year_dir, filename)
             try:
-                ds = extract_data(file_path)
-                filtered = filter_region(ds)
+                filtered = extract_region(file_path)  # regional window only
 
                 output_filename = filename.replace(".hdf", "_clean.nc")
                 output_path = os.path.join(out_year_dir, output_filename)
 
-                filtered.to_netcdf(output_path)
+                filtered.to_netcdf(output_path, encoding=packed_encoding(filtered))
                 print(f"Saved: {output_path}")
 
             except Exception as e:
@@ -1,43 +1,138 @@
 # updated-- use this to clean AOD
 
-import os
 import numpy as np
+import pandas as pd
 import xarray as xr
 from pyhdf.SD import SD, SDC
 
-def extract_data(file_path):
+from packing import SOURCE_ATTRS, source_packing_attrs
+from hdf_window import read_sds_window
+from maiac_qa import policy_string, qa_keep_mask
+
+# bump when a change to this script changes what ends up in the outputs
+CODE_VERSION = "aod_clean3-2"
+
+
+def _valid_compact_cells(compact_size, line_arr, sample_arr, offset_arr, nAOD_arr,
+                         nlines, nsamples):
     """
-    Reconstruct AOD from MAIAC compact format for one file:
-    - read Compact_AOD_055 + indexing arrays
-    - average all nAOD records per cell
-    - apply fill/scale from AOD_055 SDS
-    - return global gridded Dataset with AOD_055_compact(lat, lon)
+    Boolean mask of compact cells that pass the same checks as the
+    per-cell loop: nAOD > 0, (line, sample) on the grid, and the record
+    range [offset, offset + nAOD) inside Compact_AOD_055.
     """
-    sd = SD(file_path, SDC.READ)
+    line_arr   = np.asarray(line_arr, dtype=np.int64)
+    sample_arr = np.asarray(sample_arr, dtype=np.int64)
+    offset_arr = np.asarray(offset_arr, dtype=np.int64)
+    nAOD_arr   = np.asarray(nAOD_arr, dtype=np.int64)
+
+    return (
+        (nAOD_arr > 0) &
+        (line_arr >= 0) & (line_arr < nlines) &
+        (sample_arr >= 0) & (sample_arr < nsamples) &
+        (offset_arr >= 0) &
+        (offset_arr + nAOD_arr <= compact_size)
+    )
 
-    # --- read compact arrays ---
-    compact_aod = sd.select("Compact_AOD_055")[:].astype(np.float32)[0]
-    line_arr    = sd.select("Line")[:].astype(np.int32)[0]
-    sample_arr  = sd.select("Sample")[:].astype(np.int32)[0]
-    offset_arr  = sd.select("Offset_AOD_055")[:].astype(np.int64)[0]
-    nAOD_arr    = sd.select("nAOD")[:].astype(np.int32)[0]
 
-    # --- get scaling / fill info from AOD_055 SDS ---
-    sds_grid = sd.select("AOD_055")
-    attrs    = sds_grid.attributes()
-    fill_value   = attrs.get("_FillValue", -28672)
-    valid_range  = attrs.get("valid_range", [0, 6000])
-    scale_factor = attrs.get("scale_factor", 0.001)
+def _gather_segments(compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr, nlines, nsamples):
+    """
+    Gather every valid cell's records into one contiguous float64 array.
+    Returns (lines, samples, counts, seg_starts, vals) or None if no cell is valid;
+    cell k's records are vals[seg_starts[k]:seg_starts[k] + counts[k]].
+    """
+    valid = _valid_compact_cells(
+        compact_aod.size, line_arr, sample_arr, offset_arr, nAOD_arr, nlines, nsamples
+    )
+    if not valid.any():
+        return None
 
-    valid_min = float(valid_range[0])
-    valid_max = float(valid_range[1])
+    lines   = np.asarray(line_arr)[valid].astype(np.int64)
+    samples = np.asarray(sample_arr)[valid].astype(np.int64)
+    starts  = np.asarray(offset_arr)[valid].astype(np.int64)
+    counts  = np.asarray(nAOD_arr)[valid].astype(np.int64)
 
-    # --- grid dimensions ---
-    nlines  = 3600
-    nsamples = 7200
-    AODImg  = np.full((nlines, nsamples), np.nan, dtype=np.float32)
+    # position of each cell's first record in the gathered array
+    seg_starts = np.cumsum(counts) - counts
+    total = int(counts.sum())
+
+    # record index for every gathered element: offset + (k - seg_start)
+    rec_idx = np.repeat(starts - seg_starts, counts) + np.arange(total, dtype=np.int64)
+    vals = compact_aod[rec_idx].astype(np.float64)
+
+    return lines, samples, counts, seg_starts, vals
+
+
+def reconstruct_compact_mean(compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr,
+                             nlines=3600, nsamples=7200):
+    """
+    Vectorized compact -> grid reconstruction (mean of nAOD records per cell).
+
+    Gathers every valid cell's records into one contiguous array, sums
+    each cell's segment with np.add.reduceat, and scatters the float64
+    means into a float32 grid in one assignment. Same validity checks and
+    same float64 accumulation as reconstruct_compact_mean_loop, so the
+    output is bit-identical (cells listed twice keep the last record,
+    as in the loop).
+    """
+    AODImg = np.full((nlines, nsamples), np.nan, dtype=np.float32)
+
+    gathered = _gather_segments(
+        compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr, nlines, nsamples
+    )
+    if gathered is None:
+        return AODImg
+    lines, samples, counts, seg_starts, vals = gathered
+
+    sums  = np.add.reduceat(vals, seg_starts)
+    means = sums / counts
+
+    AODImg[lines, samples] = means
+    return AODImg
+
+
+def reconstruct_compact_stats(compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr,
+                              nlines=3600, nsamples=7200):
+    """
+    Per-cell mean, count, min, max and std (ddof=0) of the nAOD records,
+    from one gather of Compact_AOD_055 (segment reductions, raw units).
+    Returns a dict of (nlines, nsamples) grids; "mean" is identical to
+    reconstruct_compact_mean, "count" is int16 with 0 where no records.
+    """
+    out = {
+        "mean":  np.full((nlines, nsamples), np.nan, dtype=np.float32),
+        "count": np.zeros((nlines, nsamples), dtype=np.int16),
+        "min":   np.full((nlines, nsamples), np.nan, dtype=np.float32),
+        "max":   np.full((nlines, nsamples), np.nan, dtype=np.float32),
+        "std":   np.full((nlines, nsamples), np.nan, dtype=np.float32),
+    }
+
+    gathered = _gather_segments(
+        compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr, nlines, nsamples
+    )
+    if gathered is None:
+        return out
+    lines, samples, counts, seg_starts, vals = gathered
+
+    means = np.add.reduceat(vals, seg_starts) / counts
+    dev = vals - np.repeat(means, counts)
+    var = np.add.reduceat(dev * dev, seg_starts) / counts
+
+    out["mean"][lines, samples]  = means
+    out["count"][lines, samples] = np.minimum(counts, np.iinfo(np.int16).max)
+    out["min"][lines, samples]   = np.minimum.reduceat(vals, seg_starts)
+    out["max"][lines, samples]   = np.maximum.reduceat(vals, seg_starts)
+    out["std"][lines, samples]   = np.sqrt(var)
+    return out
+
+
+def reconstruct_compact_mean_loop(compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr,
+                                  nlines=3600, nsamples=7200):
+    """
+    Reference per-cell loop (original implementation).
+    Kept for benchmarking/validation of reconstruct_compact_mean.
+    """
+    AODImg = np.full((nlines, nsamples), np.nan, dtype=np.float32)
 
-    # --- reconstruct: mean over all nAOD records per cell ---
     ncells = line_arr.shape[0]
     for i in range(ncells):
         line   = int(line_arr[i])
@@ -61,7 +156,82 @@ def extract_data(file_path):
 
         AODImg[line, sample] = np.mean(vals)
 
-    # --- clean & scale ---
+    return AODImg
+
+
+# --- region of interest (filter_region and the region-first decode) ---
+LAT_MAX, LAT_MIN = 43.150, 36.350
+LON_MIN, LON_MAX = -83.150, -70.100
+
+# --- MAIAC CMG grid (0.05°) ---
+NLINES   = 3600
+NSAMPLES = 7200
+
+# --- daily file layout ---
+# "sparse":      valid pixels stored once as int16 row/col + value (dense grid rebuilt on read)
+# "grid_points": full regional grid + float32 point copies (original layout)
+OUTPUT_LAYOUT = "sparse"
+
+# write AOD as int16 with the source scale_factor/_FillValue (False -> float32).
+# The compact-mean AOD and the std/min/max stats are derived values, not source quanta:
+# packing rounds them to the source step (0.001 AOD), so it is off by default
+PACK_INT16 = False
+
+# also write per-cell overpass count/min/max/std (AOD_055_count, ...) from the same pass
+OUTPUT_STATS = False
+STAT_VARS = ("AOD_055_count", "AOD_055_min", "AOD_055_max", "AOD_055_std")
+
+# mask cells with the gridded AOD_055_QA bit fields (dict of allowed states, see maiac_qa.py;
+# e.g. maiac_qa.DEFAULT_QA_POLICY). None -> no QA masking (compact records used as stored)
+QA_POLICY = None
+
+# --- used when the AOD_055 SDS lacks the attribute ---
+DEFAULT_FILL_VALUE   = -28672
+DEFAULT_VALID_RANGE  = [0, 6000]
+DEFAULT_SCALE_FACTOR = 0.001
+
+
+def global_axes():
+    """lat/lon axes of the 0.05° CMG grid as built by extract_data."""
+    line_indices   = np.arange(NLINES)
+    sample_indices = np.arange(NSAMPLES)
+    latitudes  = 90.0  - line_indices * 0.05      # 90 -> -90 (DESCENDING)
+    longitudes = -180.0 + sample_indices * 0.05   # -180 -> 180 (ASCENDING)
+    return latitudes, longitudes
+
+
+def region_window(lat_max=LAT_MAX, lat_min=LAT_MIN, lon_min=LON_MIN, lon_max=LON_MAX):
+    """
+    Row/column slices of the CMG grid that filter_region selects.
+    Uses the same pandas label slicing as ds.sel, so the window matches
+    filter_region exactly (including float edge cases).
+    """
+    latitudes, longitudes = global_axes()
+    rows = pd.Index(latitudes).slice_indexer(lat_max, lat_min)
+    cols = pd.Index(longitudes).slice_indexer(lon_min, lon_max)
+    return rows, cols
+
+
+def _read_compact(sd):
+    """Raw compact arrays (Compact_AOD_055 kept in its stored dtype)."""
+    compact_aod = sd.select("Compact_AOD_055")[:][0]
+    line_arr    = sd.select("Line")[:].astype(np.int32)[0]
+    sample_arr  = sd.select("Sample")[:].astype(np.int32)[0]
+    offset_arr  = sd.select("Offset_AOD_055")[:].astype(np.int64)[0]
+    nAOD_arr    = sd.select("nAOD")[:].astype(np.int32)[0]
+    return compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr
+
+
+def _read_scaling(sd):
+    """fill / valid range / scale from the AOD_055 SDS attributes."""
+    attrs = sd.select("AOD_055").attributes()
+    fill_value   = attrs.get("_FillValue", DEFAULT_FILL_VALUE)
+    valid_range  = attrs.get("valid_range", DEFAULT_VALID_RANGE)
+    scale_factor = attrs.get("scale_factor", DEFAULT_SCALE_FACTOR)
+    return fill_value, float(valid_range[0]), float(valid_range[1]), scale_factor
+
+
+def _clean_and_scale(AODImg, fill_value, valid_min, valid_max, scale_factor):
     AOD_raw = AODImg.copy()
     invalid_mask = (
         (AOD_raw == fill_value) |
@@ -69,17 +239,16 @@ def extract_data(file_path):
         (AOD_raw > valid_max)
     )
     AOD_raw[invalid_mask] = np.nan
-    AOD_phys = AOD_raw * scale_factor
+    return AOD_raw * scale_factor
 
-    # --- build lat/lon axes (0.05° global grid) ---
-    line_indices   = np.arange(nlines)
-    sample_indices = np.arange(nsamples)
-    latitudes  = 90.0  - line_indices * 0.05      # 90 -> -90 (DESCENDING)
-    longitudes = -180.0 + sample_indices * 0.05   # -180 -> 180 (ASCENDING)
 
-    sd.end()
+def _apply_qa(AOD_phys, qa, qa_policy):
+    """NaN out cells whose AOD_055_QA code the policy rejects (one LUT gather per cell)."""
+    AOD_phys[~qa_keep_mask(qa, qa_policy)] = np.nan
+    return AOD_phys
 
-    # --- wrap in xarray dataset (global) ---
+
+def _wrap_dataset(AOD_phys, latitudes, longitudes, source_dtype, fill_value, scale_factor):
     ds = xr.Dataset(
         {"AOD_055_compact": (["lat", "lon"], AOD_phys.astype(np.float32))},
         coords={"lat": latitudes, "lon": longitudes},
@@ -89,20 +258,145 @@ def extract_data(file_path):
         "units": "1",
         "description": "Reconstructed from Compact_AOD_055 using mean of all nAOD records per CMG grid cell.",
     })
+    ds["AOD_055_compact"].attrs.update(
+        source_packing_attrs(source_dtype, scale_factor=scale_factor, add_offset=0.0, fill_value=fill_value)
+    )
     ds["lat"].attrs.update({"long_name": "latitude", "units": "degrees_north"})
     ds["lon"].attrs.update({"long_name": "longitude", "units": "degrees_east"})
-    
     return ds
 
+
+def _add_stat_vars(ds, stats, scale_factor):
+    """
+    Add AOD_055_count/min/max/std from reconstruct_compact_stats to ds.
+    Cells whose mean AOD was rejected (fill / valid range) get count 0 and NaN stats.
+    """
+    ok = np.isfinite(ds["AOD_055_compact"].values)
+    source_attrs = {k: v for k, v in ds["AOD_055_compact"].attrs.items() if k in SOURCE_ATTRS}
+
+    ds["AOD_055_count"] = (("lat", "lon"), np.where(ok, stats["count"], 0).astype(np.int16))
+    ds["AOD_055_count"].attrs.update({
+        "long_name": "number of overpass records (nAOD) averaged per cell",
+        "units": "1",
+    })
+    for name, long_name in [
+        ("min", "minimum AOD at 550 nm over overpasses"),
+        ("max", "maximum AOD at 550 nm over overpasses"),
+        ("std", "standard deviation (ddof=0) of AOD at 550 nm over overpasses"),
+    ]:
+        values = np.where(ok, stats[name] * scale_factor, np.nan).astype(np.float32)
+        ds[f"AOD_055_{name}"] = (("lat", "lon"), values)
+        ds[f"AOD_055_{name}"].attrs.update({"long_name": long_name, "units": "1", **source_attrs})
+    return ds
+
+
+def extract_data(file_path, stats=False, qa_policy=None):
+    """
+    Reconstruct AOD from MAIAC compact format for one file:
+    - read Compact_AOD_055 + indexing arrays
+    - average all nAOD records per cell
+    - apply fill/scale from AOD_055 SDS
+    - return global gridded Dataset with AOD_055_compact(lat, lon)
+    - stats=True also adds AOD_055_count/min/max/std(lat, lon) from the same pass
+    - qa_policy masks cells by their AOD_055_QA bit fields (see maiac_qa.py)
+    """
+    sd = SD(file_path, SDC.READ)
+
+    # --- read compact arrays ---
+    compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr = _read_compact(sd)
+    source_dtype = compact_aod.dtype
+    compact_aod = compact_aod.astype(np.float32)
+
+    # --- get scaling / fill info from AOD_055 SDS ---
+    fill_value, valid_min, valid_max, scale_factor = _read_scaling(sd)
+    qa = sd.select("AOD_055_QA")[:] if qa_policy is not None else None
+
+    sd.end()
+
+    # --- reconstruct: mean (and optionally spread/count) over all nAOD records per cell ---
+    compact = (compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr, NLINES, NSAMPLES)
+    if stats:
+        cell_stats = reconstruct_compact_stats(*compact)
+        AODImg = cell_stats["mean"]
+    else:
+        AODImg = reconstruct_compact_mean(*compact)
+
+    # --- clean & scale ---
+    AOD_phys = _clean_and_scale(AODImg, fill_value, valid_min, valid_max, scale_factor)
+    if qa is not None:
+        AOD_phys = _apply_qa(AOD_phys, qa, qa_policy)
+
+    # --- wrap in xarray dataset (global) ---
+    latitudes, longitudes = global_axes()
+    ds = _wrap_dataset(AOD_phys, latitudes, longitudes, source_dtype, fill_value, scale_factor)
+    if qa is not None:
+        ds["AOD_055_compact"].attrs["qa_policy"] = policy_string(qa_policy)
+    if stats:
+        _add_stat_vars(ds, cell_stats, scale_factor)
+    return ds
+
+
+def extract_region(file_path, lat_max=LAT_MAX, lat_min=LAT_MIN, lon_min=LON_MIN, lon_max=LON_MAX,
+                   stats=False, qa_policy=None):
+    """
+    Region-first version of filter_region(extract_data(file_path, stats, qa_policy)).
+
+    Drops Line/Sample records outside the region window before any
+    decoding, then reconstructs/cleans/scales only the regional sub-grid.
+    Never allocates the global 3600x7200 grid; returns the same Dataset
+    filter_region would. Only the regional window of AOD_055_QA is read.
+    """
+    rows, cols = region_window(lat_max, lat_min, lon_min, lon_max)
+
+    sd = SD(file_path, SDC.READ)
+    compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr = _read_compact(sd)
+    fill_value, valid_min, valid_max, scale_factor = _read_scaling(sd)
+    qa = read_sds_window(sd, "AOD_055_QA", rows, cols) if qa_policy is not None else None
+    sd.end()
+
+    # --- keep only records whose cell falls in the window ---
+    in_region = (
+        (line_arr >= rows.start) & (line_arr < rows.stop) &
+        (sample_arr >= cols.start) & (sample_arr < cols.stop)
+    )
+    nlines_reg  = rows.stop - rows.start
+    nsamples_reg = cols.stop - cols.start
+
+    compact = (
+        compact_aod,
+        line_arr[in_region] - rows.start,
+        sample_arr[in_region] - cols.start,
+        offset_arr[in_region],
+        nAOD_arr[in_region],
+        nlines_reg,
+        nsamples_reg,
+    )
+    if stats:
+        cell_stats = reconstruct_compact_stats(*compact)
+        AODImg = cell_stats["mean"]
+    else:
+        AODImg = reconstruct_compact_mean(*compact)
+
+    AOD_phys = _clean_and_scale(AODImg, fill_value, valid_min, valid_max, scale_factor)
+    if qa is not None:
+        AOD_phys = _apply_qa(AOD_phys, qa, qa_policy)
+
+    latitudes, longitudes = global_axes()
+    ds = _wrap_dataset(AOD_phys, latitudes[rows], longitudes[cols],
+                       compact_aod.dtype, fill_value, scale_factor)
+    if qa is not None:
+        ds["AOD_055_compact"].attrs["qa_policy"] = policy_string(qa_policy)
+    if stats:
+        _add_stat_vars(ds, cell_stats, scale_factor)
+    return ds
+
+
 def filter_region(ds):
     """Subset to region of interest (gridded)."""
-    lat_max, lat_min = 43.150, 36.350
-    lon_min, lon_max = -83.150, -70.100
-
-    # lat is descending, so slice(lat_max, lat_min)
+    # lat is descending, so slice(LAT_MAX, LAT_MIN)
     return ds.sel(
-        lat=slice(lat_max, lat_min),
-        lon=slice(lon_min, lon_max)
+        lat=slice(LAT_MAX, LAT_MIN),
+        lon=slice(LON_MIN, LON_MAX)
     )
 
 def add_points_from_region(ds_reg):
@@ -148,60 +442,123 @@ def add_points_from_region(ds_reg):
             "averaged per CMG grid cell and scaled as in gridded field."
         ),
     })
+    ds_out["AOD_055_compact_points"].attrs.update({
+        k: v for k, v in ds_reg["AOD_055_compact"].attrs.items() if k in SOURCE_ATTRS
+    })
     ds_out["lat"].attrs.update({"long_name": "latitude", "units": "degrees_north"})
     ds_out["lon"].attrs.update({"long_name": "longitude", "units": "degrees_east"})
     ds_out["lat_points"].attrs.update({"long_name": "latitude of points", "units": "degrees_north"})
     ds_out["lon_points"].attrs.update({"long_name": "longitude of points", "units": "degrees_east"})
 
+    # optional per-cell statistics stay gridded
+    for name in STAT_VARS:
+        if name in ds_reg:
+            ds_out[name] = ds_reg[name]
+
     return ds_out
 
-def main():
-    # --- paths ---
-    input_base_dir  = "/home/ellab/air_pollution/src/data/new_aod"
-    output_base_dir = "/home/ellab/air_pollution/src/data/clean_aod"
-
-    # --- years to process ---
-    START_YEAR = 2017
-    END_YEAR   = 2024
-
-    for year in range(START_YEAR, END_YEAR + 1):
-        year_dir = os.path.join(input_base_dir, str(year))
-        if not os.path.isdir(year_dir):
-            print(f"Skipping {year} (no folder).")
-            continue
+def sparse_from_region(ds_reg):
+    """
+    Sparse valid-pixel layout of a regional gridded Dataset:
+    every finite AOD_055_compact cell stored once as (valid_row, valid_col, value),
+    with row/col as int16 indices into the kept 1-D lat/lon axes.
+    """
+    A = ds_reg["AOD_055_compact"].values  # 2D (lat, lon)
+    if max(A.shape) > np.iinfo(np.int16).max:
+        raise ValueError(f"region {A.shape} too large for int16 row/col indices")
 
-        out_year_dir = os.path.join(output_base_dir, str(year))
-        os.makedirs(out_year_dir, exist_ok=True)
+    rows, cols = np.nonzero(np.isfinite(A))
 
-        for filename in sorted(os.listdir(year_dir)):
-            if not filename.lower().endswith(".hdf"):
-                continue
+    ds_out = xr.Dataset(
+        {
+            "AOD_055_compact_valid": (("valid",), A[rows, cols].astype(np.float32)),
+            "valid_row": (("valid",), rows.astype(np.int16)),
+            "valid_col": (("valid",), cols.astype(np.int16)),
+        },
+        coords={
+            "lat": ds_reg["lat"].values,
+            "lon": ds_reg["lon"].values,
+        },
+    )
 
-            file_path = os.path.join(year_dir, filename)
-            output_filename = filename.replace(".hdf", "_clean.nc")
-            output_path = os.path.join(out_year_dir, output_filename)
+    ds_out["AOD_055_compact_valid"].attrs.update(ds_reg["AOD_055_compact"].attrs)
+    ds_out["AOD_055_compact_valid"].attrs["description"] += (
+        " Subset to specified region; only valid (finite) cells stored, at (lat[valid_row], lon[valid_col])."
+    )
+    # optional per-cell statistics share the same valid cells
+    for name in STAT_VARS:
+        if name in ds_reg:
+            ds_out[name] = (("valid",), ds_reg[name].values[rows, cols])
+            ds_out[name].attrs.update(ds_reg[name].attrs)
+
+    ds_out["valid_row"].attrs.update({"long_name": "row index into lat of each valid cell"})
+    ds_out["valid_col"].attrs.update({"long_name": "column index into lon of each valid cell"})
+    ds_out["lat"].attrs.update({"long_name": "latitude", "units": "degrees_north"})
+    ds_out["lon"].attrs.update({"long_name": "longitude", "units": "degrees_east"})
+    ds_out.attrs["layout"] = "sparse_valid_pixels"
+
+    return ds_out
+
+
+def clean_to_grid(ds, name="AOD_055_compact"):
+    """
+    Dense regional grid (lat, lon) of AOD (or one of STAT_VARS) from a cleaned daily file.
+    Sparse files: one scatter of the valid values into a NaN (count: 0) grid.
+    """
+    if "AOD_055_compact_valid" not in ds:
+        return ds["AOD_055_compact_gridded"] if name == "AOD_055_compact" else ds[name]
 
-            # ✅ Skip if this file has already been processed
-            if os.path.exists(output_path):
-                print(f"Skipping already processed file: {output_path}")
-                continue
+    src = ds["AOD_055_compact_valid"] if name == "AOD_055_compact" else ds[name]
+    fill = 0 if np.issubdtype(src.dtype, np.integer) else np.nan
+    grid = np.full((ds.sizes["lat"], ds.sizes["lon"]), fill, dtype=src.dtype)
+    grid[ds["valid_row"].values, ds["valid_col"].values] = src.values
+
+    da = xr.DataArray(grid, dims=("lat", "lon"), coords={"lat": ds["lat"], "lon": ds["lon"]},
+                      name="AOD_055_compact_gridded" if name == "AOD_055_compact" else name)
+    da.attrs.update(src.attrs)
+    return da
+
+
+def clean_to_points(ds):
+    """
+    Valid pixels (aod, lat, lon) as 1-D arrays from a cleaned daily file,
+    without building the dense grid or a meshgrid.
+    """
+    if "AOD_055_compact_valid" not in ds:
+        return (
+            ds["AOD_055_compact_points"].values,
+            ds["lat_points"].values,
+            ds["lon_points"].values,
+        )
+
+    rows = ds["valid_row"].values
+    cols = ds["valid_col"].values
+    return (
+        ds["AOD_055_compact_valid"].values,
+        ds["lat"].values[rows].astype(np.float32),
+        ds["lon"].values[cols].astype(np.float32),
+    )
+
+
+def main():
+    # paths / years / layout: the "aod_compact" entry of ingest.PRODUCTS
+    # (built from the settings at the top of this file)
 
-            try:
-                ds_global = extract_data(file_path)      # global compact AOD
-                ds_reg    = filter_region(ds_global)     # regional gridded
-                ds_out    = add_points_from_region(ds_reg)  # add points
+    # --- parallelism ---
+    N_WORKERS     = None   # None -> all CPUs
+    WORKER_MEM_MB = 1500   # per-worker memory budget (caps the worker count)
 
-                # compress all data variables
-                encoding = {
-                    var: {"zlib": True, "complevel": 4}
-                    for var in ds_out.data_vars
-                }
+    # --- output mode ---
+    # "daily_files": one <name>_clean.nc per day (sparse or grid + points)
+    # "store":       append each day's regional grid to one chunked (time, lat, lon) file
+    OUTPUT_MODE = "daily_files"
 
-                ds_out.to_netcdf(output_path, encoding=encoding)
-                print(f"Saved: {output_path}")
+    # "pool": parallel decode; "pipeline": prefetch next files while decoding (network disk)
+    EXECUTOR = "pool"
 
-            except Exception as e:
-                print(f"Failed to process {file_path}: {e}")
+    from ingest import run_product  # ingest builds its registry from this module
+    run_product("aod_compact", mode=OUTPUT_MODE, n_workers=N_WORKERS, mem_budget_mb=WORKER_MEM_MB,
+                executor=EXECUTOR)
 
 if __name__ == "__main__":
     main()
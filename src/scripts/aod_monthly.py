@@ -0,0 +1,248 @@
+# builds aod_monthly_2005_2024.parquet (used by ml_model/models/integrated_rf.py) from the
+# cleaned daily AOD files written by aod_clean3 / ingest ("aod_compact")
+# 1. per (year, month): streams that month's daily _clean.nc files, keeping only a running
+#    sum + valid-day count per pixel (constant memory: two regional grids)
+# 2. writes one long-format part per month: time, lat, lon, aod_monthly_mean, n_days
+#    (pixels with at least one valid day)
+# 3. concatenates the parts (in time order, one part in memory at a time) into the parquet
+#
+# With LAKE_ROOT set, rebuilt months are also written as year=/month=/tile= partitions
+# (monthly_lake.py), so adding a month rewrites only that month's partition.
+#
+# Grid: every pixel is labelled on the aod_clean3 CMG axes (lat 90 - k*0.05, lon -180 + k*0.05).
+# The 2005 aod_clean / ingest "aod_cmg" files label the same cells by their centres (0.025°
+# off), so their lat/lon are moved onto those labels; combine_parts refuses parts that are
+# not on them, so the parquet never mixes the two conventions.
+#
+# Years run in parallel (batch_driver). A month's part is rebuilt only when the set of its
+# daily files (names, sizes, mtimes) or CODE_VERSION changed, so adding a new month only
+# reads that month's files.
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xarray as xr
+
+from aod_clean3 import clean_to_grid
+from batch_driver import print_report, run_batch
+from hdf_window import CMG_RES
+from manifest import load_manifest, params_digest, save_manifest
+from monthly_lake import month_dir, write_month
+from timeseries_store import date_from_filename
+
+# bump when a change to this script changes what ends up in the outputs
+CODE_VERSION = "aod_monthly-2"
+
+PARTS_DIR_NAME = "aod_monthly_parts"
+PART_MANIFEST_NAME = "aod_monthly_parts.json"
+
+SCHEMA = pa.schema([
+    ("time", pa.timestamp("ns")),
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("aod_monthly_mean", pa.float32()),
+    ("n_days", pa.int16()),
+])
+
+
+def daily_files_by_month(clean_dir, start_year, end_year):
+    """{(year, month): [daily _clean.nc paths, sorted]} for the cleaned daily AOD folders."""
+    months = {}
+    for year in range(start_year, end_year + 1):
+        year_dir = os.path.join(clean_dir, str(year))
+        if not os.path.isdir(year_dir):
+            continue
+        for filename in sorted(os.listdir(year_dir)):
+            if not filename.endswith("_clean.nc"):
+                continue
+            date = pd.Timestamp(date_from_filename(filename))
+            months.setdefault((date.year, date.month), []).append(os.path.join(year_dir, filename))
+    return months
+
+
+def month_fingerprint(paths):
+    """Digest of a month's inputs (name, size, mtime) + CODE_VERSION."""
+    listing = []
+    for path in paths:
+        st = os.stat(path)
+        listing.append([os.path.basename(path), st.st_size, st.st_mtime_ns])
+    return params_digest({"files": listing, "code_version": CODE_VERSION})
+
+
+def part_path(parts_dir, year, month):
+    return os.path.join(parts_dir, f"{year:04d}-{month:02d}.parquet")
+
+
+def grid_labels(ds):
+    """
+    lat / lon of a daily file on the aod_clean3 CMG axes (aod_clean3.global_axes):
+    cell-centre labels (aod_clean / "aod_cmg" files, AOD variable) are moved half a cell
+    up / left onto the same cell's label.
+    """
+    lat = ds["lat"].values.astype(np.float64)
+    lon = ds["lon"].values.astype(np.float64)
+    if "AOD" in ds:
+        rows = np.rint((90.0 - CMG_RES / 2 - lat) / CMG_RES)
+        cols = np.rint((lon - (-180.0 + CMG_RES / 2)) / CMG_RES)
+        lat, lon = 90.0 - rows * CMG_RES, -180.0 + cols * CMG_RES
+    return lat, lon
+
+
+def on_cmg_axes(lat, lon):
+    """True if every lat / lon is on the aod_clean3 CMG axes (k * 0.05, within 1e-3 cell)."""
+    return all(
+        np.abs(v / CMG_RES - np.rint(v / CMG_RES)).max(initial=0.0) < 1e-3
+        for v in (np.asarray(lat), np.asarray(lon))
+    )
+
+
+def _accumulate(ds, sums, counts):
+    """Add one day's valid pixels to the running sum / count (flat regional grids)."""
+    n_lon = ds.sizes["lon"]
+    if "AOD_055_compact_valid" in ds:
+        # sparse layout: valid pixels only, no dense grid needed
+        flat = ds["valid_row"].values.astype(np.int64) * n_lon + ds["valid_col"].values
+        vals = ds["AOD_055_compact_valid"].values.astype(np.float64)
+        ok = np.isfinite(vals)
+        flat, vals = flat[ok], vals[ok]
+    else:
+        # aod_clean3 grid layout, or the single "AOD" grid of aod_clean / ingest "aod_cmg"
+        dense = clean_to_grid(ds) if "AOD_055_compact_gridded" in ds else ds["AOD"]
+        grid = dense.transpose("lat", "lon").values.astype(np.float64).ravel()
+        flat = np.flatnonzero(np.isfinite(grid))
+        vals = grid[flat]
+    sums += np.bincount(flat, weights=vals, minlength=sums.size)
+    counts += np.bincount(flat, minlength=counts.size).astype(counts.dtype)
+
+
+def aggregate_month(paths, year, month):
+    """Long-format monthly means of one month's daily files (DataFrame in SCHEMA order)."""
+    lat = lon = sums = counts = None
+    for path in paths:
+        with xr.open_dataset(path) as ds:
+            day_lat, day_lon = grid_labels(ds)
+            if sums is None:
+                lat, lon = day_lat, day_lon
+                sums = np.zeros(lat.size * lon.size, dtype=np.float64)
+                counts = np.zeros(lat.size * lon.size, dtype=np.int32)
+            elif (day_lat.size != lat.size or day_lon.size != lon.size
+                  or not np.allclose(day_lat, lat) or not np.allclose(day_lon, lon)):
+                raise ValueError(f"{path}: lat/lon grid differs from the month's first file")
+            _accumulate(ds, sums, counts)
+
+    if sums is None:
+        return pd.DataFrame({f.name: pd.Series(dtype=f.type.to_pandas_dtype()) for f in SCHEMA})
+
+    cells = np.flatnonzero(counts > 0)
+    rows, cols = np.divmod(cells, lon.size)
+    return pd.DataFrame({
+        "time": np.full(cells.size, np.datetime64(f"{year:04d}-{month:02d}-01", "ns")),
+        "lat": lat[rows],
+        "lon": lon[cols],
+        "aod_monthly_mean": (sums[cells] / counts[cells]).astype(np.float32),
+        "n_days": np.minimum(counts[cells], np.iinfo(np.int16).max).astype(np.int16),
+    })
+
+
+def process_year(task):
+    """Batch worker: rebuild the listed month parts of one year."""
+    for month, paths in task["months"]:
+        df = aggregate_month(paths, task["year"], month)
+        out = part_path(task["parts_dir"], task["year"], month)
+        tmp = f"{out}.{os.getpid()}.tmp"
+        pq.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False), tmp)
+        os.replace(tmp, out)
+    return {"status": "ok", "n_months": len(task["months"])}
+
+
+def combine_parts(parts_dir, output_path, keys):
+    """
+    Stream the month parts of keys ("YYYY-MM", months that still have daily files) in
+    time order into one parquet file; returns the row count.
+    """
+    tmp = f"{output_path}.{os.getpid()}.tmp"
+    n_rows = 0
+    with pq.ParquetWriter(tmp, SCHEMA) as writer:
+        for key in sorted(keys):
+            table = pq.read_table(os.path.join(parts_dir, f"{key}.parquet"), schema=SCHEMA)
+            if not on_cmg_axes(table["lat"].to_numpy(), table["lon"].to_numpy()):
+                raise ValueError(f"month part {key} is not on the CMG axes; rebuild it")
+            writer.write_table(table)
+            n_rows += table.num_rows
+    os.replace(tmp, output_path)
+    return n_rows
+
+
+def main():
+    # ***change these as needed
+    clean_dir = "/home/ellab/air_pollution/src/data/clean_aod"          # aod_clean3 daily outputs
+    output_path = "/home/ellab/air_pollution/src/data/aod/aod_monthly_2005_2024.parquet"
+
+    START_YEAR = 2005
+    END_YEAR = 2024
+    N_WORKERS = None   # years in parallel; None -> all CPUs
+    LAKE_ROOT = None   # e.g. "/home/ellab/air_pollution/src/data/monthly_lake"; None -> parquet only
+    LAKE_TILE_DEG = 5.0
+
+    out_dir = os.path.dirname(output_path)
+    parts_dir = os.path.join(out_dir, PARTS_DIR_NAME)
+    os.makedirs(parts_dir, exist_ok=True)
+    manifest = load_manifest(os.path.join(out_dir, PART_MANIFEST_NAME))
+
+    # --- months whose inputs changed since their part was built ---
+    by_year = {}
+    fingerprints = {}
+    for (year, month), paths in sorted(daily_files_by_month(clean_dir, START_YEAR, END_YEAR).items()):
+        key = f"{year:04d}-{month:02d}"
+        fingerprints[key] = month_fingerprint(paths)
+        entry = manifest["entries"].get(key)
+        if (entry is not None and entry.get("fingerprint") == fingerprints[key]
+                and os.path.exists(part_path(parts_dir, year, month))):
+            continue
+        by_year.setdefault(year, []).append((month, paths))
+
+    tasks = [
+        {"input": os.path.join(clean_dir, str(year)), "year": year, "months": months,
+         "parts_dir": parts_dir}
+        for year, months in by_year.items()
+    ]
+    print(f"{sum(len(t['months']) for t in tasks)} month(s) to (re)build in {len(tasks)} year(s).")
+
+    def on_record(record):
+        if record["status"] != "ok":
+            return
+        year = int(os.path.basename(record["input"]))
+        for month, _ in by_year[year]:
+            key = f"{year:04d}-{month:02d}"
+            manifest["entries"][key] = {"fingerprint": fingerprints[key]}
+        save_manifest(manifest)
+
+    report = run_batch(process_year, tasks, n_workers=N_WORKERS, on_record=on_record)
+    print_report(report)
+    if report["n_failed"]:
+        print("Not writing the combined parquet: some years failed.")
+        return
+
+    # parts of months whose daily files are gone are left out
+    n_rows = combine_parts(parts_dir, output_path, fingerprints)
+    print(f"Saved: {output_path} ({n_rows:,} pixel-months)")
+
+    if LAKE_ROOT is not None:
+        # rebuilt months, plus months the lake does not have yet
+        rebuilt = {(year, month) for year, months in by_year.items() for month, _ in months}
+        lake_table = os.path.join(LAKE_ROOT, "aod_monthly")
+        n_written = 0
+        for key in sorted(fingerprints):
+            year, month = int(key[:4]), int(key[5:])
+            if (year, month) in rebuilt or not os.path.isdir(month_dir(lake_table, year, month)):
+                table = pq.read_table(part_path(parts_dir, year, month), schema=SCHEMA)
+                write_month(LAKE_ROOT, "aod_monthly", table, year, month, LAKE_TILE_DEG)
+                n_written += 1
+        print(f"Lake: wrote {n_written} month partition(s) under {lake_table}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# process-pool batch driver for the cleaning scripts
+# 1. runs one worker function per (input file -> output file) task in a pool of processes
+# 2. caps the worker count by a per-worker memory budget
+# 3. collects failures + throughput (files/sec, MB/s) into one summary report
+#
+# Each task runs entirely inside one worker process, so HDF4/HDF5 handles are
+# opened and closed there and never shared between processes.
+
+import multiprocessing as mp
+import os
+import resource
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+
+def available_memory_mb():
+    """Currently available physical memory (MB), or None if unknown."""
+    try:
+        pages = os.sysconf("SC_AVPHYS_PAGES")
+        page_size = os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+    return pages * page_size / 1e6
+
+
+def plan_workers(n_workers=None, mem_budget_mb=None):
+    """
+    Number of worker processes to start:
+    - n_workers (default: all CPUs)
+    - but no more than available memory / mem_budget_mb
+    """
+    n = n_workers or os.cpu_count() or 1
+    if mem_budget_mb:
+        avail = available_memory_mb()
+        if avail is not None:
+            n = min(n, max(1, int(avail // mem_budget_mb)))
+    return max(1, n)
+
+
+def _init_worker(mem_budget_mb):
+    # hard cap on address space so a runaway file fails alone instead of OOM-killing the node
+    if mem_budget_mb:
+        limit = int(mem_budget_mb * 1e6)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run_task(worker_fn, task):
+    """Run one task; never raises (errors are returned as data)."""
+    t0 = time.perf_counter()
+    try:
+        result = worker_fn(task) or {}
+        status = result.get("status", "ok")
+        error = result.get("error")
+    except Exception as e:
+        result = {}
+        status = "failed"
+        error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+    return {
+        "input": task["input"],
+        "output": task.get("output"),
+        "status": status,
+        "error": error,
+        "seconds": time.perf_counter() - t0,
+        "result": result,
+    }
+
+
+def run_batch(worker_fn, tasks, n_workers=None, mem_budget_mb=None, enforce_memory=False,
+              on_record=None):
+    """
+    Run worker_fn(task) for every task and return a summary report (dict).
+
+    worker_fn : top-level (picklable) function taking a task dict with at least
+                "input" (and usually "output"); may return a dict with "status"
+                ("ok" / "skipped" / "failed") and "error".
+    tasks     : list of task dicts; processed in sorted input order.
+    n_workers : processes to use (default: all CPUs, capped by mem_budget_mb).
+    mem_budget_mb : per-worker memory budget; limits concurrency, and with
+                enforce_memory=True is also set as each worker's RLIMIT_AS.
+    on_record : optional callback(record) run in this (parent) process as each
+                task's record is collected, e.g. to update a manifest.
+    """
+    tasks = sorted(tasks, key=lambda t: t["input"])
+    n = plan_workers(n_workers, mem_budget_mb)
+
+    t0 = time.perf_counter()
+    records = []
+
+    if n == 1:
+        for task in tasks:
+            records.append(_run_task(worker_fn, task))
+            if on_record is not None:
+                on_record(records[-1])
+    else:
+        # spawn: workers start clean (no inherited library state or open handles)
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=n,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(mem_budget_mb if enforce_memory else None,),
+        ) as pool:
+            futures = [pool.submit(_run_task, worker_fn, task) for task in tasks]
+            # collect in submission order -> deterministic report order
+            for task, fut in zip(tasks, futures):
+                try:
+                    records.append(fut.result())
+                except Exception as e:  # worker died (e.g. killed for memory)
+                    records.append({
+                        "input": task["input"],
+                        "output": task.get("output"),
+                        "status": "failed",
+                        "error": f"{type(e).__name__}: {e}",
+                        "seconds": None,
+                        "result": {},
+                    })
+                if on_record is not None:
+                    on_record(records[-1])
+
+    elapsed = time.perf_counter() - t0
+
+    # throughput counts the files that were actually processed
+    input_bytes = sum(
+        os.path.getsize(r["input"]) for r in records
+        if r["status"] == "ok" and os.path.exists(r["input"])
+    )
+
+    n_ok = sum(r["status"] == "ok" for r in records)
+
+    return {
+        "n_tasks": len(tasks),
+        "n_workers": n,
+        "n_ok": n_ok,
+        "n_skipped": sum(r["status"] == "skipped" for r in records),
+        "n_failed": sum(r["status"] == "failed" for r in records),
+        "failures": [(r["input"], r["error"]) for r in records if r["status"] == "failed"],
+        "records": records,
+        "elapsed_s": elapsed,
+        "input_mb": input_bytes / 1e6,
+        "files_per_s": n_ok / elapsed if elapsed > 0 else float("nan"),
+        "mb_per_s": input_bytes / 1e6 / elapsed if elapsed > 0 else float("nan"),
+    }
+
+
+def print_report(report):
+    print("\n===== batch summary =====")
+    print(f"tasks={report['n_tasks']}  workers={report['n_workers']}  "
+          f"ok={report['n_ok']}  skipped={report['n_skipped']}  failed={report['n_failed']}")
+    print(f"elapsed={report['elapsed_s']:.1f}s  "
+          f"{report['files_per_s']:.2f} files/s  {report['mb_per_s']:.1f} MB/s "
+          f"({report['input_mb']:.1f} MB read)")
+    if "pipeline" in report:  # counters from pipeline.run_pipeline
+        p = report["pipeline"]
+        print(f"pipeline: prefetch={p['n_prefetch']} io_threads={p['n_io_threads']}  "
+              f"fetch={p['fetch_s']:.1f}s decode={p['decode_s']:.1f}s write={p['write_s']:.1f}s")
+        print(f"  decoder stalled on reads={p['decode_wait_fetch_s']:.1f}s  "
+              f"on writer={p['decode_wait_write_s']:.1f}s  writer idle={p['writer_idle_s']:.1f}s")
+        print(f"  prefetched files ready: mean={p['prefetch_ready_mean']:.2f} min={p['prefetch_ready_min']}  "
+              f"write queue: mean={p['write_queue_mean']:.2f} max={p['write_queue_max']}"
+              f"/{p['write_queue_size']}")
+    if report["failures"]:
+        print("\nFailures:")
+        for path, err in report["failures"]:
+            first_line = (err or "").splitlines()[0] if err else ""
+            print(f"  {path}: {first_line}")
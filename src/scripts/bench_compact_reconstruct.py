@@ -0,0 +1,104 @@
+# benchmark: vectorized vs per-cell-loop MAIAC compact reconstruction
+# 1. writes synthetic MCD19A2CMG-style compact HDF4 files (Compact_AOD_055, Line, Sample, ...)
+# 2. reads the compact arrays the same way aod_clean3.extract_data does
+# 3. times reconstruct_compact_mean_loop vs reconstruct_compact_mean and checks bit-identical output
+
+import os
+import tempfile
+import time
+
+import numpy as np
+from pyhdf.SD import SD, SDC
+
+from aod_clean3 import reconstruct_compact_mean, reconstruct_compact_mean_loop
+
+# ***change these as needed
+N_FILES = 3
+N_CELLS = 200_000          # cells with at least one overpass (real days: ~1e6-5e6)
+MAX_OVERPASSES = 6         # nAOD drawn from 1..MAX_OVERPASSES
+NLINES, NSAMPLES = 3600, 7200
+SEED = 0
+
+
+def write_synthetic_compact(path, n_cells, max_overpasses, seed):
+    """Write a compact-format HDF4 file with the SDS names/shapes aod_clean3 reads."""
+    rng = np.random.default_rng(seed)
+
+    flat = rng.choice(NLINES * NSAMPLES, size=n_cells, replace=False)
+    flat.sort()
+    line = (flat // NSAMPLES).astype(np.int16)
+    sample = (flat % NSAMPLES).astype(np.int16)
+    nAOD = rng.integers(1, max_overpasses + 1, size=n_cells).astype(np.int16)
+    offset = (np.cumsum(nAOD) - nAOD).astype(np.int32)
+
+    # mostly valid AOD (0..1500), some fill values like the real product
+    compact = rng.integers(0, 1500, size=int(nAOD.sum())).astype(np.int16)
+    compact[rng.random(compact.size) < 0.02] = -28672
+
+    sd = SD(path, SDC.WRITE | SDC.CREATE | SDC.TRUNC)
+
+    def put(name, arr, sdc_type):
+        sds = sd.create(name, sdc_type, (1, arr.size))
+        sds[:] = arr[np.newaxis, :]
+        sds.endaccess()
+
+    put("Compact_AOD_055", compact, SDC.INT16)
+    put("Line", line, SDC.INT16)
+    put("Sample", sample, SDC.INT16)
+    put("Offset_AOD_055", offset, SDC.INT32)
+    put("nAOD", nAOD, SDC.INT16)
+
+    # AOD_055 only needs to exist for its attributes (kept tiny here)
+    grid = sd.create("AOD_055", SDC.INT16, (1, 1))
+    grid[:] = np.array([[-28672]], dtype=np.int16)
+    grid._FillValue = -28672
+    grid.valid_range = [0, 6000]
+    grid.scale_factor = 0.001
+    grid.endaccess()
+
+    sd.end()
+
+
+def read_compact(path):
+    sd = SD(path, SDC.READ)
+    compact_aod = sd.select("Compact_AOD_055")[:].astype(np.float32)[0]
+    line_arr    = sd.select("Line")[:].astype(np.int32)[0]
+    sample_arr  = sd.select("Sample")[:].astype(np.int32)[0]
+    offset_arr  = sd.select("Offset_AOD_055")[:].astype(np.int64)[0]
+    nAOD_arr    = sd.select("nAOD")[:].astype(np.int32)[0]
+    sd.end()
+    return compact_aod, line_arr, sample_arr, offset_arr, nAOD_arr
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        t_loop, t_vec = [], []
+
+        for k in range(N_FILES):
+            path = os.path.join(tmp_dir, f"maiac_aod_synth_{k}.hdf")
+            write_synthetic_compact(path, N_CELLS, MAX_OVERPASSES, SEED + k)
+            arrays = read_compact(path)
+
+            t0 = time.perf_counter()
+            img_loop = reconstruct_compact_mean_loop(*arrays, NLINES, NSAMPLES)
+            t1 = time.perf_counter()
+            img_vec = reconstruct_compact_mean(*arrays, NLINES, NSAMPLES)
+            t2 = time.perf_counter()
+
+            # compare raw bits so NaN cells and -0.0 count too
+            identical = np.array_equal(img_loop.view(np.uint32), img_vec.view(np.uint32))
+            if not identical:
+                raise RuntimeError(f"vectorized output differs from loop for {path}")
+
+            t_loop.append(t1 - t0)
+            t_vec.append(t2 - t1)
+            print(f"file {k}: loop={t1 - t0:.3f}s  vectorized={t2 - t1:.3f}s  bit-identical={identical}")
+
+    loop_med = float(np.median(t_loop))
+    vec_med = float(np.median(t_vec))
+    print(f"\ncells/file={N_CELLS:,}  median loop={loop_med:.3f}s  "
+          f"median vectorized={vec_med:.3f}s  speedup={loop_med / vec_med:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmark: full sds[:] read + subset vs windowed get(start, count) for MAIAC CMG HDF4 files
+# 1. writes synthetic global 3600 x 7200 int16 AOD_055 / AOD_055_QA / Weight_055 files
+#    in two SDS storage layouts: contiguous and deflate (pyhdf cannot write chunked SDS)
+# 2. per file, reads the three SDS either whole and subsets, or only the region window
+# 3. reports bytes copied into numpy and time per file, and checks both paths agree
+
+import os
+import tempfile
+import time
+
+import numpy as np
+from pyhdf.SD import SD, SDC
+
+from hdf_window import cmg_window, read_sds_full, read_sds_window, sds_shape
+
+# ***change these as needed
+N_FILES = 5
+N_LAT, N_LON = 3600, 7200
+LAT_MAX, LAT_MIN = 43.150, 36.350
+LON_MIN, LON_MAX = -83.150, -70.100
+SDS_NAMES = ("AOD_055", "AOD_055_QA", "Weight_055")
+SEED = 0
+
+
+def write_synthetic_cmg(path, layout, rng):
+    """One global CMG file with int16 AOD_055 / AOD_055_QA / Weight_055 stored as `layout`."""
+    sd = SD(path, SDC.WRITE | SDC.CREATE)
+    for name in SDS_NAMES:
+        if name == "AOD_055":
+            data = rng.gamma(2.0, 60.0, size=(N_LAT, N_LON)).astype(np.int16)
+            data[rng.random((N_LAT, N_LON)) > 0.4] = -28672
+        else:
+            data = rng.integers(0, 4, size=(N_LAT, N_LON), dtype=np.int16)
+        sds = sd.create(name, SDC.INT16, data.shape)
+        if layout == "deflate":
+            sds.setcompress(SDC.COMP_DEFLATE, 4)
+        sds[:] = data
+        sds.endaccess()
+    sd.end()
+
+
+def read_full(path):
+    sd = SD(path, SDC.READ)
+    n_lat, n_lon = sds_shape(sd, "AOD_055")
+    rows, cols, _, _ = cmg_window(n_lat, n_lon, LAT_MAX, LAT_MIN, LON_MIN, LON_MAX)
+    out, nbytes = {}, 0
+    for name in SDS_NAMES:
+        data = read_sds_full(sd, name)
+        nbytes += data.nbytes
+        out[name] = data[rows, cols]
+    sd.end()
+    return out, nbytes
+
+
+def read_window(path):
+    sd = SD(path, SDC.READ)
+    n_lat, n_lon = sds_shape(sd, "AOD_055")
+    rows, cols, _, _ = cmg_window(n_lat, n_lon, LAT_MAX, LAT_MIN, LON_MIN, LON_MAX)
+    out, nbytes = {}, 0
+    for name in SDS_NAMES:
+        data = read_sds_window(sd, name, rows, cols)
+        nbytes += data.nbytes
+        out[name] = data
+    sd.end()
+    return out, nbytes
+
+
+def time_reads(paths, reader):
+    reader(paths[0])  # warm-up (page cache, window cache)
+    t0 = time.perf_counter()
+    nbytes = 0
+    for path in paths:
+        _, n = reader(path)
+        nbytes += n
+    return (time.perf_counter() - t0) / len(paths), nbytes / len(paths)
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for layout in ("contiguous", "deflate"):
+            paths = []
+            for i in range(N_FILES):
+                path = os.path.join(tmp_dir, f"{layout}_{i}.hdf")
+                write_synthetic_cmg(path, layout, rng)
+                paths.append(path)
+
+            full, _ = read_full(paths[0])
+            window, _ = read_window(paths[0])
+            same = all(np.array_equal(full[n], window[n]) for n in SDS_NAMES)
+
+            t_full, b_full = time_reads(paths, read_full)
+            t_win, b_win = time_reads(paths, read_window)
+            size_mb = os.path.getsize(paths[0]) / 1e6
+
+            print(f"--- {layout} ({size_mb:.1f} MB/file, {N_FILES} files) ---")
+            print(f"full read + subset: {t_full * 1e3:8.1f} ms/file, {b_full / 1e6:7.2f} MB copied/file")
+            print(f"windowed get()    : {t_win * 1e3:8.1f} ms/file, {b_win / 1e6:7.2f} MB copied/file")
+            print(f"speedup: {t_full / t_win:.1f}x   identical: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# benchmark suite: ingestion throughput on synthetic satellite files (synthetic_fixtures.py)
+# 1. writes (or reuses) a small archive of synthetic MAIAC compact / CMG and OMI HE5 days
+# 2. "extract" cases: one cleaner's extract_data per file, e.g. aod_clean3.extract_data
+# 3. "run" cases: the cleaners' main loop (ingest.run_product, as called by each main())
+#    into a fresh output folder, with the process pool or the prefetching pipeline
+# 4. every case runs in its own fresh process and reports files/sec, MB/s (best of REPEATS
+#    passes: warm OS cache and region-window caches, as in a long run) and peak RSS
+#    (its own and its pool workers')
+# 5. results go to RESULTS_DIR/bench_ingest_<time>.json, and each case is compared with the
+#    newest earlier results file run on the same fixtures, so regressions show up between versions
+
+import datetime
+import glob
+import importlib
+import json
+import multiprocessing as mp
+import os
+import platform
+import re
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from synthetic_fixtures import fixture_settings, make_fixture_tree
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ***change these as needed
+FIXTURE_DIR = None     # None -> temporary folder (rewritten every run); a path -> reused
+RESULTS_DIR = os.path.join(HERE, "bench_results")
+YEAR = 2020
+N_DAYS = 3             # files per product
+REPEATS = 3            # each case's timing is the best of this many passes over the files
+SEED = 0
+N_WORKERS = None       # "run" cases with the pool: None -> all CPUs
+# slower (files/sec) or bigger (peak RSS) than the previous results by more than this -> flagged
+REGRESSION_TOLERANCE = 0.15
+
+# name -> case; "extract": target(file_path) per file, "run": ingest.run_product(product, ...)
+CASES = {
+    "aod_clean3.extract_data":   {"kind": "extract", "product": "aod_compact",
+                                  "target": "aod_clean3.extract_data"},
+    "aod_clean3.extract_region": {"kind": "extract", "product": "aod_compact",
+                                  "target": "aod_clean3.extract_region"},
+    "test_aod_clean.extract_data": {"kind": "extract", "product": "aod_cmg",
+                                    "target": "test_aod_clean.extract_data"},
+    "hcho_clean.extract_data":   {"kind": "extract", "product": "hcho",
+                                  "target": "hcho_clean.extract_data"},
+    "clean.extract_data":        {"kind": "extract", "product": "no2",
+                                  "target": "clean.extract_data"},
+    "run aod_compact (pool)":     {"kind": "run", "product": "aod_compact", "executor": "pool"},
+    "run aod_compact (pipeline)": {"kind": "run", "product": "aod_compact", "executor": "pipeline"},
+    "run aod_cmg (pool)":         {"kind": "run", "product": "aod_cmg", "executor": "pool"},
+    "run hcho (pool)":            {"kind": "run", "product": "hcho", "executor": "pool"},
+    "run hcho (pipeline)":        {"kind": "run", "product": "hcho", "executor": "pipeline"},
+    "run no2 (pool)":             {"kind": "run", "product": "no2", "executor": "pool"},
+}
+
+
+def _input_files(input_dir):
+    year_dir = os.path.join(input_dir, str(YEAR))
+    return [os.path.join(year_dir, n) for n in sorted(os.listdir(year_dir))]
+
+
+def _peak_rss_mb():
+    """
+    Peak RSS of this process. VmHWM belongs to the process's own address space;
+    ru_maxrss would also carry over the parent's peak through fork + exec.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # kB on Linux
+
+
+def _peak_rss_workers_mb():
+    # largest finished child (pool workers); an upper bound, see _peak_rss_mb
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def run_case(case, input_dir, output_dir):
+    """One case, run in a fresh process (so peak RSS is this case's alone)."""
+    paths = _input_files(input_dir)
+    input_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+
+    if case["kind"] == "extract":
+        module_name, func_name = case["target"].rsplit(".", 1)
+        func = getattr(importlib.import_module(module_name), func_name)
+    else:
+        from ingest import run_product
+    baseline_mb = _peak_rss_mb()
+
+    times = []
+    for rep in range(REPEATS):
+        t0 = time.perf_counter()
+        if case["kind"] == "extract":
+            for path in paths:
+                func(path).load()
+            n_ok = len(paths)
+        else:
+            # a fresh output folder per pass, or the manifest would skip every file
+            report = run_product(case["product"], n_workers=N_WORKERS, executor=case["executor"],
+                                 input_dir=input_dir, output_dir=os.path.join(output_dir, str(rep)),
+                                 years=(YEAR, YEAR))
+            n_ok = report["n_ok"]
+            if report["n_failed"]:
+                raise RuntimeError(f"{report['n_failed']} file(s) failed:\n{report['failures'][0][1]}")
+        times.append(time.perf_counter() - t0)
+    seconds = min(times)
+
+    return {
+        "n_files": len(paths),
+        "n_ok": n_ok,
+        "input_mb": input_mb,
+        "seconds": seconds,
+        "seconds_all": times,
+        "files_per_s": len(paths) / seconds,
+        "mb_per_s": input_mb / seconds,
+        "baseline_rss_mb": baseline_mb,      # after imports, before the first file
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_workers_mb": _peak_rss_workers_mb(),
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _code_versions():
+    versions = {}
+    for module_name in ("aod_clean3", "aod_monthly"):
+        versions[module_name] = getattr(importlib.import_module(module_name), "CODE_VERSION", None)
+    from ingest import PRODUCTS
+    versions.update({f"ingest.{name}": spec["code_version"] for name, spec in PRODUCTS.items()})
+    return versions
+
+
+def previous_results(results_dir, fixtures):
+    """Newest earlier results file run on the same fixture settings, or None."""
+    for path in sorted(glob.glob(os.path.join(results_dir, "bench_ingest_*.json")), reverse=True):
+        with open(path) as f:
+            results = json.load(f)
+        if results.get("fixtures") == fixtures:
+            return path, results
+    return None
+
+
+def compare(cases, previous):
+    """Print each case next to the previous run; returns the names of regressed cases."""
+    prev_path, prev = previous
+    print(f"\n--- vs {os.path.basename(prev_path)} (commit {prev.get('git_commit')}) ---")
+    regressed = []
+    for name, now in cases.items():
+        before = prev["cases"].get(name)
+        if before is None or "error" in now or "error" in before:
+            continue
+        speed = now["files_per_s"] / before["files_per_s"]
+        rss = now["peak_rss_mb"] / before["peak_rss_mb"]
+        flag = ""
+        if speed < 1 - REGRESSION_TOLERANCE or rss > 1 + REGRESSION_TOLERANCE:
+            flag = "  <-- REGRESSION"
+            regressed.append(name)
+        print(f"{name:30s} files/s x{speed:5.2f}   peak RSS x{rss:5.2f}{flag}")
+    return regressed
+
+
+def main():
+    products = sorted({case["product"] for case in CASES.values()})
+    fixtures = fixture_settings(products, YEAR, N_DAYS, SEED)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixture_dir = FIXTURE_DIR or os.path.join(tmp_dir, "fixtures")
+        t0 = time.perf_counter()
+        input_dirs = make_fixture_tree(fixture_dir, products, YEAR, N_DAYS, SEED)
+        print(f"fixtures ready in {time.perf_counter() - t0:.1f} s: {fixture_dir}")
+
+        cases = {}
+        # spawn: a fresh interpreter per case (no memory or caches carried over)
+        ctx = mp.get_context("spawn")
+        for name, case in CASES.items():
+            output_dir = os.path.join(tmp_dir, "out", re.sub(r"\W+", "_", name).strip("_"))
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                try:
+                    cases[name] = pool.submit(run_case, case, input_dirs[case["product"]],
+                                              output_dir).result()
+                except Exception as e:
+                    cases[name] = {"error": f"{type(e).__name__}: {e}"}
+
+    print(f"\n{'case':30s} {'files/s':>8s} {'MB/s':>8s} {'peak RSS MB':>12s} {'workers MB':>11s}")
+    for name, r in cases.items():
+        if "error" in r:
+            print(f"{name:30s} FAILED: {r['error']}")
+            continue
+        print(f"{name:30s} {r['files_per_s']:8.2f} {r['mb_per_s']:8.1f} "
+              f"{r['peak_rss_mb']:12.0f} {r['peak_rss_workers_mb']:11.0f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    previous = previous_results(RESULTS_DIR, fixtures)
+    if previous is not None:
+        compare(cases, previous)
+
+    stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    results = {
+        "time": stamp,
+        "git_commit": _git_commit(),
+        "code_versions": _code_versions(),
+        "host": {"cpu_count": os.cpu_count(), "python": platform.python_version(),
+                 "platform": platform.platform()},
+        "fixtures": fixtures,
+        "n_workers": N_WORKERS,
+        "cases": cases,
+    }
+    out_path = os.path.join(RESULTS_DIR, f"bench_ingest_{stamp}.json")
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmark: read-side cost of float32 vs packed-int16 cleaned AOD files
+# 1. builds a year (365 days) of synthetic regional AOD grids quantized like MAIAC (0.001 steps)
+# 2. writes each day twice: float32 (old) and int16 + scale_factor/_FillValue (packing.py)
+# 3. reads every file back (open + load) and reports bytes on disk, read time and max difference
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import xarray as xr
+
+from packing import packed_encoding, source_packing_attrs
+
+# ***change these as needed
+N_DAYS = 365
+N_LAT, N_LON = 136, 262      # aod_clean3 region on the 0.05° grid
+CLEAR_FRACTION = 0.4         # share of cells with a retrieval on a typical day
+SEED = 0
+
+SCALE_FACTOR = 0.001
+FILL_VALUE = -28672
+
+
+def synthetic_day(rng):
+    raw = rng.gamma(2.0, 60.0, size=(N_LAT, N_LON)).round()           # int16-like AOD counts
+    raw[rng.random((N_LAT, N_LON)) > CLEAR_FRACTION] = np.nan          # cloud-masked cells
+    aod = (raw * SCALE_FACTOR).astype(np.float32)
+
+    ds = xr.Dataset(
+        {"AOD_055_compact": (("lat", "lon"), aod)},
+        coords={
+            "lat": 43.15 - np.arange(N_LAT) * 0.05,
+            "lon": -83.15 + np.arange(N_LON) * 0.05,
+        },
+    )
+    ds["AOD_055_compact"].attrs.update(
+        source_packing_attrs(np.int16, SCALE_FACTOR, 0.0, FILL_VALUE)
+    )
+    return ds
+
+
+def dir_size_mb(folder):
+    return sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder)) / 1e6
+
+
+def read_all(folder):
+    t0 = time.perf_counter()
+    total = 0.0
+    for filename in sorted(os.listdir(folder)):
+        with xr.open_dataset(os.path.join(folder, filename)) as ds:
+            total += float(np.nansum(ds["AOD_055_compact"].values))
+    return time.perf_counter() - t0, total
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        f32_dir = os.path.join(tmp_dir, "float32")
+        i16_dir = os.path.join(tmp_dir, "int16")
+        os.makedirs(f32_dir)
+        os.makedirs(i16_dir)
+
+        max_diff = 0.0
+        for day in range(N_DAYS):
+            ds = synthetic_day(rng)
+            name = f"maiac_aod_day{day:03d}_clean.nc"
+
+            ds.to_netcdf(os.path.join(f32_dir, name),
+                         encoding={"AOD_055_compact": {"zlib": True, "complevel": 4}})
+            ds.to_netcdf(os.path.join(i16_dir, name), encoding=packed_encoding(ds))
+
+            with xr.open_dataset(os.path.join(i16_dir, name)) as back:
+                diff = np.nanmax(np.abs(back["AOD_055_compact"].values - ds["AOD_055_compact"].values))
+                max_diff = max(max_diff, float(diff))
+
+        # read each set twice, keep the second (warm page cache, like repeated analysis runs)
+        for folder in (f32_dir, i16_dir):
+            read_all(folder)
+        t_f32, _ = read_all(f32_dir)
+        t_i16, _ = read_all(i16_dir)
+
+        mb_f32 = dir_size_mb(f32_dir)
+        mb_i16 = dir_size_mb(i16_dir)
+
+    print(f"days={N_DAYS}  grid={N_LAT}x{N_LON}  clear fraction={CLEAR_FRACTION}")
+    print(f"float32 : {mb_f32:8.2f} MB on disk   read {t_f32:6.2f}s")
+    print(f"int16   : {mb_i16:8.2f} MB on disk   read {t_i16:6.2f}s")
+    print(f"size ratio int16/float32 = {mb_i16 / mb_f32:.2f}   "
+          f"max |difference| after round trip = {max_diff:.2e} (scale_factor {SCALE_FACTOR})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,29 @@
 # this script cleans the OMI HCHO data (2005-2024)
 # 1. extracts ColumnAmountHCHO data + true lat/lon grid from the HDF5
+#    (only the region's row/col window is read; see hdf_window.h5_latlon_window)
 # 2. converts fill/missing values to NaNs
 # 3. filters to my desired region
 # 4. saves cleaned data as a netCDF
+#
+# The product itself (dataset paths, fill rules, region, folders) is the "hcho"
+# entry of ingest.PRODUCTS; this script runs it through the shared ingestion engine.
 
-import h5py
-import numpy as np
-import xarray as xr
-import os
+from ingest import extract_product, product_spec, run_product
 
-def extract_data(file_path):
-    base = "/HDFEOS/GRIDS/OMI Total Column Amount HCHO"
-
-    with h5py.File(file_path, "r") as f:
-        # ---- HCHO data ----
-        hcho_dset = f[f"{base}/Data Fields/ColumnAmountHCHO"]
-
-        # Take first step: assumes shape (n_step, n_y, n_x)
-        data = hcho_dset[0, :, :].astype("float32")
-
-        # ---- Convert fill / missing values to NaN ----
-        fill_value = None
-        for key in ["_FillValue", "MissingValue", "missing_value"]:
-            if key in hcho_dset.attrs:
-                fill_value = hcho_dset.attrs[key]
-                # sometimes stored as 0-d array
-                if np.ndim(fill_value) > 0:
-                    fill_value = fill_value[0]
-                break
-
-        if fill_value is not None:
-            data = np.where(data == fill_value, np.nan, data)
-
-        # ---- True latitude / longitude ----
-        # Try common paths: some files put Latitude/Longitude under Data Fields,
-        # some directly under the grid group.
-        try:
-            lat_dset = f[f"{base}/Data Fields/Latitude"]
-            lon_dset = f[f"{base}/Data Fields/Longitude"]
-        except KeyError:
-            lat_dset = f[f"{base}/Latitude"]
-            lon_dset = f[f"{base}/Longitude"]
-
-        lat = lat_dset[0, :, :].astype("float32")
-        lon = lon_dset[0, :, :].astype("float32")
-
-    # Use "y", "x" as index dims; lat/lon as 2-D coordinate variables
-    ds = xr.Dataset(
-        data_vars={
-            "HCHO": (["y", "x"], data)
-        },
-        coords={
-            "lat": (["y", "x"], lat),
-            "lon": (["y", "x"], lon),
-        }
-    )
+# region bounds (same as ingest.REGION_OMI)
+LAT_MAX, LAT_MIN = 43.125, 36.375
+LON_MIN, LON_MAX = -83.125, -70.000
 
-    return ds
+def extract_data(file_path):
+    """Regional HCHO (y, x) with 2-D lat/lon; cells outside the region are NaN / dropped."""
+    return extract_product(product_spec("hcho"), file_path)
 
 
 def filter(ds):
-    # region bounds
-    lat_max, lat_min = 43.125, 36.375
-    lon_min, lon_max = -83.125, -70.000
-
     # 2-D mask using true lat/lon
     mask = (
-        (ds["lat"] >= lat_min) & (ds["lat"] <= lat_max) &
-        (ds["lon"] >= lon_min) & (ds["lon"] <= lon_max)
+        (ds["lat"] >= LAT_MIN) & (ds["lat"] <= LAT_MAX) &
+        (ds["lon"] >= LON_MIN) & (ds["lon"] <= LON_MAX)
     )
 
     # keep only pixels inside region (others dropped)
@@ -76,32 +32,13 @@ def filter(ds):
 
 
 def main():
-    input_base_dir = "/home/ellab/air_pollution/src/data/new_hcho"   # HCHO input
-    output_base_dir = "/home/ellab/air_pollution/src/data/clean_hcho"  # HCHO output
-
-    for year in range(2005, 2025):  # inclusive of 2024
-        year_dir = os.path.join(input_base_dir, str(year))
-        if not os.path.isdir(year_dir):
-            continue
-
-        output_year_dir = os.path.join(output_base_dir, str(year))
-        os.makedirs(output_year_dir, exist_ok=True)
-
-        for filename in os.listdir(year_dir):
-            if filename.endswith(".he5"):
-                file_path = os.path.join(year_dir, filename)
-                try:
-                    ds = extract_data(file_path)
-                    filtered_hcho = filter(ds)
-
-                    output_filename = filename.replace(".he5", "_clean.nc")
-                    output_path = os.path.join(output_year_dir, output_filename)
-
-                    filtered_hcho.to_netcdf(output_path)
-                    print(f"Saved: {output_path}")
+    # "daily_files": one <name>_clean.nc per day
+    # "store":       append each day's regional grid to one chunked (time, ...) file
+    OUTPUT_MODE = "daily_files"
+    N_WORKERS = None   # None -> all CPUs
+    EXECUTOR = "pool"  # or "pipeline": prefetch next files while decoding (network disk)
 
-                except Exception as e:
-                    print(f"Failed to process {file_path}: {e}")
+    run_product("hcho", mode=OUTPUT_MODE, n_workers=N_WORKERS, executor=EXECUTOR)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,126 @@
+# windowed (hyperslab) reads of 2-D grids from HDF4 SDS (pyhdf) and HDF5 (h5py) files
+# 1. axis_window() turns region bounds into a row or column slice of a 1-D grid axis
+#    (same label slicing as ds.sel, for ascending or descending axes)
+# 2. cmg_window() does that once per product grid (cached) for regular global grids
+#    (0.05° MAIAC CMG, 0.25° OMI L3)
+# 3. read_sds_window() reads only that (rows, cols) block via pyhdf's get(start, count)
+# 4. h5_latlon_window() does the same for HE5 grids that carry their own 2-D lat/lon:
+#    the window is computed from the full lat/lon once and reused while later files
+#    have the same grid; h5py slicing then reads only the regional bytes
+#
+# Whether get(start, count) also saves decompression depends on how the SDS is stored:
+# contiguous and chunked SDS only touch the blocks/chunks in the window, a deflated
+# non-chunked SDS is inflated whole by the HDF4 library (the copy into numpy is still
+# regional). bench_hdf_window.py: ~140x faster per file on contiguous SDS, ~4x on deflated.
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+CMG_RES = 0.05
+
+# h5_latlon_window cache: (grid shape, region) -> (rows, cols, regional lat, regional lon)
+_LATLON_WINDOWS = {}
+
+
+def axis_window(axis, lo, hi):
+    """Slice of a monotonic 1-D axis covering [lo, hi], as ds.sel(slice) would select it."""
+    idx = pd.Index(np.asarray(axis))
+    if idx.is_monotonic_decreasing:
+        window = idx.slice_indexer(hi, lo)
+    else:
+        window = idx.slice_indexer(lo, hi)
+    start, stop, _ = window.indices(len(idx))
+    if stop <= start:
+        raise ValueError(f"region [{lo}, {hi}] does not overlap the grid axis")
+    return slice(start, stop)
+
+
+@lru_cache(maxsize=16)
+def cmg_window(n_lat, n_lon, lat_max, lat_min, lon_min, lon_max, lat_descending=True, res=CMG_RES):
+    """
+    Region window of a global res° grid (cell centers, as the cleaners build it; 0.05° CMG default).
+    Returns (rows, cols, lat, lon): row/col slices of the stored array and the regional axes.
+    Computed once per (grid shape, region); the axes are read-only.
+    """
+    if lat_descending:
+        latitudes = np.linspace(90 - res / 2, -90 + res / 2, n_lat)
+    else:
+        latitudes = np.linspace(-90 + res / 2, 90 - res / 2, n_lat)
+    longitudes = np.linspace(-180 + res / 2, 180 - res / 2, n_lon)
+
+    rows = axis_window(latitudes, lat_min, lat_max)
+    cols = axis_window(longitudes, lon_min, lon_max)
+    lat, lon = latitudes[rows].copy(), longitudes[cols].copy()
+    lat.setflags(write=False)
+    lon.setflags(write=False)
+    return rows, cols, lat, lon
+
+
+def sds_shape(sd, name):
+    """Shape of an SDS without reading it."""
+    sds = sd.select(name)
+    try:
+        _, rank, dims, _, _ = sds.info()
+    finally:
+        sds.endaccess()
+    return tuple(dims) if rank > 1 else (dims,)
+
+
+def read_sds_window(sd, name, rows, cols):
+    """Read only sds[rows, cols] of a 2-D SDS (one get(start, count) call)."""
+    r0, r1, c0, c1 = int(rows.start), int(rows.stop), int(cols.start), int(cols.stop)
+    sds = sd.select(name)
+    try:
+        return sds.get(start=(r0, c0), count=(r1 - r0, c1 - c0))
+    finally:
+        sds.endaccess()
+
+
+def read_sds_full(sd, name):
+    """Whole SDS (the sds[:] path), for comparison with read_sds_window."""
+    sds = sd.select(name)
+    try:
+        return sds[:]
+    finally:
+        sds.endaccess()
+
+
+# ------------------------------------------------------------
+# HDF5 grids with 2-D lat/lon
+# ------------------------------------------------------------
+def latlon_window(lat, lon, lat_max, lat_min, lon_min, lon_max):
+    """(rows, cols) bounding box of the cells whose 2-D lat/lon fall inside the region."""
+    inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+    rows = np.flatnonzero(inside.any(axis=1))
+    cols = np.flatnonzero(inside.any(axis=0))
+    if rows.size == 0:
+        raise ValueError("region does not overlap the lat/lon grid")
+    return slice(int(rows[0]), int(rows[-1]) + 1), slice(int(cols[0]), int(cols[-1]) + 1)
+
+
+def h5_latlon_window(lat_dset, lon_dset, lat_max, lat_min, lon_min, lon_max, step=0):
+    """
+    Region window of a (step, y, x) HDF5 grid with its own Latitude/Longitude datasets.
+    Returns (rows, cols, lat, lon) with the regional float32 lat/lon.
+
+    The window is cached per (grid shape, region). For a cached grid only the regional
+    lat/lon are read and compared with the cached ones; the full lat/lon are read (and
+    the window recomputed) only for a new grid shape or when those values differ.
+    """
+    key = (tuple(lat_dset.shape), lat_max, lat_min, lon_min, lon_max)
+    cached = _LATLON_WINDOWS.get(key)
+    if cached is not None:
+        rows, cols, lat_c, lon_c = cached
+        lat = lat_dset[step, rows, cols].astype("float32")
+        lon = lon_dset[step, rows, cols].astype("float32")
+        if np.array_equal(lat, lat_c, equal_nan=True) and np.array_equal(lon, lon_c, equal_nan=True):
+            return rows, cols, lat, lon
+
+    lat_full = lat_dset[step, :, :].astype("float32")
+    lon_full = lon_dset[step, :, :].astype("float32")
+    rows, cols = latlon_window(lat_full, lon_full, lat_max, lat_min, lon_min, lon_max)
+    lat, lon = lat_full[rows, cols].copy(), lon_full[rows, cols].copy()  # copies: don't pin the full grid
+    _LATLON_WINDOWS[key] = (rows, cols, lat, lon)
+    return rows, cols, lat.copy(), lon.copy()
@@ -0,0 +1,491 @@
+# config-driven ingestion engine for the daily satellite products (NO2, O3, HCHO, AOD)
+# 1. PRODUCTS: one spec dict per product (files, dataset, grid, fill/scale rules, QA policy, region)
+# 2. extract_product(spec, path): windowed read of the region -> fill / valid range / QA / weight
+#    masks -> scale; returns the regional Dataset
+# 3. run_product(name): catalog / manifest skip -> batch_driver process pool (or the prefetching
+#    read/decode/write pipeline, executor="pipeline") -> atomic daily files
+#    (or appends to the product's time-series store)
+#
+# Grid types ("grid" -> "type"):
+#   "regular":       global res° grid of cell centers rebuilt from the array shape
+#                    (OMI L3 NO2 / O3, MAIAC CMG AOD_055); window from hdf_window.cmg_window
+#   "latlon":        HE5 grid with its own 2-D Latitude/Longitude (OMI HCHO);
+#                    window from hdf_window.h5_latlon_window
+#   "maiac_compact": MAIAC compact records, decoded region-first by aod_clean3.extract_region
+#
+# Adding a product = adding one PRODUCTS entry; every product gets the same windowed
+# reads, process pool, manifest bookkeeping and atomic writes.
+
+import hashlib
+import io
+import os
+
+import h5py
+import numpy as np
+import xarray as xr
+from pyhdf.SD import SD, SDC
+
+import aod_clean3
+from batch_driver import print_report, run_batch
+from hdf_window import cmg_window, h5_latlon_window, read_sds_window, sds_shape
+from maiac_qa import DEFAULT_QA_POLICY, policy_string, qa_keep_mask
+from manifest import (
+    MANIFEST_NAME, atomic_to_netcdf, file_sha256, load_manifest, manifest_path, needs_rebuild,
+    record_output, remove_stale_temps, save_manifest,
+)
+from packing import packed_encoding, source_packing_attrs
+from pipeline import run_pipeline
+from timeseries_store import (append_days, check_store_grid, create_store, date_from_filename,
+                              days_to_chunk_end, store_dates)
+
+DATA_ROOT = "/home/ellab/air_pollution/src/data"
+
+# (lat_max, lat_min, lon_min, lon_max)
+REGION_OMI   = (43.125, 36.375, -83.125, -70.000)   # 0.25° cell centers
+REGION_MAIAC = (43.150, 36.350, -83.150, -70.100)   # 0.05° grid
+
+OMI_FILL_ATTRS = ["_FillValue", "MissingValue", "missing_value"]
+HCHO_GRID = "/HDFEOS/GRIDS/OMI Total Column Amount HCHO"
+
+# ***add / change products here
+PRODUCTS = {
+    "no2": {
+        "format": "he5",
+        "dataset": "/HDFEOS/GRIDS/ColumnAmountNO2/Data Fields/ColumnAmountNO2TropCloudScreened",
+        "var": "NO2",
+        "grid": {"type": "regular", "res": 0.25, "lat_descending": False},
+        "fill_attrs": OMI_FILL_ATTRS,
+        "scale_attrs": ("ScaleFactor", "Offset"),   # recorded only (float columns)
+        "apply_scale": False,
+        "region": REGION_OMI,
+        "input_dir": f"{DATA_ROOT}/new_no2",
+        "output_dir": f"{DATA_ROOT}/clean_no2",
+        "extension": ".he5",
+        "years": (2005, 2024),
+        "store_name": "no2_daily_store.nc",
+        "code_version": "ingest-no2-1",
+    },
+    "o3": {
+        "format": "he5",
+        "dataset": "/HDFEOS/GRIDS/ColumnAmountO3/Data Fields/ColumnAmountO3",
+        "var": "O3",
+        "grid": {"type": "regular", "res": 0.25, "lat_descending": False},
+        "fill_attrs": OMI_FILL_ATTRS,
+        "scale_attrs": ("ScaleFactor", "Offset"),
+        "apply_scale": False,
+        "region": REGION_OMI,
+        "input_dir": f"{DATA_ROOT}/new_o3",
+        "output_dir": f"{DATA_ROOT}/clean_o3",
+        "extension": ".he5",
+        "years": (2005, 2024),
+        "store_name": "o3_daily_store.nc",
+        "code_version": "ingest-o3-1",
+    },
+    "hcho": {
+        "format": "he5",
+        "dataset": f"{HCHO_GRID}/Data Fields/ColumnAmountHCHO",
+        "var": "HCHO",
+        "grid": {
+            "type": "latlon",
+            # first path that exists is used
+            "lat": [f"{HCHO_GRID}/Data Fields/Latitude", f"{HCHO_GRID}/Latitude"],
+            "lon": [f"{HCHO_GRID}/Data Fields/Longitude", f"{HCHO_GRID}/Longitude"],
+        },
+        "fill_attrs": OMI_FILL_ATTRS,
+        "scale_attrs": ("ScaleFactor", "Offset"),
+        "apply_scale": False,
+        "region": REGION_OMI,
+        "input_dir": f"{DATA_ROOT}/new_hcho",
+        "output_dir": f"{DATA_ROOT}/clean_hcho",
+        "extension": ".he5",
+        "years": (2005, 2024),
+        "store_name": "hcho_daily_store.nc",
+        "code_version": "ingest-hcho-1",
+    },
+    "aod_cmg": {
+        "format": "hdf4",
+        "dataset": "AOD_055",
+        "var": "AOD",
+        "grid": {"type": "regular", "res": 0.05, "lat_descending": True},
+        "fill_attrs": ["_FillValue"],
+        "default_fill": -28672.0,
+        "scale_attrs": ("scale_factor", "add_offset"),
+        "apply_scale": True,
+        "valid_range_attr": "valid_range",
+        "qa": {"dataset": "AOD_055_QA", "policy": DEFAULT_QA_POLICY},
+        "weight": "Weight_055",          # cells with weight <= 0 are masked
+        "region": REGION_MAIAC,
+        "input_dir": f"{DATA_ROOT}/new_aod",
+        "output_dir": f"{DATA_ROOT}/clean_aod",
+        "extension": ".hdf",
+        "years": (2005, 2005),
+        "store_name": "aod_cmg_daily_store.nc",
+        # shares clean_aod with aod_compact: its own manifest, so concurrent runs do not
+        # overwrite each other's bookkeeping
+        "manifest_name": "manifest_aod_cmg.json",
+        "code_version": "ingest-aod_cmg-1",
+    },
+    "aod_compact": {
+        "format": "hdf4",
+        "var": "AOD_055_compact",
+        "grid": {"type": "maiac_compact"},
+        "qa": {"dataset": "AOD_055_QA", "policy": aod_clean3.QA_POLICY},
+        "stats": aod_clean3.OUTPUT_STATS,
+        "layout": aod_clean3.OUTPUT_LAYOUT,     # "sparse" or "grid_points"
+        "pack_int16": aod_clean3.PACK_INT16,
+        "region": REGION_MAIAC,
+        "input_dir": f"{DATA_ROOT}/new_aod",
+        "output_dir": f"{DATA_ROOT}/clean_aod",
+        "extension": ".hdf",
+        "years": (2017, 2024),
+        "store_name": "aod_daily_store.nc",
+        "code_version": f"ingest-{aod_clean3.CODE_VERSION}",
+    },
+}
+
+# spec keys that do not change what is written (left out of the manifest params)
+_RUN_KEYS = ("input_dir", "output_dir", "years", "store_name", "manifest_name", "code_version")
+
+
+def product_spec(name, **overrides):
+    """Copy of PRODUCTS[name] with top-level keys replaced by overrides."""
+    if name not in PRODUCTS:
+        raise KeyError(f"unknown product {name!r}; known: {sorted(PRODUCTS)}")
+    spec = dict(PRODUCTS[name], **overrides)
+    spec["name"] = name
+    return spec
+
+
+def product_params(spec):
+    """Manifest parameters: everything in the spec that shapes an output."""
+    return {k: v for k, v in spec.items() if k not in _RUN_KEYS}
+
+
+# ------------------------------------------------------------
+# reading
+# ------------------------------------------------------------
+def _first_attr(attrs, keys, default=None):
+    for key in keys:
+        if key in attrs:
+            value = attrs[key]
+            # sometimes stored as 0-d / 1-element array
+            return value[0] if np.ndim(value) > 0 else value
+    return default
+
+
+def _first_dataset(f, paths):
+    for path in paths:
+        if path in f:
+            return f[path]
+    raise KeyError(f"none of {paths} in {f.filename}")
+
+
+def _read_he5(spec, file_path, source=None):
+    """
+    Regional raw array, lat/lon, dims and attrs from an HE5 grid (h5py slicing).
+    source: optional file-like object with the file's bytes (read instead of file_path).
+    """
+    grid = spec["grid"]
+    lat_max, lat_min, lon_min, lon_max = spec["region"]
+    with h5py.File(source if source is not None else file_path, "r") as f:
+        dset = f[spec["dataset"]]
+        if grid["type"] == "latlon":
+            rows, cols, lat, lon = h5_latlon_window(
+                _first_dataset(f, grid["lat"]), _first_dataset(f, grid["lon"]),
+                lat_max, lat_min, lon_min, lon_max,
+            )
+            dims, coords = ["y", "x"], {"lat": (["y", "x"], lat), "lon": (["y", "x"], lon)}
+        else:
+            _, n_lat, n_lon = dset.shape
+            rows, cols, lat, lon = cmg_window(n_lat, n_lon, lat_max, lat_min, lon_min, lon_max,
+                                              grid["lat_descending"], grid["res"])
+            dims, coords = ["lat", "lon"], {"lat": lat.copy(), "lon": lon.copy()}
+        # first step: assumes shape (n_step, n_y, n_x)
+        raw = dset[0, rows, cols]
+        attrs = dict(dset.attrs)
+    return raw, dims, coords, attrs, {}
+
+
+def _read_hdf4(spec, file_path, source=None):
+    """
+    Regional raw array (+ QA / weight windows), lat/lon, dims and attrs from an HDF4 SDS.
+    pyhdf only opens paths, so source is not used (prefetching still warmed the OS cache).
+    """
+    grid = spec["grid"]
+    lat_max, lat_min, lon_min, lon_max = spec["region"]
+    sd = SD(file_path, SDC.READ)
+    try:
+        n_lat, n_lon = sds_shape(sd, spec["dataset"])
+        rows, cols, lat, lon = cmg_window(n_lat, n_lon, lat_max, lat_min, lon_min, lon_max,
+                                          grid["lat_descending"], grid["res"])
+        sds = sd.select(spec["dataset"])
+        attrs = sds.attributes()
+        sds.endaccess()
+        raw = read_sds_window(sd, spec["dataset"], rows, cols)
+
+        # optional masks; a product file without them is used unmasked
+        masks = {}
+        qa = spec.get("qa")
+        if qa and qa.get("policy") is not None:
+            try:
+                masks["qa"] = read_sds_window(sd, qa["dataset"], rows, cols)
+            except Exception:
+                pass
+        if spec.get("weight"):
+            try:
+                masks["weight"] = read_sds_window(sd, spec["weight"], rows, cols)
+            except Exception:
+                pass
+    finally:
+        sd.end()
+    return raw, ["lat", "lon"], {"lat": lat.copy(), "lon": lon.copy()}, attrs, masks
+
+
+def extract_product(spec, file_path, source=None):
+    """
+    Regional, cleaned Dataset of one product file (see module header).
+    source: optional file-like object holding the file's bytes (HE5 products read from it).
+    """
+    grid_type = spec["grid"]["type"]
+    lat_max, lat_min, lon_min, lon_max = spec["region"]
+
+    if grid_type == "maiac_compact":
+        qa_policy = (spec.get("qa") or {}).get("policy")
+        return aod_clean3.extract_region(file_path, lat_max, lat_min, lon_min, lon_max,
+                                         stats=spec.get("stats", False), qa_policy=qa_policy)
+
+    reader = _read_he5 if spec["format"] == "he5" else _read_hdf4
+    raw, dims, coords, attrs, masks = reader(spec, file_path, source)
+
+    data = raw.astype("float32")
+    fill_value = _first_attr(attrs, spec.get("fill_attrs", []), spec.get("default_fill"))
+    scale_key, offset_key = spec.get("scale_attrs", (None, None))
+    scale_factor = attrs.get(scale_key)
+    add_offset = attrs.get(offset_key)
+
+    # --- masks ---
+    if fill_value is not None:
+        data = np.where(data == fill_value, np.nan, data)
+    valid_range = attrs.get(spec["valid_range_attr"]) if spec.get("valid_range_attr") else None
+    if valid_range is not None:
+        lo, hi = valid_range
+        data[(data < lo) | (data > hi)] = np.nan
+    if "qa" in masks:
+        data[~qa_keep_mask(masks["qa"], spec["qa"]["policy"])] = np.nan
+    if "weight" in masks:
+        data[masks["weight"] <= 0] = np.nan
+
+    # --- scale ---
+    if spec.get("apply_scale"):
+        scale_factor = 1.0 if scale_factor is None else scale_factor
+        add_offset = 0.0 if add_offset is None else add_offset
+        data = data * scale_factor + add_offset
+
+    var = spec["var"]
+    ds = xr.Dataset({var: (dims, data)}, coords=coords)
+    ds[var].attrs.update(source_packing_attrs(raw.dtype, scale_factor, add_offset, fill_value))
+    if "qa" in masks:
+        ds[var].attrs["qa_policy"] = policy_string(spec["qa"]["policy"])
+
+    if grid_type == "latlon":
+        # cells of the bounding window that fall outside the region -> NaN
+        inside = (
+            (ds["lat"] >= lat_min) & (ds["lat"] <= lat_max) &
+            (ds["lon"] >= lon_min) & (ds["lon"] <= lon_max)
+        )
+        ds = ds.where(inside, drop=True)
+    elif spec["grid"].get("lat_descending"):
+        ds = ds.sortby("lat")  # makes lat ascending
+    return ds
+
+
+# ------------------------------------------------------------
+# batch
+# ------------------------------------------------------------
+def store_vars(spec):
+    """Variables appended to the product's time-series store."""
+    names = [spec["var"]]
+    if spec["grid"]["type"] == "maiac_compact" and spec.get("stats"):
+        names += list(aod_clean3.STAT_VARS)
+    return names
+
+
+def _output_dataset(spec, ds_reg):
+    if spec["grid"]["type"] != "maiac_compact":
+        return ds_reg
+    if spec.get("layout", "sparse") == "sparse":
+        return aod_clean3.sparse_from_region(ds_reg)   # valid pixels only
+    return aod_clean3.add_points_from_region(ds_reg)   # grid + points
+
+
+def decode_task(task, source=None):
+    """Decode one task's input: the regional grid (store mode) or the dataset to write."""
+    spec = task["spec"]
+    ds_reg = extract_product(spec, task["input"], source)
+    if task.get("mode") == "store":
+        return ds_reg
+    return _output_dataset(spec, ds_reg)
+
+
+def write_task(task, ds, input_sha256):
+    """
+    Write one decoded task. Daily files are written atomically; in store mode nothing
+    is written here and the grid is returned for the caller's on_record to append.
+    """
+    if task.get("mode") == "store":
+        return {"status": "ok", "ds": ds}
+    encoding = packed_encoding(ds, packed=task["spec"].get("pack_int16", True), complevel=4)
+    atomic_to_netcdf(ds, task["output"], encoding=encoding)
+    return {"status": "ok", "input_sha256": input_sha256}
+
+
+def process_task(task):
+    """Batch worker: one product file -> one regional _clean.nc (or a grid for the store)."""
+    input_sha256 = file_sha256(task["input"]) if task.get("mode") != "store" else None
+    return write_task(task, decode_task(task), input_sha256)
+
+
+def _pipeline_decode(task, payload):
+    # the prefetched bytes give the input hash for free and feed h5py directly
+    source = io.BytesIO(payload) if task["spec"]["format"] == "he5" else None
+    return decode_task(task, source), hashlib.sha256(payload).hexdigest()
+
+
+def _pipeline_write(task, item):
+    ds, input_sha256 = item
+    return write_task(task, ds, input_sha256)
+
+
+def run_product(name, mode="daily_files", n_workers=None, mem_budget_mb=1500,
+                executor="pool", n_prefetch=4, n_io_threads=2, catalog=None, **overrides):
+    """
+    Clean every input file of one product.
+    mode: "daily_files" (one <name>_clean.nc per day, manifest-skipped when current)
+          or "store" (append each day to <output_dir>/<store_name>).
+    executor: "pool" (batch_driver process pool, n_workers / mem_budget_mb) or
+              "pipeline" (pipeline.run_pipeline: n_prefetch files read ahead by
+              n_io_threads while one file is decoded, writes on a writer thread).
+    catalog: optional input_catalog.parquet (input_catalog.py); files it marks as bad
+             (and that have not changed since the scan) are not scheduled.
+    overrides replace top-level spec keys (e.g. years=(2005, 2005)).
+    """
+    spec = product_spec(name, **overrides)
+    output_base_dir = spec["output_dir"]
+    extension = spec["extension"]
+    params = product_params(spec)
+    code_version = spec["code_version"]
+    store_path = os.path.join(output_base_dir, spec["store_name"])
+
+    os.makedirs(output_base_dir, exist_ok=True)
+    remove_stale_temps(output_base_dir)
+    manifest = load_manifest(manifest_path(output_base_dir, spec.get("manifest_name", MANIFEST_NAME)))
+    done_dates = store_dates(store_path) if mode == "store" else set()
+    if catalog is not None:
+        from input_catalog import catalog_exclusions  # input_catalog reads PRODUCTS from here
+        excluded = catalog_exclusions(catalog, name)
+    else:
+        excluded = {}
+    n_excluded = 0
+
+    tasks = []
+    start_year, end_year = spec["years"]
+    for year in range(start_year, end_year + 1):
+        year_dir = os.path.join(spec["input_dir"], str(year))
+        if not os.path.isdir(year_dir):
+            print(f"Skipping {year} (no folder).")
+            continue
+        out_year_dir = os.path.join(output_base_dir, str(year))
+
+        for filename in sorted(os.listdir(year_dir)):
+            if not filename.lower().endswith(extension):
+                continue
+            file_path = os.path.join(year_dir, filename)
+            if file_path in excluded:
+                n_excluded += 1
+                continue
+
+            if mode == "store":
+                if date_from_filename(filename) in done_dates:
+                    continue
+                tasks.append({"input": file_path, "mode": "store", "spec": spec})
+                continue
+
+            output_path = os.path.join(out_year_dir, filename[: -len(extension)] + "_clean.nc")
+            # skip outputs that are recorded, intact and up to date
+            if needs_rebuild(manifest, output_path, file_path, params, code_version) is None:
+                continue
+            os.makedirs(out_year_dir, exist_ok=True)
+            tasks.append({"input": file_path, "output": output_path, "spec": spec})
+
+    print(f"[{name}] {len(tasks)} files to (re)build.")
+    if n_excluded:
+        print(f"[{name}] {n_excluded} bad input file(s) left out (see {catalog}).")
+
+    n_unsaved = 0
+    # store mode: days are buffered and appended a whole time chunk at a time
+    store_buffer = []
+
+    def flush_store():
+        append_days(store_path, store_buffer, store_vars(spec))
+        store_buffer.clear()
+
+    def on_record(record):
+        nonlocal n_unsaved
+        if record["status"] != "ok":
+            return
+        if mode == "store":
+            # appends happen here, in one process, in sorted date order
+            ds_reg = record["result"].pop("ds")
+            try:
+                if not os.path.exists(store_path):
+                    create_store(store_path, ds_reg, store_vars(spec))
+                check_store_grid(store_path, ds_reg, store_vars(spec))
+                store_buffer.append((ds_reg, date_from_filename(record["input"])))
+                if len(store_buffer) >= days_to_chunk_end(store_path, store_vars(spec)):
+                    flush_store()
+            except Exception as e:
+                record["status"], record["error"] = "failed", f"append to store: {e}"
+            return
+        record_output(manifest, record["output"], record["input"], params, code_version,
+                      input_sha256=record["result"].get("input_sha256"))
+        n_unsaved += 1
+        if n_unsaved >= 50:   # checkpoint; a crash loses at most 50 records (they get rebuilt)
+            save_manifest(manifest)
+            n_unsaved = 0
+
+    if executor == "pipeline":
+        # on_record runs on the pipeline's single writer thread
+        report = run_pipeline(tasks, _pipeline_decode, _pipeline_write, n_prefetch=n_prefetch,
+                              n_io_threads=n_io_threads, on_record=on_record)
+    else:
+        report = run_batch(process_task, tasks, n_workers=n_workers, mem_budget_mb=mem_budget_mb,
+                           on_record=on_record)
+    if store_buffer:
+        flush_store()   # the last, partial time chunk
+    save_manifest(manifest)
+    print_report(report)
+    return report
+
+
+def main():
+    # ***change these as needed
+    PRODUCTS_TO_RUN = ["no2", "o3", "hcho", "aod_compact"]
+    OUTPUT_MODE = "daily_files"   # or "store"
+
+    # "pool":     decode files in parallel processes (CPU-bound runs, local disk)
+    # "pipeline": one decoder + prefetching I/O threads + writer thread (network archive disk)
+    EXECUTOR = "pool"
+    N_WORKERS = None              # pool: None -> all CPUs
+    WORKER_MEM_MB = 1500          # pool: per-worker memory budget (caps the worker count)
+    N_PREFETCH = 4                # pipeline: files read ahead of the decoder
+    N_IO_THREADS = 2              # pipeline: concurrent reads
+    CATALOG = None                # input_catalog.CATALOG_PATH -> skip files the pre-scan found bad
+
+    for name in PRODUCTS_TO_RUN:
+        run_product(name, mode=OUTPUT_MODE, n_workers=N_WORKERS, mem_budget_mb=WORKER_MEM_MB,
+                    executor=EXECUTOR, n_prefetch=N_PREFETCH, n_io_threads=N_IO_THREADS,
+                    catalog=CATALOG)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# pre-scan of the raw satellite archives -> input_catalog.parquet
+# 1. lists every input file of the chosen ingest.PRODUCTS (new_aod, new_hcho, new_no2, ...)
+# 2. checks each file in parallel (batch_driver): opens it, checks the datasets the cleaner
+#    needs are there with usable shapes, reads their last element (a truncated file fails
+#    here instead of hours into a cleaning run) and parses the date from the name
+# 3. writes one row per file: product, path, year, date, size, mtime, shape, status, error
+#
+# Files whose size and mtime match their catalog row are not opened again, so re-running
+# the scan after a download only checks the new files.
+# The cleaners use the catalog with ingest.run_product(..., catalog=CATALOG_PATH): files
+# recorded as bad are left out of the run; new or changed files are scheduled as usual.
+
+import os
+
+import h5py
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyhdf.SD import SD, SDC
+
+from batch_driver import print_report, run_batch
+from ingest import DATA_ROOT, PRODUCTS, product_spec
+from timeseries_store import date_from_filename
+
+CATALOG_PATH = f"{DATA_ROOT}/input_catalog.parquet"
+
+# SDS a MAIAC compact file must have (aod_clean3._read_compact / _read_scaling)
+COMPACT_SDS = ("Compact_AOD_055", "Line", "Sample", "Offset_AOD_055", "nAOD", "AOD_055")
+
+# file status values ("ok" is the only one the cleaners schedule)
+STATUS_OK = "ok"
+STATUS_BAD_NAME = "bad_name"            # no date in the file name
+STATUS_MISSING = "missing_dataset"      # opens, but a required dataset is absent
+STATUS_BAD_SHAPE = "bad_shape"          # required dataset has an unexpected shape
+STATUS_UNREADABLE = "unreadable"        # cannot be opened / read (corrupt, truncated)
+
+SCHEMA = pa.schema([
+    ("product", pa.string()),
+    ("path", pa.string()),
+    ("year", pa.int16()),
+    ("date", pa.date32()),
+    ("size_bytes", pa.int64()),
+    ("mtime_ns", pa.int64()),
+    ("shape", pa.string()),
+    ("status", pa.string()),
+    ("error", pa.string()),
+])
+
+
+class _BadFile(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def required_datasets(spec):
+    """[[alternative paths], ...] of the datasets extract_product needs for this product."""
+    if spec["grid"]["type"] == "maiac_compact":
+        names = [[name] for name in COMPACT_SDS]
+    else:
+        names = [[spec["dataset"]]]
+        if spec["grid"]["type"] == "latlon":
+            names += [list(spec["grid"]["lat"]), list(spec["grid"]["lon"])]
+    qa = spec.get("qa")
+    if qa and qa.get("policy") is not None and spec["grid"]["type"] == "maiac_compact":
+        names.append([qa["dataset"]])   # aod_clean3 reads it unconditionally when a policy is set
+    return names
+
+
+def _check_shape(spec, shape):
+    grid = spec["grid"]
+    if grid["type"] == "maiac_compact":
+        return
+    # he5 grids carry a leading step axis; the HDF4 SDS are 2-D
+    expected_ndim = 3 if spec["format"] == "he5" else 2
+    if len(shape) != expected_ndim:
+        raise _BadFile(STATUS_BAD_SHAPE, f"{spec['dataset']}: {len(shape)}-D, expected {expected_ndim}-D")
+    if grid["type"] == "regular":
+        n_lat, n_lon = shape[-2:]
+        expected = (round(180 / grid["res"]), round(360 / grid["res"]))
+        if (n_lat, n_lon) != expected:
+            raise _BadFile(STATUS_BAD_SHAPE,
+                           f"{spec['dataset']}: {n_lat} x {n_lon}, expected {expected[0]} x {expected[1]} "
+                           f"for a {grid['res']}° grid")
+
+
+def _scan_he5(spec, path):
+    shapes = []
+    with h5py.File(path, "r") as f:
+        for alternatives in required_datasets(spec):
+            name = next((p for p in alternatives if p in f), None)
+            if name is None:
+                raise _BadFile(STATUS_MISSING, f"none of {alternatives}")
+            dset = f[name]
+            if dset.size == 0:
+                raise _BadFile(STATUS_BAD_SHAPE, f"{name}: empty")
+            dset[(-1,) * dset.ndim]   # last element: reads the last chunk
+            shapes.append(dset.shape)
+    return shapes
+
+
+def _scan_hdf4(spec, path):
+    shapes = []
+    sd = SD(path, SDC.READ)
+    try:
+        present = sd.datasets()
+        for alternatives in required_datasets(spec):
+            name = next((p for p in alternatives if p in present), None)
+            if name is None:
+                raise _BadFile(STATUS_MISSING, f"none of {alternatives}")
+            sds = sd.select(name)
+            try:
+                shape = tuple(int(n) for n in np.atleast_1d(sds.info()[2]))
+                if 0 in shape:
+                    raise _BadFile(STATUS_BAD_SHAPE, f"{name}: empty")
+                sds.get(start=[n - 1 for n in shape], count=[1] * len(shape))
+            finally:
+                sds.endaccess()
+            shapes.append(shape)
+    finally:
+        sd.end()
+
+    if spec["grid"]["type"] == "maiac_compact":
+        # Line / Sample / Offset / nAOD describe the same cells
+        lengths = {name: shape[-1] for name, shape in zip(COMPACT_SDS[1:5], shapes[1:5])}
+        if len(set(lengths.values())) != 1:
+            raise _BadFile(STATUS_BAD_SHAPE, f"compact index arrays differ in length: {lengths}")
+    return shapes
+
+
+def scan_file(task):
+    """Batch worker: one catalog row for one input file (a bad file is a row, not a failure)."""
+    path = task["input"]
+    spec = product_spec(task["product"])
+    st = os.stat(path)
+    entry = {
+        "product": task["product"], "path": path, "year": task["year"], "date": None,
+        "size_bytes": st.st_size, "mtime_ns": st.st_mtime_ns, "shape": None,
+        "status": STATUS_OK, "error": None,
+    }
+    try:
+        try:
+            entry["date"] = date_from_filename(path).astype(object)
+        except ValueError as e:
+            raise _BadFile(STATUS_BAD_NAME, str(e))
+        scan = _scan_he5 if spec["format"] == "he5" else _scan_hdf4
+        shapes = scan(spec, path)
+        entry["shape"] = "x".join(str(n) for n in shapes[0])
+        _check_shape(spec, shapes[0])
+    except _BadFile as e:
+        entry["status"], entry["error"] = e.status, str(e)
+    except Exception as e:   # h5py / pyhdf errors on corrupt or truncated files
+        entry["status"], entry["error"] = STATUS_UNREADABLE, f"{type(e).__name__}: {e}"
+    return {"status": "ok", "entry": entry}
+
+
+def list_inputs(name):
+    """(path, year) of every input file of one product, as run_product would find them."""
+    spec = PRODUCTS[name]
+    start_year, end_year = spec["years"]
+    files = []
+    for year in range(start_year, end_year + 1):
+        year_dir = os.path.join(spec["input_dir"], str(year))
+        if not os.path.isdir(year_dir):
+            continue
+        for filename in sorted(os.listdir(year_dir)):
+            if filename.lower().endswith(spec["extension"]):
+                files.append((os.path.join(year_dir, filename), year))
+    return files
+
+
+def load_catalog(path=CATALOG_PATH):
+    """The catalog as a DataFrame (empty, with the catalog columns, if there is none yet)."""
+    if not os.path.exists(path):
+        return SCHEMA.empty_table().to_pandas()
+    return pq.read_table(path, schema=SCHEMA).to_pandas()
+
+
+def save_catalog(df, path=CATALOG_PATH):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    table = pa.Table.from_pandas(df.sort_values(["product", "path"]), schema=SCHEMA,
+                                 preserve_index=False)
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def scan_products(names, catalog_path=CATALOG_PATH, n_workers=None):
+    """Scan the inputs of the named products and update the catalog; returns it (DataFrame)."""
+    old = load_catalog(catalog_path)
+    known = {
+        (row.product, row.path): row
+        for row in old.itertuples(index=False)
+    }
+
+    kept, tasks = [], []
+    for name in names:
+        for path, year in list_inputs(name):
+            st = os.stat(path)
+            row = known.get((name, path))
+            if row is not None and row.size_bytes == st.st_size and row.mtime_ns == st.st_mtime_ns:
+                kept.append(row._asdict())
+                continue
+            tasks.append({"input": path, "product": name, "year": year})
+
+    print(f"{len(tasks)} file(s) to scan, {len(kept)} unchanged since the last scan.")
+    report = run_batch(scan_file, tasks, n_workers=n_workers)
+    print_report(report)
+
+    scanned = [r["result"]["entry"] for r in report["records"] if r["status"] == "ok"]
+    # rows of products not scanned this time are kept as they were
+    others = old[~old["product"].isin(names)]
+    df = pd.concat(
+        [others, pd.DataFrame(kept + scanned, columns=SCHEMA.names)], ignore_index=True
+    )
+    save_catalog(df, catalog_path)
+    return df
+
+
+def catalog_exclusions(catalog_path, name):
+    """
+    {path: (status, error)} of this product's files the catalog marks as bad and that are
+    unchanged (same size / mtime) since they were scanned; everything else may be scheduled.
+    """
+    df = load_catalog(catalog_path)
+    df = df[(df["product"] == name) & (df["status"] != STATUS_OK)]
+    bad = {}
+    for row in df.itertuples(index=False):
+        try:
+            st = os.stat(row.path)
+        except OSError:
+            continue
+        if st.st_size == row.size_bytes and st.st_mtime_ns == row.mtime_ns:
+            bad[row.path] = (row.status, row.error)
+    return bad
+
+
+def print_summary(df):
+    print("\n===== input catalog =====")
+    counts = df.groupby(["product", "status"]).size().unstack(fill_value=0)
+    print(counts.to_string())
+    bad = df[df["status"] != STATUS_OK]
+    if len(bad):
+        print("\nBad files:")
+        for row in bad.itertuples(index=False):
+            print(f"  [{row.status}] {row.path}: {row.error}")
+
+
+def main():
+    # ***change these as needed
+    PRODUCTS_TO_SCAN = ["no2", "o3", "hcho", "aod_compact"]
+    N_WORKERS = None   # None -> all CPUs
+
+    os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+    df = scan_products(PRODUCTS_TO_SCAN, CATALOG_PATH, n_workers=N_WORKERS)
+    print_summary(df)
+    print(f"\nSaved: {CATALOG_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# MAIAC AOD_055_QA bit-field decoding through a 65,536-entry lookup table
+# 1. a QA policy is a plain dict naming the allowed states of each QA field
+# 2. build_qa_lut(policy) decodes all 2**16 QA codes once -> boolean "keep" table
+# 3. qa_keep_mask(qa, policy) is then one gather per pixel: lut[qa]
+#
+# AOD_QA bit layout (MCD19A2 / MCD19A2CMG user guide):
+#   bits 0-2   cloud mask      000 undefined, 001 clear, 010 possibly cloudy, 011 cloudy,
+#                              101 cloud shadow, 110 fire hot spot, 111 water sediments
+#   bits 3-4   land/water/snow 00 land, 01 water, 10 snow, 11 ice
+#   bits 5-7   adjacency       000 clear, 001 adjacent to cloud, 010 surrounded by >8 cloudy,
+#                              011 adjacent to a single cloudy pixel, 100 adjacent to snow,
+#                              101 snow previously detected
+#   bits 8-11  AOD QA          0000 best quality, 0001 water sediments, 0011 one neighbor cloudy,
+#                              0100 >1 neighbor cloudy, 0101 no retrieval, 0110 no retrieval near snow,
+#                              0111 climatology AOD (high altitude), 1000 no retrieval (glint),
+#                              1001 very low AOD due to glint, 1010 near coastline,
+#                              1011 research quality (possibly cloudy)
+#   bit  12    glint mask      0 no glint, 1 glint
+#   bits 13-14 aerosol model   00 background, 01 smoke, 10 dust
+
+import json
+from functools import lru_cache
+
+import numpy as np
+
+# field -> (first bit, number of bits, {state name: code})
+QA_FIELDS = {
+    "cloud_mask": (0, 3, {
+        "undefined": 0, "clear": 1, "possibly_cloudy": 2, "cloudy": 3,
+        "cloud_shadow": 5, "fire_hot_spot": 6, "water_sediments": 7,
+    }),
+    "land_water": (3, 2, {"land": 0, "water": 1, "snow": 2, "ice": 3}),
+    "adjacency": (5, 3, {
+        "clear": 0, "adjacent_to_cloud": 1, "surrounded_by_clouds": 2,
+        "adjacent_to_single_cloud": 3, "adjacent_to_snow": 4, "snow_previously": 5,
+    }),
+    "aod_qa": (8, 4, {
+        "best": 0, "water_sediments": 1, "one_neighbor_cloudy": 3, "neighbors_cloudy": 4,
+        "no_retrieval": 5, "no_retrieval_snow": 6, "climatology": 7, "no_retrieval_glint": 8,
+        "low_aod_glint": 9, "coastline": 10, "research_quality": 11,
+    }),
+    "glint": (12, 1, {"no_glint": 0, "glint": 1}),
+    "aerosol_model": (13, 2, {"background": 0, "smoke": 1, "dust": 2}),
+}
+
+# Policy: field -> list of allowed state names (fields left out are not checked).
+DEFAULT_QA_POLICY = {
+    "cloud_mask": ["clear"],
+    "adjacency": ["clear"],
+    "aod_qa": ["best", "water_sediments"],
+}
+
+
+def policy_string(policy):
+    """Canonical JSON form of a policy (for output attrs / manifest params)."""
+    return json.dumps({field: sorted(states) for field, states in policy.items()}, sort_keys=True)
+
+
+def decode_field(qa, field):
+    """Integer code of one QA field for every pixel."""
+    first_bit, n_bits, _ = QA_FIELDS[field]
+    qa = np.asarray(qa).astype(np.uint16)  # int16 storage -> same bit pattern
+    return (qa >> first_bit) & ((1 << n_bits) - 1)
+
+
+def _freeze(policy):
+    return tuple(sorted((field, tuple(sorted(states))) for field, states in policy.items()))
+
+
+@lru_cache(maxsize=16)
+def _lut_for(frozen_policy):
+    codes = np.arange(1 << 16, dtype=np.uint32)
+    keep = np.ones(codes.size, dtype=bool)
+    for field, states in frozen_policy:
+        if field not in QA_FIELDS:
+            raise ValueError(f"unknown QA field {field!r}; expected one of {sorted(QA_FIELDS)}")
+        first_bit, n_bits, names = QA_FIELDS[field]
+        unknown = set(states) - set(names)
+        if unknown:
+            raise ValueError(f"unknown {field} states {sorted(unknown)}; expected {sorted(names)}")
+        allowed = np.array([names[s] for s in states], dtype=np.uint32)
+        value = (codes >> first_bit) & ((1 << n_bits) - 1)
+        keep &= np.isin(value, allowed)
+    keep.setflags(write=False)
+    return keep
+
+
+def build_qa_lut(policy):
+    """Boolean table over all 65,536 QA codes: True where the policy keeps the pixel (cached)."""
+    return _lut_for(_freeze(policy))
+
+
+def qa_keep_mask(qa, policy):
+    """True where a pixel passes the QA policy (one table gather per pixel)."""
+    lut = build_qa_lut(policy)
+    return lut[np.asarray(qa).astype(np.uint16)]
@@ -0,0 +1,168 @@
+# crash-safe, content-addressed bookkeeping for the clean_* outputs
+# 1. outputs are written to a temp file in the same folder and atomically renamed
+# 2. a manifest.json in the output root records, per output:
+#    input file sha256 (+ size/mtime), parameter digest, code version, output sha256 (+ size/mtime)
+# 3. needs_rebuild() says whether an output is missing, stale (input / params / code changed)
+#    or corrupt (output bytes changed since it was recorded)
+#
+# Hashes are only recomputed when a file's size/mtime changed, so a re-run over an
+# unchanged archive only stats files.
+
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = "manifest.json"
+TMP_SUFFIX = ".tmp.nc"
+
+
+def file_sha256(path, chunk_size=8 * 1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def params_digest(params):
+    """Stable digest of a JSON-serializable parameter dict."""
+    blob = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+# ------------------------------------------------------------
+# atomic writes
+# ------------------------------------------------------------
+def temp_path_for(output_path):
+    folder, name = os.path.split(output_path)
+    return os.path.join(folder, f".{name}.{os.getpid()}{TMP_SUFFIX}")
+
+
+def atomic_to_netcdf(ds, output_path, **kwargs):
+    """ds.to_netcdf into a temp file next to output_path, then os.replace into place."""
+    tmp_path = temp_path_for(output_path)
+    try:
+        ds.to_netcdf(tmp_path, **kwargs)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:   # exists, owned by someone else
+        return True
+    return True
+
+
+def remove_stale_temps(root):
+    """
+    Delete temp files left behind by killed runs (call before starting a run). Temps of
+    live processes (another run writing to the same folder) are left alone.
+    """
+    removed = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not (filename.startswith(".") and filename.endswith(TMP_SUFFIX)):
+                continue
+            pid = filename[: -len(TMP_SUFFIX)].rsplit(".", 1)[-1]
+            if pid.isdigit() and _pid_alive(int(pid)):
+                continue
+            os.remove(os.path.join(dirpath, filename))
+            removed += 1
+    return removed
+
+
+# ------------------------------------------------------------
+# manifest
+# ------------------------------------------------------------
+def manifest_path(output_base_dir, name=MANIFEST_NAME):
+    return os.path.join(output_base_dir, name)
+
+
+def load_manifest(path):
+    """Load manifest; a missing or unreadable manifest means 'rebuild everything'."""
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"path": path, "entries": {}}
+    manifest["path"] = path
+    manifest.setdefault("entries", {})
+    return manifest
+
+
+def save_manifest(manifest):
+    path = manifest["path"]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"entries": manifest["entries"]}, f, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _key(manifest, output_path):
+    root = os.path.dirname(manifest["path"])
+    return os.path.relpath(os.path.abspath(output_path), os.path.abspath(root))
+
+
+def needs_rebuild(manifest, output_path, input_path, params, code_version):
+    """
+    Return a reason string if output_path must be (re)built, else None.
+    May refresh the recorded size/mtime of files whose content hash is unchanged.
+    """
+    entry = manifest["entries"].get(_key(manifest, output_path))
+    if entry is None:
+        return "not in manifest"
+    if not os.path.exists(output_path):
+        return "output missing"
+    if entry.get("code_version") != code_version:
+        return "code version changed"
+    if entry.get("params_digest") != params_digest(params):
+        return "parameters changed"
+
+    # --- input: stat first, hash only if size/mtime moved ---
+    size, mtime = _stat(input_path)
+    if [size, mtime] != entry.get("input_stat"):
+        if file_sha256(input_path) != entry.get("input_sha256"):
+            return "input changed"
+        entry["input_stat"] = [size, mtime]
+
+    # --- output: same check against the recorded output hash ---
+    size, mtime = _stat(output_path)
+    if [size, mtime] != entry.get("output_stat"):
+        if file_sha256(output_path) != entry.get("output_sha256"):
+            return "output corrupt or modified"
+        entry["output_stat"] = [size, mtime]
+
+    return None
+
+
+def record_output(manifest, output_path, input_path, params, code_version, input_sha256=None):
+    """Record a freshly written output (call only after the atomic rename succeeded)."""
+    manifest["entries"][_key(manifest, output_path)] = {
+        "input": os.path.abspath(input_path),
+        "input_sha256": input_sha256 or file_sha256(input_path),
+        "input_stat": list(_stat(input_path)),
+        "output_sha256": file_sha256(output_path),
+        "output_stat": list(_stat(output_path)),
+        "params": params,
+        "params_digest": params_digest(params),
+        "code_version": code_version,
+    }
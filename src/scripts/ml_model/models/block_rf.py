@@ -13,6 +13,8 @@ from scipy.spatial import cKDTree
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from monthly_data import read_pm_monthly
+
 
 # ============================================================
 # USER SETTINGS
@@ -31,6 +33,10 @@ GRID_STEP_DEG = 0.05
 # Data-quality rule used when creating monthly dataset (if n_days exists)
 MIN_VALID_DAYS_PER_MONTH = 10
 
+# monitors read from the monthly file: None -> all sites;
+# (LAT_MIN, LAT_MAX, LON_MIN, LON_MAX) -> only sites inside (read via row-group pruning)
+SITE_BBOX = None
+
 # Spatial blocking settings
 BLOCK_SIZE_KM = 75         # try 50–150 km; larger = harder
 TRAIN_FRAC = 0.70
@@ -166,17 +172,8 @@ def main() -> None:
     )
 
     print("Reading monthly data:", MONTHLY_PATH)
-    df = pd.read_parquet(MONTHLY_PATH)
-
-    # Restrict years if needed
-    df = df[(df["year"] >= START_YEAR) & (df["year"] <= END_YEAR)].copy()
-
-    # Re-apply n_days rule if column exists
-    if "n_days" in df.columns:
-        before = len(df)
-        df = df[df["n_days"] >= MIN_VALID_DAYS_PER_MONTH].copy()
-        after = len(df)
-        print(f"Applied n_days >= {MIN_VALID_DAYS_PER_MONTH}: kept {after:,}/{before:,} rows")
+    # years + n_days rule (if the column exists) + optional bbox, applied in the scan
+    df = read_pm_monthly(MONTHLY_PATH, START_YEAR, END_YEAR, MIN_VALID_DAYS_PER_MONTH, SITE_BBOX)
 
     # Projection
     transformer = Transformer.from_crs("EPSG:4326", "EPSG:5070", always_xy=True)
@@ -1,3 +1,5 @@
+import hashlib
+import json
 from pathlib import Path
 from datetime import datetime
 
@@ -5,18 +7,18 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
-from shapely.geometry import MultiPoint, Point, box
-from shapely.ops import unary_union
+from shapely.geometry import MultiPoint, Point
 
 from pyproj import Transformer
+from scipy.sparse import csr_matrix
 from scipy.spatial import cKDTree
 
-import geopandas as gpd
-import osmnx as ox
-
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from monthly_data import read_aod_monthly, read_pm_monthly, source_stamp
+from road_tiles import ROAD_TILE_DEG, neighbourhood_road_distances, site_road_features
+
 
 # ============================================================
 # USER SETTINGS
@@ -36,6 +38,10 @@ GRID_STEP_DEG = 0.05
 MIN_VALID_DAYS_PER_MONTH_PM = 10
 MIN_VALID_DAYS_PER_MONTH_AOD = 10
 
+# monitors read from the monthly file: None -> all sites;
+# (LAT_MIN, LAT_MAX, LON_MIN, LON_MAX) -> only sites inside (read via row-group pruning)
+SITE_BBOX = None
+
 BLOCK_SIZE_KM = 75
 TRAIN_FRAC = 0.70
 VAL_FRAC = 0.15
@@ -45,9 +51,21 @@ RANDOM_SEED = 42
 CREATED_BY = "Ella Bagchi"
 PROJECT_NAME = "air_pollution PM2.5 + AOD integrated ML interpolation"
 
+# monthly parquet files, or monthly_lake.py table folders (e.g. .../monthly_lake/aod_monthly)
 PM_MONTHLY_PATH = Path("/home/ellab/air_pollution/src/data/pm/pm25_monthly_2005_2024.parquet")
 AOD_MONTHLY_PATH = Path("/home/ellab/air_pollution/src/data/aod/aod_monthly_2005_2024.parquet")
 
+# monthly AOD lat/lon spacing (MAIAC 0.05° grid)
+AOD_GRID_STEP_DEG = 0.05
+# dense (time, lat, lon) AOD cube kept on disk and memory-mapped on later runs;
+# rebuilt when the parquet, the years or MIN_VALID_DAYS_PER_MONTH_AOD change. None -> in memory.
+AOD_CUBE_DIR = Path("/home/ellab/air_pollution/src/data/aod/aod_monthly_cube")
+# sparse AOD-grid -> point interpolation operators (sites, output grid), one file per
+# (AOD grid, point set); reused by later runs with the same grids. None -> not cached.
+AOD_INTERP_DIR = Path("/home/ellab/air_pollution/src/data/aod/interp_operators")
+# months per sparse product when applying an operator to the cube (bounds the float64 copy)
+INTERP_CHUNK_MONTHS = 24
+
 OUT_DIR = Path("/home/ellab/air_pollution/src/data/ml_outputs")
 CACHE_DIR = Path("/home/ellab/air_pollution/src/data/osm_cache")
 
@@ -56,12 +74,14 @@ CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 CITY_TAG = "DC"
 
-ROADS_EDGES_PARQUET = CACHE_DIR / (
-    f"osm_roads_edges_bbox_{LAT_MIN}_{LAT_MAX}_{LON_MIN}_{LON_MAX}.parquet"
-)
-SITE_ROAD_FEATURES_PARQUET = CACHE_DIR / (
-    f"site_road_distance_features_bbox_{LAT_MIN}_{LAT_MAX}_{LON_MIN}_{LON_MAX}.parquet"
-)
+# OSM roads in fixed ROAD_TILE_DEG tiles + per-site road features, shared by every run / bbox
+ROAD_TILES_DIR = CACHE_DIR / "road_tiles"
+
+# road distances (sites and grid alike): None -> exact (STRtree of road segments); a cell
+# size in m (e.g. 100.0) -> lookups in distance rasters cached under ROAD_TILES_DIR, within
+# road_distance.RASTER_MAX_ERROR_CELLS (~1.9) x the cell size of the exact distances.
+# One raster set per 3 x 3 tile neighbourhood: each tile is rasterized up to 9 times
+ROAD_RASTER_RES_M = None
 
 
 # ============================================================
@@ -125,108 +145,6 @@ def add_dist_nn_to_train(df: pd.DataFrame, kdtree_train: cKDTree) -> pd.DataFram
     return df2
 
 
-# ============================================================
-# ROAD FEATURES
-# ============================================================
-def make_points_gdf(latlon_df: pd.DataFrame) -> gpd.GeoDataFrame:
-    return gpd.GeoDataFrame(
-        latlon_df.copy(),
-        geometry=gpd.points_from_xy(latlon_df["Longitude"], latlon_df["Latitude"]),
-        crs="EPSG:4326",
-    )
-
-
-def has_kind(v, allowed: list[str]) -> bool:
-    if isinstance(v, list):
-        return any(str(x) in allowed for x in v)
-    if pd.isna(v):
-        return False
-    return str(v) in allowed
-
-
-def load_or_download_roads_edges() -> gpd.GeoDataFrame:
-    if ROADS_EDGES_PARQUET.exists():
-        print(f"Loading cached OSM roads: {ROADS_EDGES_PARQUET}")
-        edges = gpd.read_parquet(ROADS_EDGES_PARQUET)
-        if edges.crs is None:
-            edges = edges.set_crs("EPSG:4326")
-        return edges
-
-    print("Downloading OSM roads (first run only)...")
-
-    ox.settings.use_cache = True
-    ox.settings.cache_folder = str(CACHE_DIR)
-    ox.settings.log_console = False
-
-    poly = box(LON_MIN, LAT_MIN, LON_MAX, LAT_MAX)
-    G = ox.graph_from_polygon(poly, network_type="drive")
-    edges = ox.graph_to_gdfs(G, nodes=False, edges=True)
-
-    edges = edges[["highway", "geometry"]].copy()
-    edges = edges.set_crs("EPSG:4326")
-
-    edges["is_motorway"] = edges["highway"].apply(
-        lambda v: has_kind(v, ["motorway", "motorway_link"])
-    )
-    edges["is_trunk"] = edges["highway"].apply(
-        lambda v: has_kind(v, ["trunk", "trunk_link"])
-    )
-    edges["is_primary"] = edges["highway"].apply(
-        lambda v: has_kind(v, ["primary", "primary_link"])
-    )
-
-    edges = edges[["is_motorway", "is_trunk", "is_primary", "geometry"]].copy()
-
-    print(f"Saving cached roads to: {ROADS_EDGES_PARQUET}")
-    edges.to_parquet(ROADS_EDGES_PARQUET, index=False)
-    return edges
-
-
-def build_union_geometry(lines_gdf: gpd.GeoDataFrame):
-    if lines_gdf is None or len(lines_gdf) == 0:
-        return None
-
-    lines_m = lines_gdf.to_crs("EPSG:5070")
-    return unary_union(lines_m.geometry.tolist())
-
-
-def dist_to_union_km(points_gdf: gpd.GeoDataFrame, union_geom) -> np.ndarray:
-    if union_geom is None:
-        return np.full(len(points_gdf), np.nan, dtype="float32")
-
-    pts_m = points_gdf.to_crs("EPSG:5070")
-    d_km = pts_m.geometry.distance(union_geom) / 1000.0
-    return d_km.to_numpy(dtype="float32")
-
-
-def compute_or_load_site_road_features(all_sites_latlon: pd.DataFrame) -> pd.DataFrame:
-    if SITE_ROAD_FEATURES_PARQUET.exists():
-        print(f"Loading cached site road features: {SITE_ROAD_FEATURES_PARQUET}")
-        return pd.read_parquet(SITE_ROAD_FEATURES_PARQUET)
-
-    edges = load_or_download_roads_edges()
-
-    motorway = edges[edges["is_motorway"]].copy()
-    trunk = edges[edges["is_trunk"]].copy()
-    primary = edges[edges["is_primary"]].copy()
-
-    motorway_union = build_union_geometry(motorway)
-    trunk_union = build_union_geometry(trunk)
-    primary_union = build_union_geometry(primary)
-
-    pts_gdf = make_points_gdf(all_sites_latlon)
-
-    print("Computing distance-to-road features for sites...")
-    out = all_sites_latlon.copy()
-    out["dist_motorway_km"] = dist_to_union_km(pts_gdf, motorway_union)
-    out["dist_trunk_km"] = dist_to_union_km(pts_gdf, trunk_union)
-    out["dist_primary_km"] = dist_to_union_km(pts_gdf, primary_union)
-
-    print(f"Saving site road features to: {SITE_ROAD_FEATURES_PARQUET}")
-    out.to_parquet(SITE_ROAD_FEATURES_PARQUET, index=False)
-    return out
-
-
 # ============================================================
 # SPATIAL BLOCKING
 # ============================================================
@@ -292,51 +210,314 @@ def make_spatial_blocks_split(
 # ============================================================
 # AOD HELPERS
 # ============================================================
-def load_monthly_aod_as_xarray(aod_parquet_path: Path) -> xr.Dataset:
+def regular_axis_codes(values: np.ndarray, step: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Integer positions of values on a regular axis (min(values) + k * step) and the axis.
+    Axis entries that occur in values keep their exact float value.
+    """
+    vmin = values.min()
+    codes = np.rint((values - vmin) / step).astype(np.int64)
+    off_grid = np.abs(values - (vmin + codes * step)).max()
+    if off_grid > step * 1e-3:
+        hint = ""
+        if abs(off_grid - step / 2) <= step * 1e-3:
+            # e.g. cell-centre (aod_clean) and cell-corner (aod_clean3) CMG labels in one file
+            hint = "; half a cell: two grid conventions mixed, rebuild it with aod_monthly.py"
+        raise ValueError(f"values are not on a regular {step} grid (off by up to {off_grid}){hint}")
+
+    axis = vmin + np.arange(codes.max() + 1) * step
+    axis[codes] = values
+    return codes, axis
+
+
+def month_codes(times: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Integer month positions of month-start times and the monthly axis (datetime64[ns])."""
+    months = times.astype("datetime64[M]")
+    if (months.astype("datetime64[ns]") != times).any():
+        raise ValueError("AOD times are not month starts")
+    m = months.astype(np.int64)
+    codes = m - m.min()
+    axis = (m.min() + np.arange(codes.max() + 1)).astype("datetime64[M]").astype("datetime64[ns]")
+    return codes, axis
+
+
+def _aod_cube_meta(aod_parquet_path: Path) -> dict:
+    size, mtime_ns = source_stamp(aod_parquet_path)   # a file, or every file of a lake table
+    return {
+        "source": str(aod_parquet_path),
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "min_valid_days": MIN_VALID_DAYS_PER_MONTH_AOD,
+        "years": [START_YEAR, END_YEAR],
+        "step": AOD_GRID_STEP_DEG,
+    }
+
+
+def _cube_dataset(cube: np.ndarray, time: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> xr.Dataset:
+    return xr.Dataset(
+        {"aod_monthly_mean": (("time", "lat", "lon"), cube)},
+        coords={"time": time, "lat": lat, "lon": lon},
+    )
+
+
+def load_monthly_aod_as_xarray(aod_parquet_path: Path, cube_dir: Path | None = AOD_CUBE_DIR) -> xr.Dataset:
+    """
+    Monthly AOD as a dense float32 (time, lat, lon) cube on the regular AOD grid
+    (ascending axes; cells / months without data are NaN).
+
+    Rows are scattered straight into the preallocated cube by their integer grid codes,
+    so there is no MultiIndex / to_xarray / sortby copy. With cube_dir the cube is written
+    there once (cube.npy) and memory-mapped read-only on later runs.
+    """
+    meta = _aod_cube_meta(aod_parquet_path)
+    if cube_dir is not None and (cube_dir / "meta.json").exists():
+        with open(cube_dir / "meta.json") as f:
+            if json.load(f) == meta:
+                print("Memory-mapping monthly AOD cube:", cube_dir)
+                axes = np.load(cube_dir / "axes.npz")
+                cube = np.load(cube_dir / "cube.npy", mmap_mode="r")
+                return _cube_dataset(cube, axes["time"], axes["lat"], axes["lon"])
+
     print("Reading monthly AOD parquet:", aod_parquet_path)
-    df = pd.read_parquet(aod_parquet_path).copy()
-
-    df["time"] = pd.to_datetime(df["time"])
-
-    if "n_days" in df.columns:
-        before = len(df)
-        df = df[df["n_days"] >= MIN_VALID_DAYS_PER_MONTH_AOD].copy()
-        after = len(df)
-        print(f"Applied AOD n_days >= {MIN_VALID_DAYS_PER_MONTH_AOD}: kept {after:,}/{before:,} rows")
-
-    ds = (
-        df.set_index(["time", "lat", "lon"])
-          .to_xarray()
-          .sortby("time")
-          .sortby("lat")
-          .sortby("lon")
+    # years + n_days rule pushed down into the scan: dropped rows are never decoded
+    table = read_aod_monthly(aod_parquet_path, START_YEAR, END_YEAR, MIN_VALID_DAYS_PER_MONTH_AOD)
+
+    times = table["time"].to_numpy().astype("datetime64[ns]")
+    lats = table["lat"].to_numpy()
+    lons = table["lon"].to_numpy()
+    values = table["aod_monthly_mean"].to_numpy().astype(np.float32)
+    del table
+
+    t_code, time_axis = month_codes(times)
+    lat_code, lat_axis = regular_axis_codes(lats, AOD_GRID_STEP_DEG)
+    lon_code, lon_axis = regular_axis_codes(lons, AOD_GRID_STEP_DEG)
+    shape = (time_axis.size, lat_axis.size, lon_axis.size)
+    print(f"AOD cube: {shape[0]} months x {shape[1]} lat x {shape[2]} lon "
+          f"({np.prod(shape) * 4 / 1e6:,.0f} MB float32)")
+
+    if cube_dir is None:
+        cube = np.full(shape, np.nan, dtype=np.float32)
+        cube[t_code, lat_code, lon_code] = values
+        return _cube_dataset(cube, time_axis, lat_axis, lon_axis)
+
+    # build on disk; meta.json is written last and marks a complete cube
+    cube_dir.mkdir(parents=True, exist_ok=True)
+    (cube_dir / "meta.json").unlink(missing_ok=True)
+    cube = np.lib.format.open_memmap(cube_dir / "cube.npy", mode="w+", dtype=np.float32, shape=shape)
+    cube[:] = np.nan
+    cube[t_code, lat_code, lon_code] = values
+    cube.flush()
+    np.savez(cube_dir / "axes.npz", time=time_axis, lat=lat_axis, lon=lon_axis)
+    with open(cube_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    print("Saved monthly AOD cube:", cube_dir)
+
+    del cube
+    cube = np.load(cube_dir / "cube.npy", mmap_mode="r")
+    return _cube_dataset(cube, time_axis, lat_axis, lon_axis)
+
+
+def linear_corners(
+    lat_axis: np.ndarray, lon_axis: np.ndarray, lat: np.ndarray, lon: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Source cells and weights of linear interpolation at (lat, lon) points on ascending axes,
+    with the same cells / NaN behaviour as DataArray.interp(lat=<scalar>, lon=<scalar>):
+    xarray interpolates lat first (scipy interp1d: both bracketing rows always count, a point
+    on a row uses the row below as well) and then lon (numpy.interp: a point on a column uses
+    that column only).
+
+    Returns rows, cols, weights (n, 4) for the corners (lat0, lon0), (lat1, lon0), (lat0, lon1),
+    (lat1, lon1); used (n, 4): corners that take part (a NaN there makes the result NaN);
+    inside (n,): points within the axes (the others interpolate to NaN).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n_lat, n_lon = lat_axis.size, lon_axis.size
+    inside = (lat >= lat_axis[0]) & (lat <= lat_axis[-1]) & (lon >= lon_axis[0]) & (lon <= lon_axis[-1])
+    if n_lat < 2 or n_lon < 2:
+        inside[:] = False
+
+    # lat: interp1d brackets, searchsorted(left) clipped to [1, n - 1]
+    i1 = np.clip(np.searchsorted(lat_axis, lat), 1, max(n_lat - 1, 1))
+    i0 = i1 - 1
+    # lon: numpy.interp brackets, lon_axis[j0] <= lon < lon_axis[j0 + 1]
+    j0 = np.clip(np.searchsorted(lon_axis, lon, side="right") - 1, 0, n_lon - 1)
+    j1 = np.minimum(j0 + 1, n_lon - 1)
+    on_column = lon_axis[j0] == lon
+
+    # points outside the axes (or on the last column) divide by zero; they are masked below
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w_lat = (lat - lat_axis[i0]) / (lat_axis[i1] - lat_axis[i0])
+        w_lon = np.where(on_column, 0.0, (lon - lon_axis[j0]) / (lon_axis[j1] - lon_axis[j0]))
+        weights = np.stack([(1 - w_lat) * (1 - w_lon), w_lat * (1 - w_lon),
+                            (1 - w_lat) * w_lon, w_lat * w_lon], axis=1)
+
+    rows = np.stack([i0, i1, i0, i1], axis=1)
+    cols = np.stack([j0, j0, j1, j1], axis=1)
+    used = np.stack([inside, inside, inside & ~on_column, inside & ~on_column], axis=1)
+    weights[~used] = 0.0
+    return rows, cols, weights, used, inside
+
+
+def interpn_corners(
+    lat_axis: np.ndarray, lon_axis: np.ndarray, lat: np.ndarray, lon: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    As linear_corners, for DataArray.interp(lat=<points>, lon=<points>) on a shared points
+    dim (scipy interpn, linear): the lower bracket is searchsorted(right) - 1 clipped to
+    [0, n - 2] on both axes and all four corners always count, zero weight or not.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n_lat, n_lon = lat_axis.size, lon_axis.size
+    inside = (lat >= lat_axis[0]) & (lat <= lat_axis[-1]) & (lon >= lon_axis[0]) & (lon <= lon_axis[-1])
+    if n_lat < 2 or n_lon < 2:
+        inside[:] = False
+
+    i0 = np.clip(np.searchsorted(lat_axis, lat, side="right") - 1, 0, max(n_lat - 2, 0))
+    j0 = np.clip(np.searchsorted(lon_axis, lon, side="right") - 1, 0, max(n_lon - 2, 0))
+    i1 = np.minimum(i0 + 1, n_lat - 1)
+    j1 = np.minimum(j0 + 1, n_lon - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w_lat = (lat - lat_axis[i0]) / (lat_axis[i1] - lat_axis[i0])
+        w_lon = (lon - lon_axis[j0]) / (lon_axis[j1] - lon_axis[j0])
+
+    rows = np.stack([i0, i1, i0, i1], axis=1)
+    cols = np.stack([j0, j0, j1, j1], axis=1)
+    weights = np.stack([(1 - w_lat) * (1 - w_lon), w_lat * (1 - w_lon),
+                        (1 - w_lat) * w_lon, w_lat * w_lon], axis=1)
+    used = np.repeat(inside[:, None], 4, axis=1)
+    weights[~used] = 0.0
+    return rows, cols, weights, used, inside
+
+
+# how the points are passed to DataArray.interp -> corner rule that reproduces it
+INTERP_RULES = {"scalar": linear_corners, "points": interpn_corners}
+
+
+def _array_digest(*arrays: np.ndarray) -> str:
+    h = hashlib.sha1()
+    for a in arrays:
+        h.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def build_interp_operator(
+    lat_axis: np.ndarray, lon_axis: np.ndarray, lat: np.ndarray, lon: np.ndarray, rule: str
+) -> dict:
+    """
+    Linear interpolation from a (lat_axis, lon_axis) grid to fixed points as a sparse
+    (n_points, n_lat * n_lon) matrix. Every corner that takes part is stored, zero weights
+    included, so a NaN there still makes the point NaN in the product (as in interp).
+    Returns {"matrix", "inside" (points within the grid), "grid_shape"}.
+    """
+    rows, cols, weights, used, inside = INTERP_RULES[rule](lat_axis, lon_axis, lat, lon)
+    point = np.repeat(np.arange(rows.shape[0]), 4).reshape(rows.shape)
+    matrix = csr_matrix(
+        (weights[used], (point[used], rows[used] * lon_axis.size + cols[used])),
+        shape=(rows.shape[0], lat_axis.size * lon_axis.size),
     )
+    return {"matrix": matrix, "inside": inside, "grid_shape": (lat_axis.size, lon_axis.size)}
+
+
+def load_or_build_interp_operator(
+    lat_axis: np.ndarray,
+    lon_axis: np.ndarray,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    rule: str,
+    cache_dir: Path | None = AOD_INTERP_DIR,
+) -> dict:
+    """build_interp_operator, cached in cache_dir under a key of (rule, grid axes, points)."""
+    if cache_dir is None:
+        return build_interp_operator(lat_axis, lon_axis, lat, lon, rule)
+
+    spec = {
+        "rule": rule,
+        "grid": [int(lat_axis.size), int(lon_axis.size), _array_digest(lat_axis, lon_axis)],
+        "points": [int(np.size(lat)), _array_digest(lat, lon)],
+    }
+    key = hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+    path = cache_dir / f"interp_{rule}_{np.size(lat)}pts_{key}.npz"
+
+    if path.exists():
+        with np.load(path) as f:
+            if json.loads(str(f["spec"])) == spec:
+                matrix = csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+                return {"matrix": matrix, "inside": f["inside"], "grid_shape": tuple(f["grid_shape"])}
+
+    op = build_interp_operator(lat_axis, lon_axis, lat, lon, rule)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    m = op["matrix"]
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, data=m.data, indices=m.indices, indptr=m.indptr, shape=np.array(m.shape),
+             inside=op["inside"], grid_shape=np.array(op["grid_shape"]), spec=json.dumps(spec))
+    tmp.replace(path)
+    print("Saved interpolation operator:", path)
+    return op
+
+
+def apply_interp_operator(op: dict, cube: np.ndarray, months: np.ndarray | None = None) -> np.ndarray:
+    """
+    Operator applied to a (time, lat, lon) cube (all months, or the given month indices):
+    (n_months, n_points) float32, NaN outside the grid or where a used corner is NaN.
+    One sparse product per INTERP_CHUNK_MONTHS months.
+    """
+    if months is None:
+        months = np.arange(cube.shape[0])
+    n_cells = op["grid_shape"][0] * op["grid_shape"][1]
+    out = np.empty((len(months), op["matrix"].shape[0]), dtype=np.float32)
+    for k in range(0, len(months), INTERP_CHUNK_MONTHS):
+        chunk = months[k:k + INTERP_CHUNK_MONTHS]
+        block = np.asarray(cube[chunk], dtype=np.float64).reshape(len(chunk), n_cells)
+        out[k:k + len(chunk)] = (op["matrix"] @ block.T).T
+    out[:, ~op["inside"]] = np.nan
+    return out
 
-    return ds
 
+def time_positions(time_axis: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Index of each time on time_axis, -1 where it is not on the axis (sel(time=t) would fail)."""
+    times = np.asarray(times).astype(time_axis.dtype)
+    pos = np.clip(np.searchsorted(time_axis, times), 0, time_axis.size - 1)
+    return np.where(time_axis[pos] == times, pos, -1)
 
-def sample_aod_to_sites(df_sites_monthly: pd.DataFrame, aod_ds: xr.Dataset) -> pd.DataFrame:
-    out_rows = []
 
-    for row in df_sites_monthly.itertuples(index=False):
-        t = np.datetime64(pd.Timestamp(year=int(row.year), month=int(row.month), day=1))
-        lat = float(row.Latitude)
-        lon = float(row.Longitude)
+def sample_aod_points(aod_ds: xr.Dataset, times: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    AOD at (time, lat, lon) points (float32, NaN where missing), equal to
+    aod_ds["aod_monthly_mean"].sel(time=t).interp(lat=lat, lon=lon) point by point.
+    One "scalar" interpolation operator over the distinct locations, applied to the
+    months that occur; each row then picks its (month, location) value.
+    """
+    coords = np.column_stack([np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)])
+    locations, loc_idx = np.unique(coords, axis=0, return_inverse=True)
+    op = load_or_build_interp_operator(aod_ds["lat"].values, aod_ds["lon"].values,
+                                       locations[:, 0], locations[:, 1], "scalar")
+
+    t_pos = time_positions(aod_ds["time"].values, times)
+    months, month_idx = np.unique(t_pos, return_inverse=True)
+    values = np.full((months.size, locations.shape[0]), np.nan, dtype=np.float32)
+    on_axis = months >= 0
+    values[on_axis] = apply_interp_operator(op, aod_ds["aod_monthly_mean"].data, months[on_axis])
+    return values[month_idx.ravel(), loc_idx.ravel()]
 
-        try:
-            sampled = aod_ds["aod_monthly_mean"].sel(time=t).interp(lat=lat, lon=lon)
-            aod_val = float(sampled.values)
-        except Exception:
-            aod_val = np.nan
 
-        row_dict = row._asdict()
-        row_dict["aod_monthly_mean"] = aod_val
-        row_dict["aod_missing"] = 1 if np.isnan(aod_val) else 0
-        out_rows.append(row_dict)
+def sample_aod_to_sites(df_sites_monthly: pd.DataFrame, aod_ds: xr.Dataset) -> pd.DataFrame:
+    times = (
+        pd.to_datetime(pd.DataFrame({"year": df_sites_monthly["year"],
+                                     "month": df_sites_monthly["month"], "day": 1}))
+        .to_numpy()
+    )
+    aod_val = sample_aod_points(
+        aod_ds, times,
+        df_sites_monthly["Latitude"].to_numpy(dtype=np.float64),
+        df_sites_monthly["Longitude"].to_numpy(dtype=np.float64),
+    )
 
-    out_df = pd.DataFrame(out_rows)
-    out_df["aod_monthly_mean"] = out_df["aod_monthly_mean"].astype("float32")
-    out_df["aod_missing"] = out_df["aod_missing"].astype("int8")
+    out_df = df_sites_monthly.reset_index(drop=True)
+    out_df["aod_monthly_mean"] = aod_val
+    out_df["aod_missing"] = np.isnan(aod_val).astype("int8")
 
     # Sentinel fill for RF
     out_df["aod_monthly_mean"] = out_df["aod_monthly_mean"].fillna(np.float32(-999.0))
@@ -344,16 +525,10 @@ def sample_aod_to_sites(df_sites_monthly: pd.DataFrame, aod_ds: xr.Dataset) -> p
     return out_df
 
 
-def add_aod_to_grid(base_grid_df: pd.DataFrame, aod_ds: xr.Dataset, year: int, month: int) -> pd.DataFrame:
-    t = np.datetime64(pd.Timestamp(year=year, month=month, day=1))
-
-    sampled = aod_ds["aod_monthly_mean"].sel(time=t).interp(
-        lat=xr.DataArray(base_grid_df["Latitude"].values, dims="points"),
-        lon=xr.DataArray(base_grid_df["Longitude"].values, dims="points"),
-    )
-
+def add_aod_to_grid(base_grid_df: pd.DataFrame, aod_values: np.ndarray) -> pd.DataFrame:
+    """base_grid_df + one month of AOD at its points (a row of apply_interp_operator)."""
     df_out = base_grid_df.copy()
-    df_out["aod_monthly_mean"] = sampled.values.astype("float32")
+    df_out["aod_monthly_mean"] = aod_values.astype("float32")
     df_out["aod_missing"] = np.isnan(df_out["aod_monthly_mean"]).astype("int8")
     df_out["aod_monthly_mean"] = df_out["aod_monthly_mean"].fillna(np.float32(-999.0))
 
@@ -372,14 +547,8 @@ def main() -> None:
     )
 
     print("Reading monthly PM data:", PM_MONTHLY_PATH)
-    df = pd.read_parquet(PM_MONTHLY_PATH)
-    df = df[(df["year"] >= START_YEAR) & (df["year"] <= END_YEAR)].copy()
-
-    if "n_days" in df.columns:
-        before = len(df)
-        df = df[df["n_days"] >= MIN_VALID_DAYS_PER_MONTH_PM].copy()
-        after = len(df)
-        print(f"Applied PM n_days >= {MIN_VALID_DAYS_PER_MONTH_PM}: kept {after:,}/{before:,} rows")
+    # years + n_days rule (if the column exists) + optional bbox, applied in the scan
+    df = read_pm_monthly(PM_MONTHLY_PATH, START_YEAR, END_YEAR, MIN_VALID_DAYS_PER_MONTH_PM, SITE_BBOX)
 
     transformer = Transformer.from_crs("EPSG:4326", "EPSG:5070", always_xy=True)
 
@@ -392,7 +561,9 @@ def main() -> None:
 
     # Add road features
     all_sites = df[["Latitude", "Longitude"]].drop_duplicates().copy()
-    road_feats = compute_or_load_site_road_features(all_sites)
+    road_feats = site_road_features(
+        all_sites, ROAD_TILES_DIR, (LAT_MIN, LAT_MAX, LON_MIN, LON_MAX), ROAD_RASTER_RES_M
+    )
     df = df.merge(road_feats, on=["Latitude", "Longitude"], how="left")
 
     for c in ["dist_motorway_km", "dist_trunk_km", "dist_primary_km"]:
@@ -524,23 +695,9 @@ def main() -> None:
     inside_lon = lon2d[mask].astype(np.float32)
     base_grid_df = pd.DataFrame({"Latitude": inside_lat, "Longitude": inside_lon})
 
-    # Roads for grid points
-    edges = load_or_download_roads_edges()
-
-    motorway = edges[edges["is_motorway"]].copy()
-    trunk = edges[edges["is_trunk"]].copy()
-    primary = edges[edges["is_primary"]].copy()
-
-    motorway_union = build_union_geometry(motorway)
-    trunk_union = build_union_geometry(trunk)
-    primary_union = build_union_geometry(primary)
-
-    grid_pts_gdf = make_points_gdf(base_grid_df)
-
+    # Roads for grid points: same tile-neighbourhood rule as the training sites
     print("\nComputing distance-to-road features for grid points...")
-    base_grid_df["dist_motorway_km"] = dist_to_union_km(grid_pts_gdf, motorway_union)
-    base_grid_df["dist_trunk_km"] = dist_to_union_km(grid_pts_gdf, trunk_union)
-    base_grid_df["dist_primary_km"] = dist_to_union_km(grid_pts_gdf, primary_union)
+    base_grid_df, road_tile_keys = neighbourhood_road_distances(base_grid_df, ROAD_TILES_DIR, ROAD_RASTER_RES_M)
 
     for c in ["dist_motorway_km", "dist_trunk_km", "dist_primary_km"]:
         base_grid_df[c] = base_grid_df[c].astype("float32").fillna(np.float32(999.0))
@@ -548,11 +705,23 @@ def main() -> None:
     base_grid_df = add_xy_features(base_grid_df, transformer)
     base_grid_df = add_dist_nn_to_train(base_grid_df, kdtree_train)
 
+    # AOD at the grid points for every month: one sparse product over the cube
+    # (same values as aod_ds.sel(time=t).interp(lat=<points>, lon=<points>) month by month)
+    print("\nInterpolating monthly AOD to grid points...")
+    grid_op = load_or_build_interp_operator(
+        aod_ds["lat"].values, aod_ds["lon"].values,
+        base_grid_df["Latitude"].to_numpy(), base_grid_df["Longitude"].to_numpy(), "points",
+    )
+    grid_aod = apply_interp_operator(grid_op, aod_ds["aod_monthly_mean"].data)
+    grid_t = time_positions(aod_ds["time"].values, times)
+    if (grid_t < 0).any():
+        raise KeyError(f"months missing from the AOD cube: {times[grid_t < 0]}")
+
     for t_idx in range(len(times)):
         y = int(years[t_idx])
         m = int(months[t_idx])
 
-        df_feat = add_aod_to_grid(base_grid_df, aod_ds, y, m)
+        df_feat = add_aod_to_grid(base_grid_df, grid_aod[grid_t[t_idx]])
         df_feat["year"] = y
         df_feat["month"] = m
 
@@ -617,7 +786,7 @@ def main() -> None:
         "project": PROJECT_NAME,
         "creation_date": creation_date,
         "osm_bbox": f"{LAT_MIN},{LAT_MAX},{LON_MIN},{LON_MAX}",
-        "osm_cache_edges": str(ROADS_EDGES_PARQUET),
+        "osm_cache_edges": f"{ROAD_TILES_DIR} ({len(road_tile_keys)} tiles of {ROAD_TILE_DEG} deg)",
     }
 
     encoding = {
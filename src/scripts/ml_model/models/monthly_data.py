@@ -0,0 +1,184 @@
+import json
+import sys
+from pathlib import Path
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pads
+
+# monthly_lake.py is in src/scripts: its layout constants and tile arithmetic are reused so
+# the reads here cannot drift from how the lake is partitioned
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from monthly_lake import LAKE_INFO_NAME, bbox_tiles
+
+
+# ============================================================
+# MONTHLY PARQUET ACCESS
+# ============================================================
+# Shared reader for the monthly PM2.5 / AOD parquet files used by the model scripts.
+# Year range, n_days threshold and lat/lon bounds are pushed down into the pyarrow
+# dataset scan and only the requested columns are read, so row groups whose
+# statistics rule them out are skipped without being decoded.
+# A monthly_lake.py folder (year=/month=[/tile=] partitions + _lake.json) is read the same
+# way: the year range and bbox then also prune whole partition folders.
+
+PM_COLUMNS = ["site_id", "Latitude", "Longitude", "year", "month", "pm25_monthly_mean", "n_days"]
+AOD_COLUMNS = ["time", "lat", "lon", "aod_monthly_mean", "n_days"]
+
+
+def monthly_filter(
+    schema: pa.Schema,
+    years: tuple[int, int] | None = None,
+    min_days: int | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+    lat_col: str = "Latitude",
+    lon_col: str = "Longitude",
+) -> pads.Expression | None:
+    """
+    Scan filter for a monthly table.
+    years: (start, end) inclusive, on a "year" column or else on a "time" timestamp column.
+    min_days: n_days >= min_days (skipped if the table has no n_days).
+    bbox: (lat_min, lat_max, lon_min, lon_max), inclusive.
+    """
+    names = schema.names
+    conds = []
+
+    if years is not None:
+        start, end = years
+        if "year" in names:
+            conds.append((pads.field("year") >= start) & (pads.field("year") <= end))
+        elif "time" in names:
+            unit = schema.field("time").type
+            lo = pa.scalar(datetime(start, 1, 1), type=unit)
+            hi = pa.scalar(datetime(end + 1, 1, 1), type=unit)
+            conds.append((pads.field("time") >= lo) & (pads.field("time") < hi))
+        else:
+            raise ValueError("years given but the table has neither 'year' nor 'time'")
+
+    if min_days is not None and "n_days" in names:
+        conds.append(pads.field("n_days") >= min_days)
+
+    if bbox is not None:
+        lat_min, lat_max, lon_min, lon_max = bbox
+        conds.append(
+            (pads.field(lat_col) >= lat_min) & (pads.field(lat_col) <= lat_max) &
+            (pads.field(lon_col) >= lon_min) & (pads.field(lon_col) <= lon_max)
+        )
+
+    if not conds:
+        return None
+    expr = conds[0]
+    for c in conds[1:]:
+        expr = expr & c
+    return expr
+
+
+def open_monthly_dataset(path: Path) -> tuple[pads.Dataset, dict | None]:
+    """pyarrow dataset of a monthly parquet file / folder, or of a lake table folder (+ its info)."""
+    info_path = Path(path) / LAKE_INFO_NAME
+    if not info_path.exists():
+        return pads.dataset(str(path), format="parquet"), None
+    with open(info_path) as f:
+        info = json.load(f)
+    part_schema = pa.schema([(name, pa.type_for_alias(t)) for name, t in info["partition_types"].items()])
+    partitioning = pads.partitioning(part_schema, flavor=info["partitioning"])
+    return pads.dataset(str(path), format="parquet", partitioning=partitioning), info
+
+
+def source_stamp(path: Path) -> tuple[int, int]:
+    """
+    (total bytes, newest mtime_ns) of a monthly parquet file or of every file under a
+    folder / lake table, so caches keyed on it notice a rewritten month partition.
+    """
+    path = Path(path)
+    if path.is_file():
+        st = path.stat()
+        return st.st_size, st.st_mtime_ns
+    size, mtime_ns = 0, path.stat().st_mtime_ns
+    for f in path.rglob("*"):
+        if f.is_file():
+            st = f.stat()
+            size += st.st_size
+            mtime_ns = max(mtime_ns, st.st_mtime_ns)
+    return size, mtime_ns
+
+
+def lake_tile_filter(
+    info: dict,
+    bbox: tuple[float, float, float, float],
+) -> pads.Expression | None:
+    """tile partition keys overlapping bbox (monthly_lake.bbox_tiles), or None if untiled."""
+    tile_deg = info.get("tile_deg")
+    if not tile_deg:
+        return None
+    return pads.field("tile").isin(bbox_tiles(bbox, tile_deg))
+
+
+def read_monthly_table(
+    path: Path,
+    columns: list[str] | None = None,
+    years: tuple[int, int] | None = None,
+    min_days: int | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+    lat_col: str = "Latitude",
+    lon_col: str = "Longitude",
+) -> pa.Table:
+    """
+    Rows of a monthly parquet file (or folder of parquet files, or lake table) matching
+    the filters, with only the requested columns that exist in the data. Row order is
+    kept for files; a lake comes back in partition (year, month) order.
+    """
+    dataset, lake = open_monthly_dataset(path)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    expr = monthly_filter(dataset.schema, years, min_days, bbox, lat_col, lon_col)
+    if lake is not None and bbox is not None:
+        tiles = lake_tile_filter(lake, bbox)
+        if tiles is not None:
+            expr = tiles & expr
+
+    table = dataset.to_table(columns=columns, filter=expr)
+
+    n_total = dataset.count_rows()   # from the file footers, no data read
+    desc = []
+    if years is not None:
+        desc.append(f"years {years[0]}-{years[1]}")
+    if min_days is not None and "n_days" in dataset.schema.names:
+        desc.append(f"n_days >= {min_days}")
+    if bbox is not None:
+        desc.append(f"bbox {bbox}")
+    print(f"Read {table.num_rows:,}/{n_total:,} rows"
+          + (f" ({', '.join(desc)})" if desc else "") + f" from {path}")
+    return table
+
+
+def read_pm_monthly(
+    path: Path,
+    start_year: int,
+    end_year: int,
+    min_days: int | None,
+    bbox: tuple[float, float, float, float] | None = None,
+    columns: list[str] = PM_COLUMNS,
+) -> pd.DataFrame:
+    """Monthly PM2.5 site rows for the years / n_days rule / optional site bbox."""
+    table = read_monthly_table(path, columns, (start_year, end_year), min_days, bbox)
+    df = table.to_pandas()
+    if (Path(path) / LAKE_INFO_NAME).exists():
+        # the monolithic file's order (pm25_monthly.combine_parts sorts this way)
+        keys = [c for c in ("site_id", "year", "month") if c in df.columns]
+        df = df.sort_values(keys, kind="stable", ignore_index=True)
+    return df
+
+
+def read_aod_monthly(
+    path: Path,
+    start_year: int | None,
+    end_year: int | None,
+    min_days: int | None,
+    bbox: tuple[float, float, float, float] | None = None,
+    columns: list[str] = AOD_COLUMNS,
+) -> pa.Table:
+    """Monthly AOD pixel rows (arrow table: callers convert only the columns they use)."""
+    years = None if start_year is None else (start_year, end_year)
+    return read_monthly_table(path, columns, years, min_days, bbox, lat_col="lat", lon_col="lon")
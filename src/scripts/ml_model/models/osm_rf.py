@@ -5,18 +5,17 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
-from shapely.geometry import MultiPoint, Point, box
-from shapely.ops import unary_union
+from shapely.geometry import MultiPoint, Point
 
 from pyproj import Transformer
 from scipy.spatial import cKDTree
 
-import geopandas as gpd
-import osmnx as ox
-
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from monthly_data import read_pm_monthly
+from road_tiles import ROAD_TILE_DEG, neighbourhood_road_distances, site_road_features
+
 
 # ============================================================
 # USER SETTINGS
@@ -34,6 +33,10 @@ GRID_STEP_DEG = 0.05
 
 MIN_VALID_DAYS_PER_MONTH = 10
 
+# monitors read from the monthly file: None -> all sites;
+# (LAT_MIN, LAT_MAX, LON_MIN, LON_MAX) -> only sites inside (read via row-group pruning)
+SITE_BBOX = None
+
 BLOCK_SIZE_KM = 75
 TRAIN_FRAC = 0.70
 VAL_FRAC = 0.15
@@ -51,12 +54,14 @@ CACHE_DIR = Path("/home/ellab/air_pollution/src/data/osm_cache")
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-ROADS_EDGES_PARQUET = CACHE_DIR / (
-    f"osm_roads_edges_bbox_{LAT_MIN}_{LAT_MAX}_{LON_MIN}_{LON_MAX}.parquet"
-)
-SITE_ROAD_FEATURES_PARQUET = CACHE_DIR / (
-    f"site_road_distance_features_bbox_{LAT_MIN}_{LAT_MAX}_{LON_MIN}_{LON_MAX}.parquet"
-)
+# OSM roads in fixed ROAD_TILE_DEG tiles + per-site road features, shared by every run / bbox
+ROAD_TILES_DIR = CACHE_DIR / "road_tiles"
+
+# road distances (sites and grid alike): None -> exact (STRtree of road segments); a cell
+# size in m (e.g. 100.0) -> lookups in distance rasters cached under ROAD_TILES_DIR, within
+# road_distance.RASTER_MAX_ERROR_CELLS (~1.9) x the cell size of the exact distances.
+# One raster set per 3 x 3 tile neighbourhood: each tile is rasterized up to 9 times
+ROAD_RASTER_RES_M = None
 
 
 # ============================================================
@@ -95,124 +100,6 @@ def add_spatial_features(
     return df2
 
 
-# ============================================================
-# ROAD FEATURES
-# ============================================================
-def make_points_gdf(latlon_df: pd.DataFrame) -> gpd.GeoDataFrame:
-    return gpd.GeoDataFrame(
-        latlon_df.copy(),
-        geometry=gpd.points_from_xy(latlon_df["Longitude"], latlon_df["Latitude"]),
-        crs="EPSG:4326",
-    )
-
-
-def has_kind(v, allowed: list[str]) -> bool:
-    """
-    OSM 'highway' can be a string or a list.
-    """
-    if isinstance(v, list):
-        return any(str(x) in allowed for x in v)
-    if pd.isna(v):
-        return False
-    return str(v) in allowed
-
-
-def load_or_download_roads_edges() -> gpd.GeoDataFrame:
-    """
-    Download drivable OSM roads once and cache them.
-    Cache only boolean road-type columns + geometry so Parquet stays simple.
-    """
-    if ROADS_EDGES_PARQUET.exists():
-        print(f"Loading cached OSM roads: {ROADS_EDGES_PARQUET}")
-        edges = gpd.read_parquet(ROADS_EDGES_PARQUET)
-        if edges.crs is None:
-            edges = edges.set_crs("EPSG:4326")
-        return edges
-
-    print("Downloading OSM roads (first run only)...")
-
-    ox.settings.use_cache = True
-    ox.settings.cache_folder = str(CACHE_DIR)
-    ox.settings.log_console = False
-
-    poly = box(LON_MIN, LAT_MIN, LON_MAX, LAT_MAX)
-    G = ox.graph_from_polygon(poly, network_type="drive")
-    edges = ox.graph_to_gdfs(G, nodes=False, edges=True)
-
-    edges = edges[["highway", "geometry"]].copy()
-    edges = edges.set_crs("EPSG:4326")
-
-    edges["is_motorway"] = edges["highway"].apply(
-        lambda v: has_kind(v, ["motorway", "motorway_link"])
-    )
-    edges["is_trunk"] = edges["highway"].apply(
-        lambda v: has_kind(v, ["trunk", "trunk_link"])
-    )
-    edges["is_primary"] = edges["highway"].apply(
-        lambda v: has_kind(v, ["primary", "primary_link"])
-    )
-
-    edges = edges[["is_motorway", "is_trunk", "is_primary", "geometry"]].copy()
-
-    print(f"Saving cached roads to: {ROADS_EDGES_PARQUET}")
-    edges.to_parquet(ROADS_EDGES_PARQUET, index=False)
-    return edges
-
-
-def build_union_geometry(lines_gdf: gpd.GeoDataFrame):
-    """
-    Project lines to meters and unary-union them into one geometry.
-    """
-    if lines_gdf is None or len(lines_gdf) == 0:
-        return None
-
-    lines_m = lines_gdf.to_crs("EPSG:5070")
-    return unary_union(lines_m.geometry.tolist())
-
-
-def dist_to_union_km(points_gdf: gpd.GeoDataFrame, union_geom) -> np.ndarray:
-    """
-    Distance from each point to a single merged road geometry, in km.
-    """
-    if union_geom is None:
-        return np.full(len(points_gdf), np.nan, dtype="float32")
-
-    pts_m = points_gdf.to_crs("EPSG:5070")
-    d_km = pts_m.geometry.distance(union_geom) / 1000.0
-    return d_km.to_numpy(dtype="float32")
-
-
-def compute_or_load_site_road_features(all_sites_latlon: pd.DataFrame) -> pd.DataFrame:
-    """
-    Compute road-distance features once for all unique monitoring sites.
-    """
-    if SITE_ROAD_FEATURES_PARQUET.exists():
-        print(f"Loading cached site road features: {SITE_ROAD_FEATURES_PARQUET}")
-        return pd.read_parquet(SITE_ROAD_FEATURES_PARQUET)
-
-    edges = load_or_download_roads_edges()
-
-    motorway = edges[edges["is_motorway"]].copy()
-    trunk = edges[edges["is_trunk"]].copy()
-    primary = edges[edges["is_primary"]].copy()
-
-    motorway_union = build_union_geometry(motorway)
-    trunk_union = build_union_geometry(trunk)
-    primary_union = build_union_geometry(primary)
-
-    pts_gdf = make_points_gdf(all_sites_latlon)
-
-    print("Computing distance-to-road features for sites...")
-    out = all_sites_latlon.copy()
-    out["dist_motorway_km"] = dist_to_union_km(pts_gdf, motorway_union)
-    out["dist_trunk_km"] = dist_to_union_km(pts_gdf, trunk_union)
-    out["dist_primary_km"] = dist_to_union_km(pts_gdf, primary_union)
-
-    print(f"Saving site road features to: {SITE_ROAD_FEATURES_PARQUET}")
-    out.to_parquet(SITE_ROAD_FEATURES_PARQUET, index=False)
-    return out
-
-
 # ============================================================
 # SPATIAL BLOCKING SPLIT
 # ============================================================
@@ -289,20 +176,16 @@ def main() -> None:
     )
 
     print("Reading monthly data:", MONTHLY_PATH)
-    df = pd.read_parquet(MONTHLY_PATH)
-    df = df[(df["year"] >= START_YEAR) & (df["year"] <= END_YEAR)].copy()
-
-    if "n_days" in df.columns:
-        before = len(df)
-        df = df[df["n_days"] >= MIN_VALID_DAYS_PER_MONTH].copy()
-        after = len(df)
-        print(f"Applied n_days >= {MIN_VALID_DAYS_PER_MONTH}: kept {after:,}/{before:,} rows")
+    # years + n_days rule (if the column exists) + optional bbox, applied in the scan
+    df = read_pm_monthly(MONTHLY_PATH, START_YEAR, END_YEAR, MIN_VALID_DAYS_PER_MONTH, SITE_BBOX)
 
     transformer = Transformer.from_crs("EPSG:4326", "EPSG:5070", always_xy=True)
 
     # Add road features to all unique sites, then merge
     all_sites = df[["Latitude", "Longitude"]].drop_duplicates().copy()
-    road_feats = compute_or_load_site_road_features(all_sites)
+    road_feats = site_road_features(
+        all_sites, ROAD_TILES_DIR, (LAT_MIN, LAT_MAX, LON_MIN, LON_MAX), ROAD_RASTER_RES_M
+    )
     df = df.merge(road_feats, on=["Latitude", "Longitude"], how="left")
 
     for c in ["dist_motorway_km", "dist_trunk_km", "dist_primary_km"]:
@@ -426,23 +309,9 @@ def main() -> None:
     inside_lon = lon2d[mask].astype(np.float32)
     base_grid_df = pd.DataFrame({"Latitude": inside_lat, "Longitude": inside_lon})
 
-    # Roads for grid points
-    edges = load_or_download_roads_edges()
-
-    motorway = edges[edges["is_motorway"]].copy()
-    trunk = edges[edges["is_trunk"]].copy()
-    primary = edges[edges["is_primary"]].copy()
-
-    motorway_union = build_union_geometry(motorway)
-    trunk_union = build_union_geometry(trunk)
-    primary_union = build_union_geometry(primary)
-
-    grid_pts_gdf = make_points_gdf(base_grid_df)
-
+    # Roads for grid points: same tile-neighbourhood rule as the training sites
     print("\nComputing distance-to-road features for grid points...")
-    base_grid_df["dist_motorway_km"] = dist_to_union_km(grid_pts_gdf, motorway_union)
-    base_grid_df["dist_trunk_km"] = dist_to_union_km(grid_pts_gdf, trunk_union)
-    base_grid_df["dist_primary_km"] = dist_to_union_km(grid_pts_gdf, primary_union)
+    base_grid_df, road_tile_keys = neighbourhood_road_distances(base_grid_df, ROAD_TILES_DIR, ROAD_RASTER_RES_M)
 
     for c in ["dist_motorway_km", "dist_trunk_km", "dist_primary_km"]:
         base_grid_df[c] = base_grid_df[c].astype("float32").fillna(np.float32(999.0))
@@ -519,7 +388,7 @@ def main() -> None:
         "project": PROJECT_NAME,
         "creation_date": creation_date,
         "osm_bbox": f"{LAT_MIN},{LAT_MAX},{LON_MIN},{LON_MAX}",
-        "osm_cache_edges": str(ROADS_EDGES_PARQUET),
+        "osm_cache_edges": f"{ROAD_TILES_DIR} ({len(road_tile_keys)} tiles of {ROAD_TILE_DEG} deg)",
     }
 
     encoding = {
@@ -0,0 +1,266 @@
+import hashlib
+import json
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+from scipy.ndimage import distance_transform_edt
+from shapely import STRtree
+
+
+# ============================================================
+# ROAD DISTANCE ENGINE
+# ============================================================
+# Distance from points to the nearest motorway / trunk / primary road, in km (EPSG:5070).
+# Each road class is split into straight projected segments held in an STRtree, and all
+# points are answered by one bulk nearest-segment query per class, instead of measuring
+# every point against a unary_union of the whole network.
+# The roads come from one or more OSM edges parquets (road_tiles.py tiles); the projected
+# segments are saved next to each parquet and rebuilt only when that parquet changes.
+#
+# Raster mode (raster_res_m): each class is burned into a raster_res_m grid over the
+# roads' extent and a Euclidean distance transform gives every cell centre's distance
+# to the nearest road cell. The distance rasters are saved as .npy (memory-mapped on
+# later runs) and points are looked up by bilinear interpolation, so the cost no longer
+# grows with the number of points or the grid step. Raster distances are within
+# RASTER_MAX_ERROR_CELLS x raster_res_m of the exact ones: road cells are up to
+# (1/2 + 1/sqrt(2)) cells from the road they stand for, and the bilinear lookup of a
+# distance field adds at most 1/sqrt(2) cell. Points outside the raster use the STRtree.
+
+ROAD_CLASSES = {
+    "motorway": "is_motorway",
+    "trunk": "is_trunk",
+    "primary": "is_primary",
+}
+
+PROJECTED_CRS = "EPSG:5070"
+
+RASTER_MAX_ERROR_CELLS = 0.5 + 2 ** 0.5        # see above: 1/2 + 1/sqrt(2) + 1/sqrt(2)
+RASTER_MARGIN_M = 2_000.0                       # raster extent = roads' extent + this
+RASTER_CHUNK_SEGMENTS = 200_000                 # segments burned per pass (bounds memory)
+
+
+def road_segments(lines: np.ndarray) -> np.ndarray:
+    """(n, 4) x0, y0, x1, y1 of every straight segment of (multi)line geometries."""
+    parts = shapely.get_parts(lines)
+    coords, part_idx = shapely.get_coordinates(parts, return_index=True)
+    same_part = part_idx[1:] == part_idx[:-1]
+    return np.concatenate([coords[:-1][same_part], coords[1:][same_part]], axis=1)
+
+
+def _stamp(path: Path) -> dict:
+    st = path.stat()
+    return {"source": str(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def segments_path(edges_parquet: Path) -> Path:
+    return edges_parquet.with_name(f"{edges_parquet.stem}_segments_5070.npz")
+
+
+def load_or_build_road_segments(edges_parquet: Path, load_edges: Callable) -> dict[str, np.ndarray]:
+    """
+    {class: (n, 4) projected segments}, read from the cache next to edges_parquet,
+    or built from load_edges() (e.g. road_tiles.read_tile_edges) and saved.
+    """
+    path = segments_path(edges_parquet)
+    if path.exists() and edges_parquet.exists():
+        with np.load(path) as f:
+            if json.loads(str(f["meta"])) == _stamp(edges_parquet):
+                print(f"Loading cached road segments: {path}")
+                return {name: f[name] for name in ROAD_CLASSES}
+
+    edges = load_edges()
+    edges_m = edges.to_crs(PROJECTED_CRS)
+    segments = {
+        name: road_segments(edges_m.geometry.values[edges_m[col].to_numpy(dtype=bool)])
+        for name, col in ROAD_CLASSES.items()
+    }
+
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, meta=json.dumps(_stamp(edges_parquet)), **segments)
+    tmp.replace(path)
+    print(f"Saved road segments ({', '.join(f'{n}: {len(s):,}' for n, s in segments.items())}): {path}")
+    return segments
+
+
+def build_road_index(segments: dict[str, np.ndarray]) -> dict[str, STRtree | None]:
+    """One STRtree of segment linestrings per road class (None for a class with no roads)."""
+    index = {}
+    for name, seg in segments.items():
+        if len(seg) == 0:
+            index[name] = None
+            continue
+        index[name] = STRtree(shapely.linestrings(seg.reshape(-1, 2, 2)))
+    return index
+
+
+def rasterize_segments(seg: np.ndarray, x_min: float, y_min: float, res_m: float, shape: tuple) -> np.ndarray:
+    """
+    bool (ny, nx) raster, True in cells crossed by any segment (row i covers
+    y_min + [i, i + 1) * res_m). Segments are sampled every res_m / 2.
+    """
+    mask = np.zeros(shape, dtype=bool)
+    for k in range(0, len(seg), RASTER_CHUNK_SEGMENTS):
+        s = seg[k:k + RASTER_CHUNK_SEGMENTS]
+        length = np.hypot(s[:, 2] - s[:, 0], s[:, 3] - s[:, 1])
+        n = np.ceil(length / (res_m / 2)).astype(np.int64) + 1
+        seg_id = np.repeat(np.arange(len(s)), n)
+        step = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        t = step / np.maximum(n - 1, 1)[seg_id]
+        x = s[seg_id, 0] + t * (s[seg_id, 2] - s[seg_id, 0])
+        y = s[seg_id, 1] + t * (s[seg_id, 3] - s[seg_id, 1])
+        i = np.clip(((y - y_min) / res_m).astype(np.int64), 0, shape[0] - 1)
+        j = np.clip(((x - x_min) / res_m).astype(np.int64), 0, shape[1] - 1)
+        mask[i, j] = True
+    return mask
+
+
+def load_or_build_road_rasters(
+    edges_parquets: list[Path], segments: dict[str, np.ndarray], res_m: float, raster_root: Path
+) -> dict:
+    """
+    {"meta": {...}, <class>: float32 km distance raster (memory-mapped) or None if the
+    class has no roads}, cached under raster_root in a folder keyed by the edges
+    parquets (names, sizes, mtimes) and res_m.
+    """
+    source = {"edges": [_stamp(p) for p in sorted(edges_parquets)], "res_m": res_m}
+    key = hashlib.sha1(json.dumps(source, sort_keys=True).encode()).hexdigest()[:16]
+    out_dir = raster_root / f"dist_raster_{res_m:g}m_{key}"
+
+    if (out_dir / "meta.json").exists():
+        with open(out_dir / "meta.json") as f:
+            meta = json.load(f)
+        if meta["source"] == source:
+            print(f"Memory-mapping road distance rasters: {out_dir}")
+            rasters = {"meta": meta}
+            for name in ROAD_CLASSES:
+                path = out_dir / f"dist_{name}_km.npy"
+                rasters[name] = np.load(path, mmap_mode="r") if path.exists() else None
+            return rasters
+
+    all_seg = np.concatenate([seg for seg in segments.values()])
+    if len(all_seg) == 0:
+        raise ValueError(f"no road segments in {len(edges_parquets)} edges parquet(s)")
+    x_min = min(all_seg[:, 0].min(), all_seg[:, 2].min()) - RASTER_MARGIN_M
+    x_max = max(all_seg[:, 0].max(), all_seg[:, 2].max()) + RASTER_MARGIN_M
+    y_min = min(all_seg[:, 1].min(), all_seg[:, 3].min()) - RASTER_MARGIN_M
+    y_max = max(all_seg[:, 1].max(), all_seg[:, 3].max()) + RASTER_MARGIN_M
+    shape = (int(np.ceil((y_max - y_min) / res_m)), int(np.ceil((x_max - x_min) / res_m)))
+    print(f"Road distance rasters: {shape[0]} x {shape[1]} cells of {res_m:g} m")
+
+    # meta.json is written last and marks a complete set
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "meta.json").unlink(missing_ok=True)
+    rasters = {}
+    for name, seg in segments.items():
+        path = out_dir / f"dist_{name}_km.npy"
+        path.unlink(missing_ok=True)
+        if len(seg) == 0:
+            rasters[name] = None
+            continue
+        road = rasterize_segments(seg, x_min, y_min, res_m, shape)
+        dist = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+        dist[:] = distance_transform_edt(~road, sampling=res_m) / 1000.0
+        dist.flush()
+        del dist, road
+        rasters[name] = np.load(path, mmap_mode="r")
+
+    meta = {
+        "source": source, "crs": PROJECTED_CRS, "x_min": x_min, "y_min": y_min,
+        "res_m": res_m, "shape": list(shape),
+        "max_error_km": RASTER_MAX_ERROR_CELLS * res_m / 1000.0,
+    }
+    with open(out_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"Saved road distance rasters (max error {meta['max_error_km']:.3f} km): {out_dir}")
+    rasters["meta"] = meta
+    return rasters
+
+
+def raster_lookup_km(raster: np.ndarray, meta: dict, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Bilinear lookup between cell centres of a distance raster; NaN outside its extent."""
+    ny, nx = raster.shape
+    res = meta["res_m"]
+    fy = (y - meta["y_min"]) / res - 0.5
+    fx = (x - meta["x_min"]) / res - 0.5
+    inside = (fy >= -0.5) & (fy <= ny - 0.5) & (fx >= -0.5) & (fx <= nx - 0.5)
+
+    i0 = np.clip(np.floor(fy).astype(np.int64), 0, ny - 2)
+    j0 = np.clip(np.floor(fx).astype(np.int64), 0, nx - 2)
+    wy = np.clip(fy - i0, 0.0, 1.0)
+    wx = np.clip(fx - j0, 0.0, 1.0)
+    i0, j0 = i0[inside], j0[inside]
+    wy, wx = wy[inside], wx[inside]
+    v = ((1 - wy) * (1 - wx) * raster[i0, j0] + (1 - wy) * wx * raster[i0, j0 + 1]
+         + wy * (1 - wx) * raster[i0 + 1, j0] + wy * wx * raster[i0 + 1, j0 + 1])
+
+    out = np.full(x.shape, np.nan)
+    out[inside] = v
+    return out
+
+
+def load_road_engine(
+    edges_parquets: list[Path],
+    load_edges: Callable,
+    raster_res_m: float | None = None,
+    raster_root: Path | None = None,
+) -> dict:
+    """
+    {"index": per-class STRtrees, "rasters": distance rasters or None} over the roads of
+    all edges parquets: exact distances with raster_res_m=None, raster lookups (exact
+    outside the rasters) otherwise. Roads repeated in two parquets only repeat segments.
+    """
+    per_file = [load_or_build_road_segments(p, partial(load_edges, p)) for p in edges_parquets]
+    segments = {
+        name: np.concatenate([seg[name] for seg in per_file]) if per_file else np.zeros((0, 4))
+        for name in ROAD_CLASSES
+    }
+    rasters = None
+    # no roads at all (e.g. open water): nothing to rasterize, every distance is NaN
+    if raster_res_m is not None and any(len(seg) for seg in segments.values()):
+        root = raster_root if raster_root is not None else edges_parquets[0].parent
+        rasters = load_or_build_road_rasters(edges_parquets, segments, raster_res_m, root)
+    return {"index": build_road_index(segments), "rasters": rasters}
+
+
+def road_distances_km(engine: dict, lat: np.ndarray, lon: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    {class: float32 km} from each (lat, lon) point to the nearest road of the class;
+    NaN for a class with no roads (as dist_to_union_km with no union geometry).
+    """
+    transformer = Transformer.from_crs("EPSG:4326", PROJECTED_CRS, always_xy=True)
+    x, y = transformer.transform(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+    x, y = np.asarray(x), np.asarray(y)
+    rasters = engine["rasters"]
+
+    out = {}
+    for name, tree in engine["index"].items():
+        d_km = np.full(x.shape, np.nan, dtype=np.float64)
+        if tree is None:
+            out[name] = d_km.astype("float32")
+            continue
+        exact = np.ones(x.shape, dtype=bool)
+        if rasters is not None:
+            d_km = raster_lookup_km(rasters[name], rasters["meta"], x, y)
+            exact = np.isnan(d_km)
+        if exact.any():
+            points = shapely.points(x[exact], y[exact])
+            (point_idx, _), dist_m = tree.query_nearest(points, return_distance=True, all_matches=False)
+            d_exact = np.full(len(points), np.nan)
+            d_exact[point_idx] = dist_m / 1000.0
+            d_km[exact] = d_exact
+        out[name] = d_km.astype("float32")
+    return out
+
+
+def add_road_distance_features(df: pd.DataFrame, engine: dict) -> pd.DataFrame:
+    """df with dist_<class>_km columns for its Latitude / Longitude."""
+    out = df.copy()
+    dists = road_distances_km(engine, df["Latitude"].to_numpy(), df["Longitude"].to_numpy())
+    for name, d_km in dists.items():
+        out[f"dist_{name}_km"] = d_km
+    return out
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+import geopandas as gpd
+import osmnx as ox
+
+from road_distance import ROAD_CLASSES, load_road_engine, road_distances_km
+
+
+# ============================================================
+# TILED OSM ROAD CACHE
+# ============================================================
+# Motorway / trunk / primary OSM roads cached in fixed tile_deg x tile_deg lat/lon tiles
+# (tile "<i>_<j>": i = floor(lat / tile_deg), j = floor(lon / tile_deg), as monthly_lake.py),
+# so every run - whatever its bbox - reads the same tile files and downloads only the
+# tiles no earlier run fetched. tile_index.json records each tile's bounds, edge count and
+# fetch time; a tile with no roads is kept as an empty parquet so it is not fetched again.
+#
+# Every point's distances (training sites and prediction grid alike) come from the roads of
+# its own tile and the ring of tiles around it (>= tile_deg of road network on every side):
+# one rule, so they do not depend on the run's bbox and a location gets the same features
+# at train and predict time (NaN where a class has no road in the neighbourhood).
+# Only sites in the tiles of the run's bbox get road features (the other sites get NaN, i.e.
+# "no road within reach", without their tiles being fetched), so a run downloads the same
+# tiles for its sites as for its grid: the bbox tiles plus one ring.
+# Site road features are cached per site (key "<lat>_<lon>" at 1e-5 deg) and raster_res_m
+# in one parquet; a site row is recomputed when one of its tiles is re-fetched.
+# Raster mode builds one raster set per tile neighbourhood (3 x 3 tiles), so a tile's roads
+# are rasterized once for each neighbourhood it belongs to (up to 9 times).
+
+ROAD_TILE_DEG = 0.5
+TILE_INDEX_NAME = "tile_index.json"
+SITE_FEATURES_NAME = "site_road_features.parquet"
+NEIGHBOUR_RING = 1
+
+ROAD_KINDS = {
+    "is_motorway": ["motorway", "motorway_link"],
+    "is_trunk": ["trunk", "trunk_link"],
+    "is_primary": ["primary", "primary_link"],
+}
+
+# the road classes above, with the exclusions of osmnx's "drive" network
+HIGHWAY_FILTER = (
+    '["highway"~"^(motorway|trunk|primary)(_link)?$"]'
+    '["area"!~"yes"]["access"!~"private"]'
+    '["motor_vehicle"!~"no"]["motorcar"!~"no"]["service"!~"private"]'
+)
+
+
+def tile_keys(lat, lon, tile_deg: float) -> np.ndarray:
+    """Tile key "<i>_<j>" of each point."""
+    i = np.floor(np.asarray(lat, dtype=float) / tile_deg).astype(np.int64)
+    j = np.floor(np.asarray(lon, dtype=float) / tile_deg).astype(np.int64)
+    return np.char.add(np.char.add(i.astype(str), "_"), j.astype(str))
+
+
+def tile_bounds(key: str, tile_deg: float) -> tuple[float, float, float, float]:
+    """(lat_min, lat_max, lon_min, lon_max) of a tile."""
+    i, j = (int(v) for v in key.split("_"))
+    return i * tile_deg, (i + 1) * tile_deg, j * tile_deg, (j + 1) * tile_deg
+
+
+def bbox_tiles(bbox: tuple[float, float, float, float], tile_deg: float) -> list[str]:
+    """Tile keys overlapping (lat_min, lat_max, lon_min, lon_max) (see monthly_lake.bbox_tiles)."""
+    lat_min, lat_max, lon_min, lon_max = bbox
+    i = range(int(np.floor(lat_min / tile_deg)), int(np.floor(lat_max / tile_deg)) + 1)
+    j = range(int(np.floor(lon_min / tile_deg)), int(np.floor(lon_max / tile_deg)) + 1)
+    return [f"{a}_{b}" for a in i for b in j]
+
+
+def neighbour_tiles(key: str, ring: int = NEIGHBOUR_RING) -> list[str]:
+    """The tile and the `ring` tiles around it."""
+    i, j = (int(v) for v in key.split("_"))
+    return [f"{a}_{b}" for a in range(i - ring, i + ring + 1) for b in range(j - ring, j + ring + 1)]
+
+
+def tile_path(tiles_dir: Path, key: str) -> Path:
+    return tiles_dir / f"roads_{key}.parquet"
+
+
+def load_tile_index(tiles_dir: Path, tile_deg: float) -> dict:
+    """{"tile_deg": ..., "tiles": {key: {...}}}; a new, empty index if there is none yet."""
+    path = tiles_dir / TILE_INDEX_NAME
+    if not path.exists():
+        return {"tile_deg": tile_deg, "tiles": {}}
+    with open(path) as f:
+        index = json.load(f)
+    if index["tile_deg"] != tile_deg:
+        raise ValueError(f"{tiles_dir} is tiled with tile_deg={index['tile_deg']}, not {tile_deg}")
+    return index
+
+
+def save_tile_index(tiles_dir: Path, index: dict) -> None:
+    tmp = tiles_dir / f"{TILE_INDEX_NAME}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, tiles_dir / TILE_INDEX_NAME)
+
+
+def has_kind(v, allowed: list[str]) -> bool:
+    """
+    OSM 'highway' can be a string or a list.
+    """
+    if isinstance(v, list):
+        return any(str(x) in allowed for x in v)
+    if pd.isna(v):
+        return False
+    return str(v) in allowed
+
+
+def download_tile(key: str, tile_deg: float) -> gpd.GeoDataFrame:
+    """
+    Motorway / trunk / primary OSM edges of one tile, as boolean road-type columns +
+    geometry (EPSG:4326). Edges crossing the tile border are kept whole.
+    """
+    lat_min, lat_max, lon_min, lon_max = tile_bounds(key, tile_deg)
+    try:
+        # retain_all: a tile's major roads are often not one connected piece
+        G = ox.graph_from_polygon(
+            box(lon_min, lat_min, lon_max, lat_max),
+            custom_filter=HIGHWAY_FILTER, retain_all=True, truncate_by_edge=True,
+        )
+    except ox._errors.InsufficientResponseError:
+        G = None   # no such roads in the tile
+
+    columns = list(ROAD_KINDS) + ["geometry"]
+    if G is None or G.number_of_edges() == 0:
+        return gpd.GeoDataFrame(
+            {c: pd.Series(dtype=bool) for c in ROAD_KINDS}, geometry=gpd.GeoSeries([]), crs="EPSG:4326"
+        )[columns]
+
+    edges = ox.graph_to_gdfs(G, nodes=False, edges=True)
+    edges = edges[["highway", "geometry"]].copy()
+    edges = edges.set_crs("EPSG:4326")
+    for col, kinds in ROAD_KINDS.items():
+        edges[col] = edges["highway"].apply(lambda v, kinds=kinds: has_kind(v, kinds))
+    return edges[columns].reset_index(drop=True)
+
+
+def ensure_tiles(tiles_dir: Path, keys: list[str], tile_deg: float = ROAD_TILE_DEG) -> list[Path]:
+    """Parquet paths of the tiles, downloading the ones not in the cache yet (index saved per tile)."""
+    tiles_dir.mkdir(parents=True, exist_ok=True)
+    index = load_tile_index(tiles_dir, tile_deg)
+    keys = list(dict.fromkeys(keys))
+    missing = [k for k in keys if k not in index["tiles"] or not tile_path(tiles_dir, k).exists()]
+    print(f"OSM road tiles: {len(keys) - len(missing)}/{len(keys)} cached, {len(missing)} to download")
+
+    if missing:
+        ox.settings.use_cache = True
+        ox.settings.cache_folder = str(tiles_dir / "overpass")
+        ox.settings.log_console = False
+
+    for n, key in enumerate(missing, 1):
+        edges = download_tile(key, tile_deg)
+        path = tile_path(tiles_dir, key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        edges.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        index["tiles"][key] = {
+            "bbox": list(tile_bounds(key, tile_deg)),
+            "n_edges": int(len(edges)),
+            "fetched": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        save_tile_index(tiles_dir, index)
+        print(f"  [{n}/{len(missing)}] tile {key}: {len(edges):,} edges")
+
+    return [tile_path(tiles_dir, k) for k in keys]
+
+
+def read_tile_edges(path: Path) -> gpd.GeoDataFrame:
+    """One cached tile (road_distance.load_road_engine's load_edges)."""
+    edges = gpd.read_parquet(path)
+    if edges.crs is None:
+        edges = edges.set_crs("EPSG:4326")
+    return edges
+
+
+def neighbourhood_road_distances(
+    points: pd.DataFrame,
+    tiles_dir: Path,
+    raster_res_m: float | None = None,
+    tile_deg: float = ROAD_TILE_DEG,
+) -> tuple[pd.DataFrame, list[str]]:
+    """
+    points (Latitude / Longitude) with dist_<class>_km columns, each point measured to the
+    roads of its own tile neighbourhood (tiles downloaded as needed), and the tile keys used.
+    raster_res_m: as road_distance.load_road_engine, one raster set per neighbourhood,
+    cached under tiles_dir / "rasters".
+    """
+    tiles, inverse = np.unique(tile_keys(points["Latitude"], points["Longitude"], tile_deg),
+                               return_inverse=True)
+    needed = sorted({k for t in tiles for k in neighbour_tiles(t)})
+    ensure_tiles(tiles_dir, needed, tile_deg)
+
+    lat = points["Latitude"].to_numpy(dtype=float)
+    lon = points["Longitude"].to_numpy(dtype=float)
+    dists = {name: np.full(len(points), np.nan, dtype=np.float32) for name in ROAD_CLASSES}
+    for n, tile in enumerate(tiles):
+        idx = np.flatnonzero(inverse == n)
+        paths = [tile_path(tiles_dir, k) for k in neighbour_tiles(tile)]
+        engine = load_road_engine(paths, read_tile_edges, raster_res_m, raster_root=tiles_dir / "rasters")
+        for name, d_km in road_distances_km(engine, lat[idx], lon[idx]).items():
+            dists[name][idx] = d_km
+
+    out = points.copy()
+    for name, d_km in dists.items():
+        out[f"dist_{name}_km"] = d_km
+    return out, needed
+
+
+def site_keys(lat, lon) -> np.ndarray:
+    """Site cache key "<lat>_<lon>" (1e-5 deg, ~1 m)."""
+    lat = np.round(np.asarray(lat, dtype=float), 5)
+    lon = np.round(np.asarray(lon, dtype=float), 5)
+    return np.array([f"{a:.5f}_{b:.5f}" for a, b in zip(lat, lon)], dtype=object)
+
+
+def _neighbourhood_stamp(index: dict, key: str) -> str:
+    """Digest of the fetch times of a tile's neighbourhood (changes when one is re-fetched)."""
+    fetched = [index["tiles"][k]["fetched"] for k in neighbour_tiles(key)]
+    return hashlib.sha1(json.dumps(fetched).encode()).hexdigest()[:16]
+
+
+def site_road_features(
+    sites: pd.DataFrame,
+    tiles_dir: Path,
+    bbox: tuple[float, float, float, float],
+    raster_res_m: float | None = None,
+    tile_deg: float = ROAD_TILE_DEG,
+) -> pd.DataFrame:
+    """
+    sites (Latitude / Longitude) with dist_<class>_km columns, measured like the grid
+    (neighbourhood_road_distances with the same raster_res_m) for the sites in the tiles of
+    bbox and NaN for the others. Read from the per-site cache in tiles_dir; missing sites
+    are computed and added to the cache.
+    """
+    dist_cols = [f"dist_{name}_km" for name in ROAD_CLASSES]
+    cache_cols = ["site_key", "tile_deg", "raster_res_m", "tiles_stamp"] + dist_cols
+    cache_path = tiles_dir / SITE_FEATURES_NAME
+    res_key = 0.0 if raster_res_m is None else float(raster_res_m)   # 0 -> exact
+
+    out = sites[["Latitude", "Longitude"]].copy()
+    out["site_key"] = site_keys(out["Latitude"], out["Longitude"])
+    out["tile"] = tile_keys(out["Latitude"], out["Longitude"], tile_deg)
+    in_area = out["tile"].isin(bbox_tiles(bbox, tile_deg)).to_numpy()
+
+    area_tiles = out.loc[in_area, "tile"].unique()
+    needed = sorted({k for t in area_tiles for k in neighbour_tiles(t)})
+    ensure_tiles(tiles_dir, needed, tile_deg)
+    index = load_tile_index(tiles_dir, tile_deg)
+    stamps = {t: _neighbourhood_stamp(index, t) for t in area_tiles}
+    out["tiles_stamp"] = out["tile"].map(stamps)
+
+    cache = pd.DataFrame(columns=cache_cols)
+    if cache_path.exists():
+        cache = pd.read_parquet(cache_path)
+        if "raster_res_m" not in cache:
+            cache.insert(2, "raster_res_m", 0.0)   # rows cached before raster mode covered sites
+    same_rule = (cache["tile_deg"] == tile_deg) & (cache["raster_res_m"] == res_key)
+    valid = cache[same_rule].drop_duplicates("site_key", keep="last")
+
+    sites_u = out[in_area].drop_duplicates("site_key")
+    known = sites_u.merge(valid[["site_key", "tiles_stamp"]], on=["site_key", "tiles_stamp"], how="inner")
+    todo = sites_u[~sites_u["site_key"].isin(known["site_key"])]
+    print(f"Site road features: {len(sites_u) - len(todo):,} cached, {len(todo):,} to compute, "
+          f"{out.loc[~in_area, 'site_key'].nunique():,} outside the bbox tiles (NaN)")
+
+    if len(todo):
+        new, _ = neighbourhood_road_distances(todo, tiles_dir, raster_res_m, tile_deg)
+        new["tile_deg"] = tile_deg
+        new["raster_res_m"] = res_key
+        new = new[cache_cols]
+        stale = same_rule & cache["site_key"].isin(new["site_key"])
+        cache = cache[~stale]
+        cache = pd.concat([cache, new], ignore_index=True) if len(cache) else new
+        tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        cache.to_parquet(tmp, index=False)
+        os.replace(tmp, cache_path)
+        print(f"Saved site road features ({len(cache):,} rows): {cache_path}")
+        valid = cache[(cache["tile_deg"] == tile_deg) & (cache["raster_res_m"] == res_key)]
+
+    feats = out[["site_key"]].join(valid.set_index("site_key")[dist_cols], on="site_key")
+    for c in dist_cols:
+        out[c] = feats[c].where(in_area).astype("float32")
+    return out.drop(columns=["site_key", "tile", "tiles_stamp"])
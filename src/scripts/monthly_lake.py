@@ -0,0 +1,178 @@
+# hive-partitioned "lake" layout for the monthly PM2.5 / AOD tables
+#   <lake_root>/<name>/year=YYYY/month=M/[tile=<i>_<j>/]part-0.parquet   (+ <name>/_lake.json)
+# 1. write_month(): replaces one month's partition (write to a temp folder, then rename),
+#    so adding or rebuilding a month never touches the other months
+# 2. repartition_file(): one-off conversion of a monolithic monthly parquet, a year at a time
+# 3. pm25_monthly / aod_monthly call write_month for the months they rebuilt (LAKE_ROOT setting)
+#
+# year / month live in the folder names only (hive partition keys), with the partition
+# types from _lake.json. The optional spatial tile (tile_deg° cells of lat/lon) lets a
+# bbox read open only the tiles it overlaps.
+# Readers: ml_model/models/monthly_data.py (read_pm_monthly / read_aod_monthly on the folder).
+
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+
+LAKE_INFO_NAME = "_lake.json"
+
+# table name -> lat / lon column names (the month comes from "year"/"month" or "time")
+LAKE_TABLES = {
+    "pm25_monthly": {"lat": "Latitude", "lon": "Longitude"},
+    "aod_monthly": {"lat": "lat", "lon": "lon"},
+}
+
+PARTITION_TYPES = {"year": "int16", "month": "int8", "tile": "string"}
+
+
+def partition_schema(tile_deg):
+    names = ["year", "month"] + (["tile"] if tile_deg else [])
+    return pa.schema([(n, pa.type_for_alias(PARTITION_TYPES[n])) for n in names])
+
+
+def tile_keys(lat, lon, tile_deg):
+    """Tile key "<i>_<j>" of each point: i = floor(lat / tile_deg), j = floor(lon / tile_deg)."""
+    i = np.floor(np.asarray(lat) / tile_deg).astype(np.int64)
+    j = np.floor(np.asarray(lon) / tile_deg).astype(np.int64)
+    return np.char.add(np.char.add(i.astype(str), "_"), j.astype(str))
+
+
+def bbox_tiles(bbox, tile_deg):
+    """Tile keys overlapping (lat_min, lat_max, lon_min, lon_max)."""
+    lat_min, lat_max, lon_min, lon_max = bbox
+    i = np.arange(np.floor(lat_min / tile_deg), np.floor(lat_max / tile_deg) + 1).astype(np.int64)
+    j = np.arange(np.floor(lon_min / tile_deg), np.floor(lon_max / tile_deg) + 1).astype(np.int64)
+    return [f"{a}_{b}" for a in i for b in j]
+
+
+def lake_info(table_root):
+    path = os.path.join(table_root, LAKE_INFO_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _init_lake(table_root, name, tile_deg):
+    info = lake_info(table_root)
+    if info is not None:
+        if info["tile_deg"] != tile_deg:
+            raise ValueError(f"{table_root} is tiled with tile_deg={info['tile_deg']}, not {tile_deg}")
+        return
+    os.makedirs(table_root, exist_ok=True)
+    tmp = os.path.join(table_root, f"{LAKE_INFO_NAME}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"table": name, "tile_deg": tile_deg, "partitioning": "hive",
+                   "partition_types": {f.name: str(f.type) for f in partition_schema(tile_deg)}},
+                  f, indent=2)
+    os.replace(tmp, os.path.join(table_root, LAKE_INFO_NAME))
+
+
+def month_dir(table_root, year, month):
+    return os.path.join(table_root, f"year={year}", f"month={month}")
+
+
+def write_month(lake_root, name, table, year, month, tile_deg=None):
+    """
+    Replace the (year, month) partition of lake table `name` with `table` (pyarrow Table
+    of that month's rows). Only this month's folder is written. Returns the row count.
+    """
+    table_root = os.path.join(lake_root, name)
+    _init_lake(table_root, name, tile_deg)
+    table = table.drop_columns([c for c in ("year", "month") if c in table.column_names])
+
+    final = month_dir(table_root, year, month)
+    # "."-prefixed folders are ignored by dataset readers until renamed into place
+    tmp = os.path.join(os.path.dirname(final), f".month={month}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    if tile_deg:
+        cols = LAKE_TABLES[name]
+        keys = tile_keys(table[cols["lat"]].to_numpy(), table[cols["lon"]].to_numpy(), tile_deg)
+        for key in np.unique(keys):
+            os.makedirs(os.path.join(tmp, f"tile={key}"))
+            pq.write_table(table.filter(pa.array(keys == key)),
+                           os.path.join(tmp, f"tile={key}", "part-0.parquet"))
+    else:
+        pq.write_table(table, os.path.join(tmp, "part-0.parquet"))
+
+    # swap: old partition out, new one in (readers see either the old or the new month)
+    old = None
+    if os.path.exists(final):
+        old = os.path.join(os.path.dirname(final), f".month={month}.{os.getpid()}.old")
+        os.replace(final, old)
+    os.replace(tmp, final)
+    if old is not None:
+        shutil.rmtree(old)
+    return table.num_rows
+
+
+def split_months(table):
+    """[(year, month, rows)] of a monthly table with year/month columns or a time column."""
+    if "year" in table.column_names:
+        year = table["year"].to_numpy().astype(np.int64)
+        month = table["month"].to_numpy().astype(np.int64)
+    else:
+        t = table["time"].to_numpy().astype("datetime64[M]").astype(np.int64)
+        year, month = 1970 + t // 12, t % 12 + 1
+    key = year * 100 + month
+    out = []
+    for k in np.unique(key):
+        out.append((int(k // 100), int(k % 100), table.filter(pa.array(key == k))))
+    return out
+
+
+def write_months(lake_root, name, table, tile_deg=None):
+    """Write every month present in table (replacing those partitions); returns [(year, month)]."""
+    written = []
+    for year, month, rows in split_months(table):
+        write_month(lake_root, name, rows, year, month, tile_deg)
+        written.append((year, month))
+    return written
+
+
+def repartition_file(src_path, lake_root, name, tile_deg=None):
+    """Convert one monolithic monthly parquet into the lake, one year in memory at a time."""
+    dataset = pads.dataset(src_path, format="parquet")
+    if "year" in dataset.schema.names:
+        years = pc.unique(dataset.to_table(columns=["year"])["year"]).to_pylist()
+        year_filter = lambda y: pads.field("year") == y
+    else:
+        t = dataset.to_table(columns=["time"])["time"].to_numpy().astype("datetime64[Y]")
+        years = sorted(set((t.astype(np.int64) + 1970).tolist()))
+        unit = dataset.schema.field("time").type
+        year_filter = lambda y: (
+            (pads.field("time") >= pa.scalar(datetime(y, 1, 1), type=unit)) &
+            (pads.field("time") < pa.scalar(datetime(y + 1, 1, 1), type=unit))
+        )
+
+    n_months = 0
+    for year in sorted(years):
+        n_months += len(write_months(lake_root, name, dataset.to_table(filter=year_filter(year)), tile_deg))
+    return n_months
+
+
+def main():
+    # ***change these as needed
+    lake_root = "/home/ellab/air_pollution/src/data/monthly_lake"
+    SOURCES = {
+        "pm25_monthly": "/home/ellab/air_pollution/src/data/pm/pm25_monthly_2005_2024.parquet",
+        "aod_monthly": "/home/ellab/air_pollution/src/data/aod/aod_monthly_2005_2024.parquet",
+    }
+    TILE_DEG = {"pm25_monthly": None, "aod_monthly": 5.0}   # None -> year/month partitions only
+
+    for name, src in SOURCES.items():
+        n = repartition_file(src, lake_root, name, TILE_DEG[name])
+        print(f"{name}: {n} month partition(s) -> {os.path.join(lake_root, name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# packed-int16 (scale_factor / add_offset / _FillValue) NetCDF encoding for cleaned products
+# 1. extractors tag each variable with the packing of the SDS/dataset it came from
+#    (source_dtype, source_scale_factor, source_add_offset, source_fill_value attrs)
+# 2. packed_encoding(ds) turns those tags into a to_netcdf encoding:
+#    - integer sources (MAIAC AOD int16): written back as int16 with the source scale/offset/fill
+#    - float sources (OMI columns): kept as float32 (packing them to int16 would be lossy)
+#
+# Values that are exact source quanta (raw * scale + offset) round-trip exactly. Derived
+# values such as the compact-mean AOD are rounded to the nearest source quantum
+# (e.g. 0.001 AOD), i.e. stored at the precision the source itself has.
+
+import numpy as np
+
+SOURCE_ATTRS = ("source_dtype", "source_scale_factor", "source_add_offset", "source_fill_value")
+
+
+def source_packing_attrs(dtype, scale_factor=None, add_offset=None, fill_value=None):
+    """Attributes recording how a variable was packed in its source file."""
+    attrs = {"source_dtype": np.dtype(dtype).name}
+    if scale_factor is not None:
+        attrs["source_scale_factor"] = float(np.ravel(scale_factor)[0])
+    if add_offset is not None:
+        attrs["source_add_offset"] = float(np.ravel(add_offset)[0])
+    if fill_value is not None:
+        attrs["source_fill_value"] = float(np.ravel(fill_value)[0])
+    return attrs
+
+
+def is_packable(attrs):
+    """True if the variable came from an int16 (or narrower integer) source with a scale factor."""
+    dtype = attrs.get("source_dtype")
+    if dtype is None or "source_scale_factor" not in attrs:
+        return False
+    dtype = np.dtype(dtype)
+    return np.issubdtype(dtype, np.integer) and dtype.itemsize <= 2
+
+
+def variable_encoding(attrs, packed=True, complevel=4):
+    """to_netcdf encoding for one variable (see module header)."""
+    enc = {"zlib": True, "complevel": complevel}
+    if packed and is_packable(attrs):
+        enc.update({
+            "dtype": "int16",
+            "scale_factor": np.float32(attrs["source_scale_factor"]),
+            "add_offset": np.float32(attrs.get("source_add_offset", 0.0)),
+            "_FillValue": np.int16(attrs.get("source_fill_value", np.iinfo(np.int16).min)),
+        })
+    elif "source_dtype" in attrs and np.issubdtype(np.dtype(attrs["source_dtype"]), np.floating):
+        enc["dtype"] = "float32"
+    return enc
+
+
+def packed_encoding(ds, packed=True, complevel=4):
+    """Encoding dict for every data variable of ds (float data vars without tags stay as they are)."""
+    encoding = {}
+    for name, var in ds.data_vars.items():
+        if np.issubdtype(var.dtype, np.floating):
+            encoding[name] = variable_encoding(var.attrs, packed=packed, complevel=complevel)
+        else:
+            encoding[name] = {"zlib": True, "complevel": complevel}
+    return encoding
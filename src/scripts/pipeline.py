@@ -0,0 +1,167 @@
+# prefetching read -> decode -> write pipeline for the cleaning loops
+# 1. I/O threads read the raw bytes of the next n_prefetch input files ahead of the decoder
+# 2. the calling thread decodes one file at a time (from the prefetched bytes)
+# 3. a writer thread writes outputs (and runs on_record, e.g. manifest updates) in input order
+#
+# Stages are connected by bounded queues, so at most n_prefetch raw files and
+# write_queue_size decoded outputs are held in memory at once.
+#
+# Sizing (from the "pipeline" counters of the report):
+#   decode_wait_fetch_s high, prefetch_ready_mean ~0 -> I/O bound: raise n_prefetch / n_io_threads
+#   decode_wait_write_s high, write_queue_max full   -> writer bound (output disk)
+#   both ~0                                           -> decode bound: use the process pool instead
+
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+def fetch_bytes(path):
+    """Whole file in one sequential read (network disks: one long read beats many small ones)."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _failed(task, error):
+    return {"input": task["input"], "output": task.get("output"), "status": "failed",
+            "error": error, "seconds": 0.0, "result": {}}
+
+
+def run_pipeline(tasks, decode_fn, write_fn, fetch_fn=fetch_bytes, n_prefetch=4, n_io_threads=2,
+                 write_queue_size=4, on_record=None):
+    """
+    Run fetch -> decode -> write for every task; returns a report like batch_driver.run_batch
+    (same keys, records in sorted input order) plus a "pipeline" dict of counters.
+
+    fetch_fn(path)            -> payload (default: the file's bytes), run on I/O threads
+    decode_fn(task, payload)  -> item, run on the calling thread
+    write_fn(task, item)      -> result dict ("status", "error", ...), run on the writer thread
+    on_record(record)         -> run on the writer thread after each write (single thread)
+    """
+    tasks = sorted(tasks, key=lambda t: t["input"])
+    counters = {
+        "fetch_s": 0.0, "fetch_mb": 0.0, "decode_s": 0.0, "write_s": 0.0,
+        "decode_wait_fetch_s": 0.0, "decode_wait_write_s": 0.0, "writer_idle_s": 0.0,
+    }
+    ready_depths, write_depths = [], []
+    records = []
+    writer_error = []
+    write_q = queue.Queue(maxsize=write_queue_size)
+
+    def timed_fetch(task):
+        t0 = time.perf_counter()
+        payload = fetch_fn(task["input"])
+        return payload, time.perf_counter() - t0
+
+    def writer():
+        while True:
+            t0 = time.perf_counter()
+            item = write_q.get()
+            counters["writer_idle_s"] += time.perf_counter() - t0
+            if item is _DONE:
+                return
+            task, decoded, record = item
+            if record["status"] == "ok":
+                t0 = time.perf_counter()
+                try:
+                    result = write_fn(task, decoded) or {}
+                    record["status"] = result.get("status", "ok")
+                    record["error"] = result.get("error")
+                    record["result"] = result
+                except Exception:
+                    record["status"], record["error"] = "failed", traceback.format_exc()
+                dt = time.perf_counter() - t0
+                record["seconds"] += dt
+                counters["write_s"] += dt
+            records.append(record)
+            if on_record is not None and not writer_error:
+                try:
+                    on_record(record)
+                except Exception as e:  # keep draining so the decoder never blocks forever
+                    writer_error.append(e)
+
+    writer_thread = threading.Thread(target=writer, name="pipeline-writer", daemon=True)
+    writer_thread.start()
+    t_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=n_io_threads, thread_name_prefix="pipeline-io") as io:
+        remaining = iter(tasks)
+        pending = deque()
+
+        def top_up():
+            while len(pending) < n_prefetch:
+                task = next(remaining, None)
+                if task is None:
+                    return
+                pending.append((task, io.submit(timed_fetch, task)))
+
+        top_up()
+        while pending:
+            task, fut = pending.popleft()
+            top_up()  # keep n_prefetch reads in flight while this file is decoded
+            ready_depths.append(int(fut.done()) + sum(f.done() for _, f in pending))
+
+            t0 = time.perf_counter()
+            try:
+                payload, fetch_s = fut.result()
+            except Exception:
+                payload, record = None, _failed(task, traceback.format_exc())
+            counters["decode_wait_fetch_s"] += time.perf_counter() - t0
+
+            decoded = None
+            if payload is not None:
+                counters["fetch_s"] += fetch_s
+                counters["fetch_mb"] += len(payload) / 1e6 if hasattr(payload, "__len__") else 0.0
+                record = {"input": task["input"], "output": task.get("output"), "status": "ok",
+                          "error": None, "seconds": 0.0, "result": {}}
+                t0 = time.perf_counter()
+                try:
+                    decoded = decode_fn(task, payload)
+                except Exception:
+                    record["status"], record["error"] = "failed", traceback.format_exc()
+                dt = time.perf_counter() - t0
+                record["seconds"] = dt
+                counters["decode_s"] += dt
+            del payload
+
+            t0 = time.perf_counter()
+            write_q.put((task, decoded, record))
+            counters["decode_wait_write_s"] += time.perf_counter() - t0
+            write_depths.append(write_q.qsize())
+
+    write_q.put(_DONE)
+    writer_thread.join()
+    if writer_error:
+        raise writer_error[0]
+
+    elapsed = time.perf_counter() - t_start
+    input_mb = counters["fetch_mb"]
+    counters.update({
+        "n_prefetch": n_prefetch,
+        "n_io_threads": n_io_threads,
+        "write_queue_size": write_queue_size,
+        "prefetch_ready_mean": sum(ready_depths) / len(ready_depths) if ready_depths else 0.0,
+        "prefetch_ready_min": min(ready_depths) if ready_depths else 0,
+        "write_queue_mean": sum(write_depths) / len(write_depths) if write_depths else 0.0,
+        "write_queue_max": max(write_depths) if write_depths else 0,
+    })
+    n_ok = sum(r["status"] == "ok" for r in records)
+    return {
+        "n_tasks": len(tasks),
+        "n_workers": 1,
+        "n_ok": n_ok,
+        "n_skipped": sum(r["status"] == "skipped" for r in records),
+        "n_failed": sum(r["status"] == "failed" for r in records),
+        "failures": [(r["input"], r["error"]) for r in records if r["status"] == "failed"],
+        "records": records,
+        "elapsed_s": elapsed,
+        "input_mb": input_mb,
+        "files_per_s": n_ok / elapsed if elapsed > 0 else float("nan"),
+        "mb_per_s": input_mb / elapsed if elapsed > 0 else float("nan"),
+        "pipeline": counters,
+    }
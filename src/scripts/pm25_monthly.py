@@ -0,0 +1,224 @@
+# builds pm25_monthly_2005_2024.parquet (read by every ml_model/models script) from the
+# EPA AQS daily PM2.5 files (daily_88101_YYYY.csv / .zip, or the same tables as parquet)
+# 1. streams each yearly file in chunks (only the needed columns)
+# 2. per chunk, vectorized groupby on an int64 (site, day) key -> partial sums / counts
+# 3. per file: monitor records -> daily site means (all POCs / durations of a site-day)
+#    -> monthly means of the daily means, with n_days = days with a valid daily mean
+# 4. writes site_id, Latitude, Longitude, year, month, pm25_monthly_mean, n_days
+#
+# With LAKE_ROOT set, the months of the rebuilt years are also written as year=/month=
+# partitions (monthly_lake.py); other years' partitions are not touched.
+#
+# Memory is bounded by one file's site-days (a year of ~1,000 sites x 365 days), not by the
+# archive; files run in parallel (batch_driver), one process per year.
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from batch_driver import print_report, run_batch
+from monthly_lake import write_months
+
+# AQS daily file columns used here
+COLUMNS = [
+    "State Code", "County Code", "Site Num", "Parameter Code", "Latitude", "Longitude",
+    "Date Local", "Event Type", "Arithmetic Mean",
+]
+CHUNK_ROWS = 1_000_000
+# rows per parquet row group of the combined file (rows are in site_id = state order, so
+# each group spans a few states and readers can skip groups outside a lat/lon box)
+ROW_GROUP_ROWS = 65_536
+
+# 88101 = PM2.5 FRM/FEM mass; add 88502 for non-regulatory monitors
+PARAMETER_CODES = (88101,)
+# the same sample appears once per exceptional-event treatment; keep one version
+EVENT_TYPES = ("None", "Included")
+
+SCHEMA = pa.schema([
+    ("site_id", pa.string()),
+    ("Latitude", pa.float64()),
+    ("Longitude", pa.float64()),
+    ("year", pa.int16()),
+    ("month", pa.int8()),
+    ("pm25_monthly_mean", pa.float32()),
+    ("n_days", pa.int16()),
+])
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """DataFrames of COLUMNS from a CSV (.csv / .csv.zip / .zip) or parquet file, in chunks."""
+    if path.endswith(".parquet"):
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=COLUMNS):
+            yield batch.to_pandas()
+        return
+    dtypes = {
+        "State Code": "string", "County Code": "int32", "Site Num": "int32",
+        "Parameter Code": "int32", "Latitude": "float64", "Longitude": "float64",
+        "Date Local": "string", "Event Type": "string", "Arithmetic Mean": "float64",
+    }
+    # only empty fields are missing: Event Type "None" is a value, not NaN
+    yield from pd.read_csv(path, usecols=COLUMNS, dtype=dtypes, chunksize=chunk_rows,
+                           keep_default_na=False, na_values=[""])
+
+
+def _site_codes(df):
+    """int64 site code SS CCC NNNN (State Code can be 'CC' for Canada -> dropped)."""
+    state = pd.to_numeric(df["State Code"], errors="coerce")
+    code = state * 10_000_000 + df["County Code"].astype("int64") * 10_000 + df["Site Num"].astype("int64")
+    return code
+
+
+def chunk_partials(df):
+    """(site_day key -> sum, count) and (site code -> lat, lon) of one chunk."""
+    keep = (
+        df["Parameter Code"].isin(PARAMETER_CODES)
+        & df["Event Type"].isin(EVENT_TYPES)
+        & df["Arithmetic Mean"].notna()
+    )
+    df = df.loc[keep]
+    site = _site_codes(df)
+    ok = site.notna()
+    df, site = df.loc[ok], site[ok].astype("int64")
+
+    day = (pd.to_datetime(df["Date Local"], format="%Y-%m-%d").values.astype("datetime64[D]") - _EPOCH).astype("int64")
+    key = site.to_numpy() * 100_000 + day   # days since 1970 < 100,000
+
+    values = df["Arithmetic Mean"].to_numpy()
+    sums = pd.Series(values).groupby(key).agg(["sum", "count"])
+    coords = pd.DataFrame({
+        "site": site.to_numpy(), "Latitude": df["Latitude"].to_numpy(),
+        "Longitude": df["Longitude"].to_numpy(),
+    }).drop_duplicates("site")
+    return sums, coords
+
+
+def monthly_from_file(path, chunk_rows=CHUNK_ROWS):
+    """Monthly site means of one daily file (DataFrame in SCHEMA column order)."""
+    partials, coords = [], []
+    for chunk in iter_chunks(path, chunk_rows):
+        sums, site_coords = chunk_partials(chunk)
+        partials.append(sums)
+        coords.append(site_coords)
+
+    if not partials:
+        return pd.DataFrame({f.name: pd.Series(dtype=f.type.to_pandas_dtype()) for f in SCHEMA})
+
+    # --- site-day means (a site-day can span chunks) ---
+    site_day = pd.concat(partials).groupby(level=0).sum()
+    key = site_day.index.to_numpy()
+    daily_mean = site_day["sum"].to_numpy() / site_day["count"].to_numpy()
+    site, day = np.divmod(key, 100_000)
+    dates = (_EPOCH + day.astype("timedelta64[D]")).astype("datetime64[M]")
+    month_index = dates.astype("int64")   # months since 1970-01
+
+    # --- monthly mean of daily means ---
+    monthly = (
+        pd.DataFrame({"site": site, "m": month_index, "v": daily_mean})
+        .groupby(["site", "m"], sort=True)["v"]
+        .agg(["mean", "count"])
+        .reset_index()
+    )
+    site_coords = pd.concat(coords).drop_duplicates("site").set_index("site")
+
+    s = monthly["site"].to_numpy()
+    state, rest = np.divmod(s, 10_000_000)
+    county, num = np.divmod(rest, 10_000)
+    m = monthly["m"].to_numpy()
+    return pd.DataFrame({
+        "site_id": [f"{a:02d}-{b:03d}-{c:04d}" for a, b, c in zip(state, county, num)],
+        "Latitude": site_coords.loc[s, "Latitude"].to_numpy(),
+        "Longitude": site_coords.loc[s, "Longitude"].to_numpy(),
+        "year": (1970 + m // 12).astype(np.int16),
+        "month": (m % 12 + 1).astype(np.int8),
+        "pm25_monthly_mean": monthly["mean"].to_numpy().astype(np.float32),
+        "n_days": monthly["count"].to_numpy().astype(np.int16),
+    })
+
+
+def process_file(task):
+    """Batch worker: one daily file -> one monthly part."""
+    df = monthly_from_file(task["input"])
+    tmp = f"{task['output']}.{os.getpid()}.tmp"
+    pq.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False), tmp)
+    os.replace(tmp, task["output"])
+    return {"status": "ok", "n_rows": len(df)}
+
+
+def combine_parts(part_paths, output_path):
+    """
+    Concatenate the per-file parts (small: one row per site-month) into one parquet file,
+    sorted by site/year/month. A site-month present in two files keeps the one with more days.
+    """
+    df = pd.concat([pq.read_table(p, schema=SCHEMA).to_pandas() for p in part_paths],
+                   ignore_index=True)
+    df = (
+        df.sort_values(["site_id", "year", "month", "n_days"])
+          .drop_duplicates(["site_id", "year", "month"], keep="last")
+          .reset_index(drop=True)
+    )
+    tmp = f"{output_path}.{os.getpid()}.tmp"
+    pq.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False), tmp,
+                   row_group_size=ROW_GROUP_ROWS)
+    os.replace(tmp, output_path)
+    return len(df)
+
+
+def main():
+    # ***change these as needed
+    input_dir = "/home/ellab/air_pollution/src/data/pm/epa_daily"    # daily_88101_YYYY.(csv|zip|parquet)
+    output_path = "/home/ellab/air_pollution/src/data/pm/pm25_monthly_2005_2024.parquet"
+    START_YEAR = 2005
+    END_YEAR = 2024
+    N_WORKERS = None   # files in parallel; None -> all CPUs
+    LAKE_ROOT = None   # e.g. "/home/ellab/air_pollution/src/data/monthly_lake"; None -> parquet only
+
+    parts_dir = os.path.join(os.path.dirname(output_path), "pm25_monthly_parts")
+    os.makedirs(parts_dir, exist_ok=True)
+
+    tasks, part_paths = [], []
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.endswith((".csv", ".zip", ".parquet")):
+            continue
+        digits = "".join(ch for ch in filename if ch.isdigit())
+        year = int(digits[-4:]) if len(digits) >= 4 else None
+        if year is None or not START_YEAR <= year <= END_YEAR:
+            continue
+        stem = filename.split(".")[0]
+        part = os.path.join(parts_dir, f"{stem}.parquet")
+        src = os.path.join(input_dir, filename)
+        part_paths.append(part)
+        # reuse a part that is newer than its input
+        if os.path.exists(part) and os.path.getmtime(part) >= os.path.getmtime(src):
+            continue
+        tasks.append({"input": src, "output": part, "year": year})
+
+    print(f"{len(tasks)} daily file(s) to aggregate.")
+    report = run_batch(process_file, tasks, n_workers=N_WORKERS)
+    print_report(report)
+    if report["n_failed"]:
+        print("Not writing the combined parquet: some files failed.")
+        return
+
+    n_rows = combine_parts(part_paths, output_path)
+    print(f"Saved: {output_path} ({n_rows:,} site-months)")
+
+    if LAKE_ROOT is not None:
+        # months of the rebuilt years, from the combined (de-duplicated) table
+        years = sorted({task["year"] for task in tasks})
+        if not os.path.isdir(os.path.join(LAKE_ROOT, "pm25_monthly")):
+            years = list(range(START_YEAR, END_YEAR + 1))   # first lake write: every year
+        n_months = 0
+        if years:
+            combined = pq.read_table(output_path, schema=SCHEMA, filters=[("year", "in", years)])
+            n_months = len(write_months(LAKE_ROOT, "pm25_monthly", combined))
+        print(f"Lake: wrote {n_months} month partition(s) under {os.path.join(LAKE_ROOT, 'pm25_monthly')}")
+
+
+if __name__ == "__main__":
+    main()
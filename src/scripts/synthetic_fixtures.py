@@ -0,0 +1,225 @@
+# synthetic satellite input files for benchmarks (no NASA downloads needed)
+# 1. MAIAC compact HDF4 (Compact_AOD_055 / Line / Sample / Offset_AOD_055 / nAOD + AOD_055
+#    attributes + gridded AOD_055_QA), as read by aod_clean3
+# 2. MAIAC CMG HDF4 (global 3600 x 7200 int16 AOD_055 / AOD_055_QA / Weight_055), as read by
+#    test_aod_clean / ingest "aod_cmg"
+# 3. OMI L3 HE5 grids: NO2 / O3 (global 0.25°) and HCHO (global 0.1° with 2-D Latitude /
+#    Longitude), at the dataset paths of ingest.PRODUCTS
+#
+# Shapes, dtypes, fill values and scale attributes follow the real products; values are
+# random but seeded, so the same settings always give the same files.
+# make_fixture_tree() lays the files out like the real archive: <root>/<product>/<year>/<file>.
+
+import json
+import os
+import shutil
+
+import h5py
+import numpy as np
+from pyhdf.SD import SD, SDC
+
+from ingest import HCHO_GRID, PRODUCTS
+
+MAIAC_FILL = -28672
+MAIAC_VALID_RANGE = [-100, 5000]
+MAIAC_SCALE = 0.001
+OMI_FILL = np.float32(-1.2676506e30)
+
+NLINES, NSAMPLES = 3600, 7200      # 0.05° CMG grid
+
+# ***change these as needed
+# cells with at least one overpass in a compact file (real days: ~1e6-5e6)
+COMPACT_CELLS = 1_000_000
+MAX_OVERPASSES = 6
+CLEAR_FRACTION = 0.4               # share of CMG / OMI cells with a retrieval
+DEFLATE_LEVEL = 4                  # HDF4 SDS / HE5 dataset compression (None -> uncompressed)
+
+# product -> file name of one day (date_from_filename must understand it)
+FILE_NAMES = {
+    "aod_compact": "maiac_aod_{date:%Y%m%d}.hdf",
+    "aod_cmg":     "MCD19A2CMG_{date:%Y%m%d}.hdf",
+    "no2":         "OMI-Aura_L3-OMNO2d_{date:%Y}m{date:%m%d}_v003.he5",
+    "o3":          "OMI-Aura_L3-OMTO3e_{date:%Y}m{date:%m%d}_v003.he5",
+    "hcho":        "OMI-Aura_L3-OMHCHOd_{date:%Y}m{date:%m%d}_v003.he5",
+}
+
+
+# ------------------------------------------------------------
+# HDF4 (MAIAC)
+# ------------------------------------------------------------
+def _put_sds(sd, name, data, sdc_type, attrs=None, deflate=DEFLATE_LEVEL):
+    sds = sd.create(name, sdc_type, data.shape)
+    if deflate:
+        sds.setcompress(SDC.COMP_DEFLATE, deflate)
+    for key, value in (attrs or {}).items():
+        setattr(sds, key, value)
+    sds[:] = data
+    sds.endaccess()
+
+
+def _maiac_qa(rng, shape):
+    """AOD_055_QA words: mostly clear / best quality, some cloudy or adjacent cells."""
+    cloud = rng.choice([1, 2, 3], size=shape, p=[0.7, 0.2, 0.1]).astype(np.uint16)
+    adjacency = rng.choice([0, 1], size=shape, p=[0.85, 0.15]).astype(np.uint16)
+    aod_qa = rng.choice([0, 1], size=shape, p=[0.9, 0.1]).astype(np.uint16)
+    return (cloud | (adjacency << 5) | (aod_qa << 8)).view(np.int16)
+
+
+def _maiac_aod_attrs():
+    return {"_FillValue": MAIAC_FILL, "valid_range": MAIAC_VALID_RANGE,
+            "scale_factor": MAIAC_SCALE, "add_offset": 0.0, "units": "none"}
+
+
+def write_compact_hdf(path, rng, n_cells=COMPACT_CELLS, max_overpasses=MAX_OVERPASSES):
+    """One MAIAC compact day: the SDS names / shapes aod_clean3.extract_data reads."""
+    flat = np.sort(rng.choice(NLINES * NSAMPLES, size=n_cells, replace=False))
+    line = (flat // NSAMPLES).astype(np.int16)
+    sample = (flat % NSAMPLES).astype(np.int16)
+    nAOD = rng.integers(1, max_overpasses + 1, size=n_cells).astype(np.int16)
+    offset = (np.cumsum(nAOD) - nAOD).astype(np.int32)
+
+    compact = rng.gamma(2.0, 60.0, size=int(nAOD.sum())).astype(np.int16)
+    compact[rng.random(compact.size) < 0.02] = MAIAC_FILL
+
+    sd = SD(path, SDC.WRITE | SDC.CREATE | SDC.TRUNC)
+    _put_sds(sd, "Compact_AOD_055", compact[np.newaxis, :], SDC.INT16)
+    _put_sds(sd, "Line", line[np.newaxis, :], SDC.INT16)
+    _put_sds(sd, "Sample", sample[np.newaxis, :], SDC.INT16)
+    _put_sds(sd, "Offset_AOD_055", offset[np.newaxis, :], SDC.INT32)
+    _put_sds(sd, "nAOD", nAOD[np.newaxis, :], SDC.INT16)
+    # the compact files carry AOD_055 for its attributes (kept tiny here)
+    _put_sds(sd, "AOD_055", np.full((1, 1), MAIAC_FILL, dtype=np.int16), SDC.INT16,
+             _maiac_aod_attrs(), deflate=None)
+    _put_sds(sd, "AOD_055_QA", _maiac_qa(rng, (NLINES, NSAMPLES)), SDC.INT16)
+    sd.end()
+
+
+def write_cmg_hdf(path, rng):
+    """One MAIAC CMG day: global int16 AOD_055 / AOD_055_QA / Weight_055."""
+    clear = rng.random((NLINES, NSAMPLES)) < CLEAR_FRACTION
+    aod = np.where(clear, rng.gamma(2.0, 60.0, size=clear.shape), MAIAC_FILL).astype(np.int16)
+    weight = np.where(clear, rng.integers(1, 5, size=clear.shape), 0).astype(np.int16)
+
+    sd = SD(path, SDC.WRITE | SDC.CREATE | SDC.TRUNC)
+    _put_sds(sd, "AOD_055", aod, SDC.INT16, _maiac_aod_attrs())
+    _put_sds(sd, "AOD_055_QA", _maiac_qa(rng, clear.shape), SDC.INT16)
+    _put_sds(sd, "Weight_055", weight, SDC.INT16)
+    sd.end()
+
+
+# ------------------------------------------------------------
+# HE5 (OMI L3)
+# ------------------------------------------------------------
+def _omi_field(rng, shape, median, sigma):
+    data = (median * rng.lognormal(0.0, sigma, size=shape)).astype(np.float32)
+    data[rng.random(shape) > CLEAR_FRACTION] = OMI_FILL
+    return data
+
+
+def _put_h5(f, path, data, attrs=None):
+    kwargs = {}
+    if DEFLATE_LEVEL:
+        kwargs = {"compression": "gzip", "compression_opts": DEFLATE_LEVEL,
+                  "chunks": (1,) * (data.ndim - 2) + (min(data.shape[-2], 180), min(data.shape[-1], 360))}
+    dset = f.create_dataset(path, data=data, **kwargs)
+    for key, value in (attrs or {}).items():
+        dset.attrs[key] = value
+    return dset
+
+
+def _omi_attrs(units):
+    return {"_FillValue": np.array([OMI_FILL]), "MissingValue": np.array([OMI_FILL]),
+            "ScaleFactor": np.array([1.0]), "Offset": np.array([0.0]), "Units": units}
+
+
+def write_omi_he5(path, product, rng):
+    """One OMI L3 day of product "no2" / "o3" / "hcho" at its ingest.PRODUCTS dataset path."""
+    spec = PRODUCTS[product]
+    with h5py.File(path, "w") as f:
+        if product == "hcho":
+            n_lat, n_lon, res = 1800, 3600, 0.1
+            data = _omi_field(rng, (1, n_lat, n_lon), 8e15, 0.6)
+            units = "molec/cm^2"
+        elif product == "no2":
+            n_lat, n_lon, res = 720, 1440, 0.25
+            data = _omi_field(rng, (1, n_lat, n_lon), 2e15, 0.8)
+            units = "molec/cm^2"
+        else:
+            n_lat, n_lon, res = 720, 1440, 0.25
+            data = _omi_field(rng, (1, n_lat, n_lon), 300.0, 0.1)
+            units = "DU"
+        _put_h5(f, spec["dataset"], data, _omi_attrs(units))
+
+        if spec["grid"]["type"] == "latlon":
+            lat = (-90 + res / 2 + np.arange(n_lat) * res).astype(np.float32)
+            lon = (-180 + res / 2 + np.arange(n_lon) * res).astype(np.float32)
+            # per-step 2-D grids, (1, n_lat, n_lon) like the data field
+            lat2d, lon2d = np.meshgrid(lat, lon, indexing="ij")
+            _put_h5(f, f"{HCHO_GRID}/Data Fields/Latitude", lat2d[np.newaxis])
+            _put_h5(f, f"{HCHO_GRID}/Data Fields/Longitude", lon2d[np.newaxis])
+
+
+# ------------------------------------------------------------
+# archive-like tree
+# ------------------------------------------------------------
+def write_fixture(path, product, rng):
+    if product == "aod_compact":
+        write_compact_hdf(path, rng)
+    elif product == "aod_cmg":
+        write_cmg_hdf(path, rng)
+    else:
+        write_omi_he5(path, product, rng)
+
+
+def fixture_settings(products, year, n_days, seed):
+    return {
+        "products": sorted(products), "year": year, "n_days": n_days, "seed": seed,
+        "compact_cells": COMPACT_CELLS, "max_overpasses": MAX_OVERPASSES,
+        "clear_fraction": CLEAR_FRACTION, "deflate_level": DEFLATE_LEVEL,
+    }
+
+
+def make_fixture_tree(root, products, year=2020, n_days=3, seed=0):
+    """
+    Write n_days files per product under <root>/<product>/<year>/ and return
+    {product: input_dir}. A tree already written with the same settings is reused;
+    otherwise the product folders under root are rewritten.
+    """
+    settings = fixture_settings(products, year, n_days, seed)
+    stamp = os.path.join(root, "fixtures.json")
+    input_dirs = {product: os.path.join(root, product) for product in products}
+    if os.path.exists(stamp):
+        with open(stamp) as f:
+            if json.load(f) == settings:
+                return input_dirs
+
+    for product in products:
+        # a tree from other settings is rewritten from scratch (no stale extra days)
+        shutil.rmtree(input_dirs[product], ignore_errors=True)
+        year_dir = os.path.join(input_dirs[product], str(year))
+        os.makedirs(year_dir, exist_ok=True)
+        for day in range(n_days):
+            date = np.datetime64(f"{year}-01-01") + day
+            name = FILE_NAMES[product].format(date=date.astype(object))
+            # one seed per (product, day): adding a product leaves the others unchanged
+            rng = np.random.default_rng([seed, sorted(FILE_NAMES).index(product), day])
+            write_fixture(os.path.join(year_dir, name), product, rng)
+
+    with open(stamp, "w") as f:
+        json.dump(settings, f, indent=2)
+    return input_dirs
+
+
+def main():
+    # ***change these as needed
+    root = "/home/ellab/air_pollution/src/data/synthetic"
+    PRODUCTS_TO_WRITE = ["aod_compact", "aod_cmg", "no2", "o3", "hcho"]
+    YEAR = 2020
+    N_DAYS = 3
+
+    for product, input_dir in make_fixture_tree(root, PRODUCTS_TO_WRITE, YEAR, N_DAYS).items():
+        print(f"{product}: {input_dir}")
+
+
+if __name__ == "__main__":
+    main()
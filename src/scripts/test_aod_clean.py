@@ -1,98 +1,30 @@
 
-import os
-import numpy as np
-import xarray as xr
-from pyhdf.SD import SD, SDC
-
-def extract_data(file_path):
-    """Extract and clean AOD_055 from MAIAC CMG HDF4 file."""
-    sd = SD(file_path, SDC.READ)
-
-    # --- main variable ---
-    sds = sd.select('AOD_055')
-    data = sds[:].astype('float32')
-    attrs = sds.attributes()
-    fill_value = attrs.get('_FillValue', -28672.0)
-    scale_factor = attrs.get('scale_factor', 1.0)
-    add_offset = attrs.get('add_offset', 0.0)
-    valid_range = attrs.get('valid_range', None)
-
-    # --- optional QA/weight masks ---
-    qa, weight = None, None
-    try:
-        qa = sd.select('AOD_055_QA')[:]
-    except Exception:
-        pass
-    try:
-        weight = sd.select('Weight_055')[:]
-    except Exception:
-        pass
-
-    # --- mask ---
-    data[data == fill_value] = np.nan
-    if valid_range is not None:
-        lo, hi = valid_range
-        data[(data < lo) | (data > hi)] = np.nan
-    if qa is not None:
-        data[qa > 1] = np.nan
-    if weight is not None:
-        data[weight <= 0] = np.nan
-
-    # --- scale ---
-    data = data * scale_factor + add_offset
-
-    # --- CMG grid: north→south ---
-    n_lat, n_lon = data.shape
-    res = 0.05
-    latitudes = np.linspace(90 - res / 2, -90 + res / 2, n_lat)
-    longitudes = np.linspace(-180 + res / 2, 180 - res / 2, n_lon)
-
-    sd.end()
-
-    ds = xr.Dataset(
-        {"AOD": (["lat", "lon"], data)},
-        coords={"lat": latitudes, "lon": longitudes}
-    )
-    ds = ds.sortby('lat')  # makes lat ascending
-    return ds
+from ingest import extract_product, product_spec, run_product
+from maiac_qa import DEFAULT_QA_POLICY
+
+LAT_MAX, LAT_MIN = 43.150, 36.350
+LON_MIN, LON_MAX = -83.150, -70.100
+
+def extract_data(file_path, qa_policy=DEFAULT_QA_POLICY):
+    """
+    Extract and clean AOD_055 over the region from a MAIAC CMG HDF4 file
+    (the "aod_cmg" product of ingest.PRODUCTS).
+    Only the regional rows/cols of AOD_055, AOD_055_QA and Weight_055 are read.
+    qa_policy: dict of allowed QA states (see maiac_qa.py), or None to skip QA masking.
+    """
+    spec = product_spec("aod_cmg", qa={"dataset": "AOD_055_QA", "policy": qa_policy})
+    return extract_product(spec, file_path)
 
 
 def filter_region(ds):
     """Subset to region of interest."""
-    lat_max, lat_min = 43.150, 36.350
-    lon_min, lon_max = -83.150, -70.100
-    return ds.sel(lat=slice(lat_min, lat_max), lon=slice(lon_min, lon_max))
+    return ds.sel(lat=slice(LAT_MIN, LAT_MAX), lon=slice(LON_MIN, LON_MAX))
 
 
 def main():
-    input_base_dir  = "/home/ellab/air_pollution/src/data/new_aod"
-    output_base_dir = "/home/ellab/air_pollution/src/data/clean_aod"
-
-    # ✅ only process 2005
+    # ✅ only process 2005 (folders / output naming: ingest.PRODUCTS["aod_cmg"])
     YEAR = 2005
-    year_dir = os.path.join(input_base_dir, str(YEAR))
-    if not os.path.isdir(year_dir):
-        print(f"Skipping {YEAR} (no folder).")
-        return
-
-    out_year_dir = os.path.join(output_base_dir, str(YEAR))
-    os.makedirs(out_year_dir, exist_ok=True)
-
-    for filename in sorted(os.listdir(year_dir)):
-        if not filename.lower().endswith(".hdf"):
-            continue
-        file_path = os.path.join(year_dir, filename)
-        try:
-            ds = extract_data(file_path)
-            filtered = filter_region(ds)
-
-            output_filename = filename.replace(".hdf", "_clean.nc")
-            output_path = os.path.join(out_year_dir, output_filename)
-            filtered.to_netcdf(output_path)
-            print(f"Saved: {output_path}")
-
-        except Exception as e:
-            print(f"Failed to process {file_path}: {e}")
+    run_product("aod_cmg", years=(YEAR, YEAR))
 
 
 if __name__ == "__main__":
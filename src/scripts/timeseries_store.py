@@ -0,0 +1,210 @@
+# append-mode chunked (time, lat, lon) store for daily regional grids
+# 1. one NetCDF4 file per product with an UNLIMITED time dimension
+# 2. each cleaned day is appended as one time step (days already in the store are skipped)
+# 3. readers open the file once and pull maps / point time series / time blocks in large reads
+#
+# Chunking: (CHUNK_DAYS, CHUNK_CELLS, CHUNK_CELLS) = (64, 32, 32) float32 -> 256 KB per chunk.
+# For the ~136 x 262 AOD region:
+#   - a daily map touches 5 x 9 = 45 chunks (and the next 63 days come from the same chunks)
+#   - a 20-year point series touches ~115 chunks (one per 64 days) instead of 7,000 files
+# Chunk sizes are clipped to the grid, so small OMI grids get whole-map chunks.
+#
+# Appends should come in whole time chunks (append_days with days_to_chunk_end() days):
+# a compressed chunk rewritten day by day is stored again on every write, and HDF5 does
+# not reclaim the old copies, so per-day appends bloat the file several-fold.
+
+import os
+import re
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+CHUNK_DAYS = 64
+CHUNK_CELLS = 32
+TIME_UNITS = "days since 1970-01-01"
+
+
+def date_from_filename(filename):
+    """
+    Date of a daily file from the first YYYYMMDD / YYYYmMMDD tag in its name
+    (e.g. maiac_aod_20200101.hdf, OMI-Aura_L3-OMHCHOd_2020m0101_v003-....he5).
+    """
+    m = re.search(r"(\d{4})m?(\d{2})(\d{2})", os.path.basename(filename))
+    if m is None:
+        raise ValueError(f"No YYYYMMDD date in file name: {filename}")
+    return np.datetime64(f"{m.group(1)}-{m.group(2)}-{m.group(3)}", "D")
+
+
+def _day_number(date):
+    return int((np.datetime64(date, "D") - np.datetime64("1970-01-01", "D")).astype(int))
+
+
+def create_store(path, template_ds, var_names, chunk_days=CHUNK_DAYS, chunk_cells=CHUNK_CELLS,
+                 complevel=4):
+    """
+    Create an empty store shaped like one day of template_ds.
+    Grid dims/coords (1-D lat/lon, or y/x with 2-D lat/lon) are copied once.
+    """
+    grid_dims = template_ds[var_names[0]].dims
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with netCDF4.Dataset(path, "w", format="NETCDF4") as nc:
+        nc.createDimension("time", None)  # unlimited
+        for dim in grid_dims:
+            nc.createDimension(dim, template_ds.sizes[dim])
+
+        t = nc.createVariable("time", "i4", ("time",))
+        t.units = TIME_UNITS
+        t.calendar = "standard"
+        t.standard_name = "time"
+
+        # --- grid coordinates (dimension + 2-D auxiliary coords), written once ---
+        for name, coord in template_ds.coords.items():
+            if not set(coord.dims) <= set(grid_dims) or not coord.dims:
+                continue
+            v = nc.createVariable(name, coord.dtype, coord.dims)
+            v[:] = coord.values
+            v.setncatts({k: v_ for k, v_ in coord.attrs.items() if not k.startswith("_")})
+
+        coord_names = " ".join(
+            name for name, c in template_ds.coords.items()
+            if c.dims and set(c.dims) <= set(grid_dims) and name not in grid_dims
+        )
+
+        chunks = (chunk_days,) + tuple(
+            min(chunk_cells, template_ds.sizes[d]) for d in grid_dims
+        )
+        for name in var_names:
+            v = nc.createVariable(
+                name, "f4", ("time",) + grid_dims,
+                zlib=True, complevel=complevel, chunksizes=chunks, fill_value=np.float32(np.nan),
+            )
+            v.setncatts({k: v_ for k, v_ in template_ds[name].attrs.items() if not k.startswith("_")})
+            if coord_names:
+                v.coordinates = coord_names
+
+
+def store_dates(path):
+    """Dates already in the store (empty if the store does not exist yet)."""
+    if not os.path.exists(path):
+        return set()
+    with netCDF4.Dataset(path, "r") as nc:
+        days = nc["time"][:]
+    base = np.datetime64("1970-01-01", "D")
+    return {base + np.timedelta64(int(d), "D") for d in np.asarray(days)}
+
+
+def _check_grid(nc, ds_day, grid_dims):
+    """Raise ValueError unless ds_day has the store's grid sizes and coordinate values."""
+    for dim in grid_dims:
+        if ds_day.sizes.get(dim) != len(nc.dimensions[dim]):
+            raise ValueError(f"{dim} size {ds_day.sizes.get(dim)} does not match store "
+                             f"({len(nc.dimensions[dim])})")
+    # dimension coords and auxiliary coords (2-D lat/lon on y/x)
+    for name, v in nc.variables.items():
+        if not v.dimensions or not set(v.dimensions) <= set(grid_dims):
+            continue
+        if name not in ds_day.variables:
+            raise ValueError(f"day has no {name} coordinate (the store has one)")
+        if not np.allclose(np.asarray(v[:]), ds_day[name].transpose(*v.dimensions).values,
+                           equal_nan=True):
+            raise ValueError(f"{name} coordinate does not match store grid")
+
+
+def check_store_grid(path, ds_day, var_names):
+    """Raise ValueError if the existing store at path has a different grid than ds_day."""
+    with netCDF4.Dataset(path, "r") as nc:
+        _check_grid(nc, ds_day, nc[var_names[0]].dimensions[1:])
+
+
+def days_to_chunk_end(path, var_names, chunk_days=CHUNK_DAYS):
+    """Days to append to fill the store's last time chunk (a whole chunk for a new / aligned store)."""
+    if not os.path.exists(path):
+        return chunk_days
+    with netCDF4.Dataset(path, "r") as nc:
+        chunking = nc[var_names[0]].chunking()
+        n = len(nc.dimensions["time"])
+    size = chunking[0] if isinstance(chunking, list) else chunk_days
+    return size - n % size
+
+
+def append_days(path, days, var_names):
+    """
+    Append [(ds_day, date), ...] to the store in one write (created from the first day on
+    first use). Days already in the store (or repeated in days) are skipped. Raises
+    ValueError, before writing anything, if a day's grid does not match the store's grid.
+    Days are stored in append order; open_store() sorts by time. Returns the days written.
+    """
+    if not days:
+        return 0
+    if not os.path.exists(path):
+        create_store(path, days[0][0], var_names)
+
+    with netCDF4.Dataset(path, "a") as nc:
+        grid_dims = nc[var_names[0]].dimensions[1:]
+        seen = set(int(d) for d in np.asarray(nc["time"][:]))
+        new_days, new = [], []
+        for ds_day, date in days:
+            day = _day_number(date)
+            if day in seen:
+                continue
+            _check_grid(nc, ds_day, grid_dims)
+            seen.add(day)
+            new_days.append(day)
+            new.append(ds_day)
+        if not new:
+            return 0
+
+        i = len(nc.dimensions["time"])
+        nc["time"][i:i + len(new)] = np.asarray(new_days, dtype=np.int32)
+        for name in var_names:
+            nc[name][i:i + len(new), ...] = np.stack(
+                [ds[name].transpose(*grid_dims).values.astype(np.float32) for ds in new]
+            )
+    return len(new)
+
+
+def append_day(path, ds_day, date, var_names):
+    """
+    Append one day (see append_days; for many days, append whole time chunks instead).
+    Returns False (and writes nothing) if the date is already present.
+    """
+    return append_days(path, [(ds_day, date)], var_names) == 1
+
+
+def open_store(path):
+    """Open the whole store lazily (one file handle), sorted by time."""
+    ds = xr.open_dataset(path)
+    if not ds.indexes["time"].is_monotonic_increasing:
+        ds = ds.sortby("time")
+    return ds
+
+
+def read_point_series(path, var_name, lat, lon):
+    """Full time series of the cell nearest (lat, lon): one (time, 1, 1) hyperslab read."""
+    with netCDF4.Dataset(path, "r") as nc:
+        lats, lons = np.asarray(nc["lat"][:]), np.asarray(nc["lon"][:])
+        if lats.ndim == 2:
+            # y/x grid with 2-D lat/lon (HCHO): nearest cell over both coordinates
+            i, j = np.unravel_index(int(np.argmin((lats - lat) ** 2 + (lons - lon) ** 2)), lats.shape)
+        else:
+            i = int(np.abs(lats - lat).argmin())
+            j = int(np.abs(lons - lon).argmin())
+        values = np.asarray(nc[var_name][:, int(i), int(j)], dtype=np.float32)
+        days = np.asarray(nc["time"][:])
+    times = np.datetime64("1970-01-01", "D") + days.astype("timedelta64[D]")
+    order = np.argsort(times)
+    return times[order], values[order]
+
+
+def iter_time_blocks(path, var_name, block_days=CHUNK_DAYS):
+    """Yield (times, block[time, ...]) in chunk-aligned time blocks (few large reads)."""
+    with netCDF4.Dataset(path, "r") as nc:
+        days = np.asarray(nc["time"][:])
+        n = len(days)
+        for start in range(0, n, block_days):
+            stop = min(start + block_days, n)
+            block = np.asarray(nc[var_name][start:stop, ...], dtype=np.float32)
+            times = np.datetime64("1970-01-01", "D") + days[start:stop].astype("timedelta64[D]")
+            yield times, block